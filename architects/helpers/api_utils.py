@@ -7,6 +7,8 @@ from typing import Any, Dict, List, Optional, Tuple, Union
 import numpy as np
 
 from ui_ux_team.blue_ui import settings as app_settings
+from architects.helpers.context_cache import ContextCacheManager, is_cache_gone_error
+from architects.helpers.embedding_index import EmbeddingCache, cached_embeddings, cosine_similarity_matrix
 from architects.helpers.genai_client import GenAIClient, GenAIChatSession
 from ui_ux_team.blue_ui.app.api_usage_guard import record_usage, reserve_request
 
@@ -55,6 +57,34 @@ Required JSON Format:
 }}
 """.strip()
 
+CUSTOM_TRANSCRIPTION_PROMPT_MEET_TYPE_BATCH = f"""
+You will receive several audio clips. Each clip is preceded by a marker line "[chunk_id=<id>]",
+optionally followed by audio analysis tags for that clip. Analyze every clip independently and output ONLY valid JSON.
+
+Allowed Emotions: {MEET_TYPE_MOODS}
+
+Instructions (apply to each clip):
+1. content: Transcribe exactly. If silent/noise only, return "". No timestamps.
+2. language_code: Use 2-letter ISO code (e.g., "en", "es").
+3. translation: English translation. If audio is English, return null.
+4. emotion: Select exactly one from 'Allowed Emotions'.
+5. chunk_id: Copy the id from the clip's marker line.
+
+Required JSON Format (one entry per clip, in the order received):
+{{
+  "results": [
+    {{
+      "chunk_id": "id from marker",
+      "summary": "Brief summary",
+      "content": "Full transcription",
+      "translation": "Translation or null",
+      "language_code": "en",
+      "emotion": "Chosen Emotion"
+    }}
+  ]
+}}
+""".strip()
+
 DEFAULT_TRANSCRIPTION_PROMPT = """
 Process the audio file and generate a detailed transcription.
 
@@ -87,6 +117,10 @@ Respond ONLY as JSON matching:
 INLINE_AUDIO_LIMIT_BYTES = 20 * 1024 * 1024
 
 
+class RequestLimitBlocked(RuntimeError):
+    """The usage guard refused a follow-up request (the inline retry after an expired cache)."""
+
+
 class LLMUtilitySuite:
     """
     A singleton class to manage interactions with a Large Language Model API.
@@ -107,6 +141,9 @@ class LLMUtilitySuite:
 
             try:
                 self.client = GenAIClient(api_key=api_key)
+                self.context_cache = ContextCacheManager(self.client)
+                # Opened lazily on first embedding lookup.
+                self.embedding_cache = EmbeddingCache()
                 print("LLM API Suite configured successfully via GenAIClient.")
                 self.is_initialized = True
             except Exception as e:
@@ -167,10 +204,7 @@ class LLMUtilitySuite:
         task_type: str = "RETRIEVAL_DOCUMENT"
     ) -> List[float]:
         try:
-            embeddings = self.client.embed_content(
-                model_name=model_name,
-                contents=text
-            )
+            embeddings = cached_embeddings(self.client, self.embedding_cache, model_name, [text])
             return embeddings[0] if embeddings else []
         except Exception as e:
             print(f"An error occurred during embedding: {e}")
@@ -183,10 +217,7 @@ class LLMUtilitySuite:
         task_type: str = "RETRIEVAL_DOCUMENT"
     ) -> List[List[float]]:
         try:
-            return self.client.embed_content(
-                model_name=model_name,
-                contents=texts
-            )
+            return cached_embeddings(self.client, self.embedding_cache, model_name, texts)
         except Exception as e:
             print(f"An error occurred during batch embedding: {e}")
             return []
@@ -199,12 +230,18 @@ class LLMUtilitySuite:
         *,
         model_name: str = None,
         prompt: Optional[str] = None,
+        prompt_context: Optional[str] = None,
         mime_type: Optional[str] = None,
         structured: bool = True,
         upload_when_large: bool = True,
         upload_threshold_bytes: int = INLINE_AUDIO_LIMIT_BYTES,
         wait_for_active_sec: int = 60,
+        use_context_cache: bool = True,
     ) -> Dict[str, Any]:
+        """
+        Transcribes one audio source. `prompt` is the static instruction (eligible for
+        context caching); `prompt_context` is per-call text such as analysis tags.
+        """
         target_model = self._normalize_model_name(model_name or app_settings.transcription_model())
         allowed, reason = reserve_request("transcript", model_name=target_model)
         if not allowed:
@@ -230,14 +267,24 @@ class LLMUtilitySuite:
             # as defined in the migration plan's risk mitigation section.
 
         try:
-            response = self.client.generate_content(
-                model_name=target_model,
-                contents=[prompt, audio_part],
-                config=config if config else None
+            response = self._generate_with_cached_prompt(
+                target_model,
+                prompt=prompt,
+                prompt_context=prompt_context,
+                parts=[audio_part],
+                config=config,
+                use_context_cache=use_context_cache,
             )
             usage = response.get("usage", {})
             self._log_usage_dict(usage, context="transcribe_audio")
             record_usage(scope="transcript", model_name=target_model, usage=usage)
+        except RequestLimitBlocked as e:
+            return {
+                "error": str(e),
+                "limit_blocked": True,
+                "source": "api_usage_limits",
+                "model": target_model,
+            }
         except Exception as e:
             return {
                 "error": f"An error occurred during transcription: {e}",
@@ -266,16 +313,20 @@ class LLMUtilitySuite:
         *,
         model_name: str = "models/gemini-2.5-flash-lite",
         prompt: Optional[str] = None,
+        prompt_context: Optional[str] = None,
         mime_type: str = "audio/wav",
         structured: bool = True,
         upload_when_large: bool = True,
         upload_threshold_bytes: int = INLINE_AUDIO_LIMIT_BYTES,
         wait_for_active_sec: int = 60,
+        use_context_cache: bool = True,
     ) -> Dict[str, Any]:
         return self.transcribe_audio(
             audio_bytes,
             model_name=model_name,
             prompt=prompt,
+            prompt_context=prompt_context,
+            use_context_cache=use_context_cache,
             mime_type=mime_type,
             structured=structured,
             upload_when_large=upload_when_large,
@@ -283,6 +334,191 @@ class LLMUtilitySuite:
             wait_for_active_sec=wait_for_active_sec
         )
 
+    def transcribe_audio_batch(
+        self,
+        chunks: List[Dict[str, Any]],
+        *,
+        model_name: str = None,
+        prompt: Optional[str] = None,
+        mime_type: str = "audio/wav",
+        use_context_cache: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Transcribes several inline audio chunks with a single request.
+
+        Each chunk is a dict with ``id``, ``data`` (audio bytes) and an optional
+        ``context`` string (e.g. audio analysis tags). Results are returned in the
+        same order as ``chunks``; every entry carries its ``chunk_id``.
+        """
+        if not chunks:
+            return []
+
+        target_model = self._normalize_model_name(model_name or app_settings.transcription_model())
+        chunk_ids = [str(chunk.get("id", index)) for index, chunk in enumerate(chunks)]
+
+        allowed, reason = reserve_request("transcript", model_name=target_model)
+        if not allowed:
+            return [
+                {
+                    "error": reason,
+                    "limit_blocked": True,
+                    "source": "api_usage_limits",
+                    "model": target_model,
+                    "chunk_id": chunk_id,
+                }
+                for chunk_id in chunk_ids
+            ]
+
+        parts: List[Any] = []
+        for chunk_id, chunk in zip(chunk_ids, chunks):
+            marker = f"[chunk_id={chunk_id}]"
+            if chunk.get("context"):
+                marker = f"{marker} {chunk['context']}"
+            parts.append(marker)
+            parts.append({"mime_type": chunk.get("mime_type") or mime_type, "data": chunk["data"]})
+
+        try:
+            response = self._generate_with_cached_prompt(
+                target_model,
+                prompt=prompt or CUSTOM_TRANSCRIPTION_PROMPT_MEET_TYPE_BATCH,
+                parts=parts,
+                config={"response_mime_type": "application/json"},
+                use_context_cache=use_context_cache,
+            )
+            usage = response.get("usage", {})
+            self._log_usage_dict(usage, context=f"transcribe_audio_batch x{len(chunks)}")
+            record_usage(scope="transcript", model_name=target_model, usage=usage)
+        except RequestLimitBlocked as e:
+            return [
+                {
+                    "error": str(e),
+                    "limit_blocked": True,
+                    "source": "api_usage_limits",
+                    "model": target_model,
+                    "chunk_id": chunk_id,
+                }
+                for chunk_id in chunk_ids
+            ]
+        except Exception as e:
+            return [
+                {
+                    "error": f"An error occurred during batch transcription: {e}",
+                    "source": "inline-batch",
+                    "model": target_model,
+                    "chunk_id": chunk_id,
+                }
+                for chunk_id in chunk_ids
+            ]
+
+        payloads = self._demux_batch_payload(response.get("text", ""), chunk_ids)
+        results: List[Dict[str, Any]] = []
+        for index, chunk_id in enumerate(chunk_ids):
+            parsed = payloads.get(chunk_id)
+            if parsed is None:
+                results.append({
+                    "error": f"Batch response did not include a result for chunk {chunk_id}.",
+                    "source": "inline-batch",
+                    "model": target_model,
+                    "chunk_id": chunk_id,
+                })
+                continue
+            results.append({
+                "text": (parsed.get("content") or "").strip(),
+                "summary": parsed.get("summary"),
+                "emotion": parsed.get("emotion"),
+                "raw_response": response.get("raw_response") if index == 0 else None,
+                "source": "inline-batch",
+                "model": target_model,
+                "translation": parsed.get("translation"),
+                # Usage belongs to the whole request; attach it once so totals are not double counted.
+                "usage": usage if index == 0 else {},
+                "chunk_id": chunk_id,
+                "batch_size": len(chunk_ids),
+            })
+        return results
+
+    def _generate_with_cached_prompt(
+        self,
+        model_name: str,
+        *,
+        prompt: str,
+        parts: List[Any],
+        config: Dict[str, Any],
+        prompt_context: Optional[str] = None,
+        use_context_cache: bool = True,
+        scope: str = "transcript",
+    ) -> Dict[str, Any]:
+        """
+        Sends `prompt` via cached content when available, otherwise inline.
+        Inline requests are identical to the pre-cache request shape.
+
+        Only a cached content that expired or was evicted is retried inline, as a second
+        request with its own `reserve_request(scope)`; raises RequestLimitBlocked if the
+        usage guard refuses it. Any other error propagates without a retry.
+        """
+        cache_name = None
+        if use_context_cache and getattr(self, "context_cache", None) is not None:
+            cache_name = self.context_cache.get_or_create(
+                model_name, contents=[prompt], display_name="dj-blue-ai transcription prompt"
+            )
+
+        if cache_name:
+            cached_contents = ([prompt_context] if prompt_context else []) + list(parts)
+            try:
+                return self.client.generate_content(
+                    model_name=model_name,
+                    contents=cached_contents,
+                    config={**config, "cached_content": cache_name},
+                )
+            except Exception as exc:
+                if not is_cache_gone_error(exc):
+                    raise
+                # Expired/evicted server-side cache: forget it and resend the prompt inline.
+                print(f"[LLMUtilitySuite] Cached prompt expired, retrying inline: {exc}")
+                self.context_cache.invalidate(cache_name)
+                allowed, reason = reserve_request(scope, model_name=model_name)
+                if not allowed:
+                    raise RequestLimitBlocked(reason) from exc
+
+        inline_prompt = f"{prompt_context}\n\n{prompt}" if prompt_context else prompt
+        return self.client.generate_content(
+            model_name=model_name,
+            contents=[inline_prompt] + list(parts),
+            config=config if config else None,
+        )
+
+    def _demux_batch_payload(self, text: str, chunk_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Maps a batched JSON response back to chunk ids (by id, then by position)."""
+        if not text:
+            return {}
+        try:
+            payload = json.loads(self._strip_code_fences(text))
+        except (json.JSONDecodeError, TypeError):
+            return {}
+
+        if isinstance(payload, dict):
+            entries = payload.get("results", [])
+        elif isinstance(payload, list):
+            entries = payload
+        else:
+            entries = []
+        entries = [entry for entry in entries if isinstance(entry, dict)]
+
+        by_id: Dict[str, Dict[str, Any]] = {}
+        unlabeled: List[Dict[str, Any]] = []
+        for entry in entries:
+            entry_id = entry.get("chunk_id")
+            if entry_id is not None and str(entry_id) in chunk_ids and str(entry_id) not in by_id:
+                by_id[str(entry_id)] = self._normalize_transcription_payload(entry)
+            else:
+                unlabeled.append(entry)
+
+        # Models occasionally drop or mangle ids; fill the gaps positionally.
+        remaining = [chunk_id for chunk_id in chunk_ids if chunk_id not in by_id]
+        for chunk_id, entry in zip(remaining, unlabeled):
+            by_id[chunk_id] = self._normalize_transcription_payload(entry)
+        return by_id
+
     def _prepare_audio_part(
         self,
         audio_source: Union[str, Path, bytes],
@@ -352,3 +588,9 @@ class LLMUtilitySuite:
         if not vec1 or not vec2: return 0.0
         v1, v2 = np.array(vec1), np.array(vec2)
         return np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
+
+    @staticmethod
+    def calculate_cosine_similarities(queries: List[List[float]], vectors: List[List[float]]) -> np.ndarray:
+        """Batched cosine similarity: one (len(queries) x len(vectors)) matrix product."""
+        if not queries or not vectors: return np.zeros((len(queries), len(vectors)), dtype=np.float32)
+        return cosine_similarity_matrix(np.asarray(queries), np.asarray(vectors))
@@ -1,4 +1,4 @@
-from typing import Optional, List, Tuple
+from typing import Callable, Optional, List, Tuple
 from pathlib import Path
 from array import array
 from io import BytesIO
@@ -553,6 +553,10 @@ class AudioController:
             return None
         return self._chunks.pop(0)
 
+    def pending_chunks(self) -> int:
+        """Number of completed chunks waiting to be popped."""
+        return len(self._chunks)
+
     def _combine_to_dual_channel(self, mic_pcm: bytes, spk_pcm: bytes) -> Optional[bytes]:
         """
         Combine mic (mono) and speaker (stereo/mono) into a 2-channel 16-bit stream:
@@ -666,14 +670,21 @@ class LiveMixerController:
         
         self.mixer = None
         self._chunks: List[bytes] = []
+        self._block_listeners: List[Callable] = []
         self._stop_event = threading.Event()
         self._chunk_thread: Optional[threading.Thread] = None
         self._started = False
 
+    def add_block_listener(self, listener: Callable) -> None:
+        """Registers `listener(block)` for every mixed 20 ms int16 block (called on the mixer thread)."""
+        self._block_listeners.append(listener)
+        if self.mixer is not None:
+            self.mixer.block_listeners.append(listener)
+
     def start(self):
         if self._started:
             return
-        self.mixer = LiveMixer(blacklist=self.blacklist)
+        self.mixer = LiveMixer(blacklist=self.blacklist, block_listeners=self._block_listeners)
         self._stop_event.clear()
         self._chunks.clear()
         
@@ -712,6 +723,10 @@ class LiveMixerController:
             return None
         return self._chunks.pop(0)
 
+    def pending_chunks(self) -> int:
+        """Number of completed chunks waiting to be popped."""
+        return len(self._chunks)
+
     @property
     def mic(self):
         # Mock mic object for compatibility with TranscriptionManager's rate/sampwidth access
@@ -0,0 +1,193 @@
+"""
+Explicit context caching for static prompts (Gemini cached-content API).
+Falls back to "no cache" whenever caching is unavailable so callers can keep
+sending the prompt inline.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# Gemini rejects cached content below a model-specific minimum (1024 tokens for flash models).
+DEFAULT_MIN_CACHE_TOKENS = 1024
+DEFAULT_CACHE_TTL_SECONDS = 600
+# Refresh the TTL when less than this much lifetime remains.
+DEFAULT_REFRESH_MARGIN_SECONDS = 60
+# Rough chars-per-token ratio used to skip prompts that are certainly too small to cache.
+_APPROX_CHARS_PER_TOKEN = 4
+# After a transient create failure (network, quota, server error) caching is retried this much later.
+UNAVAILABLE_RETRY_SECONDS = 300
+# Create errors that won't go away for this model and prompt: unsupported model, prompt under the minimum.
+_PERMANENT_ERROR_MARKERS = ("too small", "min_total_token_count", "not supported", "does not support", "unsupported")
+# Request errors meaning the referenced cached content is gone (expired, evicted or deleted).
+_CACHE_GONE_MARKERS = ("not found", "not_found", "expired", "does not exist", "permission denied", "permission_denied")
+
+
+def _error_text(exc: BaseException) -> str:
+    parts = (getattr(exc, "status", None), getattr(exc, "message", None), exc)
+    return " ".join(str(part) for part in parts if part).lower()
+
+
+def is_cache_gone_error(exc: BaseException) -> bool:
+    """True when a request failed because its cached content no longer exists on the server."""
+    text = _error_text(exc)
+    return "cache" in text and any(marker in text for marker in _CACHE_GONE_MARKERS)
+
+
+def is_permanent_cache_error(exc: BaseException) -> bool:
+    """True when creating cached content can never succeed for this model and prompt."""
+    text = _error_text(exc)
+    return any(marker in text for marker in _PERMANENT_ERROR_MARKERS)
+
+
+@dataclass
+class CachedPrompt:
+    name: str
+    model_name: str
+    expires_at: float
+    approx_tokens: int
+
+
+class ContextCacheManager:
+    """
+    Creates, refreshes (TTL) and reuses cached content for static prompts, per model.
+    `get_or_create` returns a cached-content name or None when the caller should
+    send the prompt inline instead.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        *,
+        ttl_seconds: int = DEFAULT_CACHE_TTL_SECONDS,
+        refresh_margin_seconds: int = DEFAULT_REFRESH_MARGIN_SECONDS,
+        min_cache_tokens: int = DEFAULT_MIN_CACHE_TOKENS,
+    ):
+        self._client = client
+        self._ttl_seconds = max(60, int(ttl_seconds))
+        self._refresh_margin_seconds = max(0, min(int(refresh_margin_seconds), self._ttl_seconds // 2))
+        self._min_cache_tokens = max(0, int(min_cache_tokens))
+        self._entries: Dict[Tuple[str, str], CachedPrompt] = {}
+        self._unsupported: set = set()
+        self._retry_after: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(model_name: str, system_instruction: Optional[str], contents: List[str]) -> Tuple[str, str]:
+        digest = hashlib.sha256()
+        digest.update((system_instruction or "").encode("utf-8"))
+        for item in contents:
+            digest.update(b"\x00")
+            digest.update(str(item).encode("utf-8"))
+        return model_name, digest.hexdigest()
+
+    @staticmethod
+    def supports_model(model_name: str) -> bool:
+        # Gemma and other open models have no cached-content support.
+        return "gemini" in str(model_name or "").lower()
+
+    def get_or_create(
+        self,
+        model_name: str,
+        *,
+        contents: Optional[List[str]] = None,
+        system_instruction: Optional[str] = None,
+        display_name: Optional[str] = None,
+    ) -> Optional[str]:
+        """Returns a live cached-content name for the static prompt, or None to fall back."""
+        contents = [str(item) for item in (contents or []) if item]
+        if not contents and not system_instruction:
+            return None
+        if not self.supports_model(model_name):
+            return None
+
+        key = self._cache_key(model_name, system_instruction, contents)
+        approx_tokens = (len(system_instruction or "") + sum(len(c) for c in contents)) // _APPROX_CHARS_PER_TOKEN
+        if approx_tokens < self._min_cache_tokens:
+            return None
+
+        with self._lock:
+            now = time.monotonic()
+            if key in self._unsupported or self._retry_after.get(key, 0.0) > now:
+                return None
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                remaining = entry.expires_at - now
+                if remaining > self._refresh_margin_seconds:
+                    return entry.name
+                if remaining > 0 and self._refresh_locked(entry, now):
+                    return entry.name
+                self._entries.pop(key, None)
+
+            try:
+                cached = self._client.create_cached_content(
+                    model_name,
+                    contents=contents or None,
+                    system_instruction=system_instruction,
+                    ttl_seconds=self._ttl_seconds,
+                    display_name=display_name,
+                )
+            except Exception as exc:
+                if is_permanent_cache_error(exc):
+                    print(f"[ContextCache] Caching unsupported for {model_name}, sending prompt inline: {exc}")
+                    self._unsupported.add(key)
+                else:
+                    print(
+                        f"[ContextCache] Caching unavailable for {model_name}, sending prompt inline "
+                        f"for {UNAVAILABLE_RETRY_SECONDS}s: {exc}"
+                    )
+                    self._retry_after[key] = now + UNAVAILABLE_RETRY_SECONDS
+                return None
+
+            self._retry_after.pop(key, None)
+            name = getattr(cached, "name", None)
+            if not name:
+                self._unsupported.add(key)
+                return None
+            self._entries[key] = CachedPrompt(
+                name=name,
+                model_name=model_name,
+                expires_at=now + self._ttl_seconds,
+                approx_tokens=approx_tokens,
+            )
+            return name
+
+    def _refresh_locked(self, entry: CachedPrompt, now: float) -> bool:
+        try:
+            self._client.refresh_cached_content(entry.name, ttl_seconds=self._ttl_seconds)
+        except Exception as exc:
+            print(f"[ContextCache] TTL refresh failed for {entry.name}: {exc}")
+            return False
+        entry.expires_at = now + self._ttl_seconds
+        return True
+
+    def invalidate(self, name: str) -> None:
+        """Forgets a cache entry (e.g. after the server reported it missing or expired)."""
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.name == name:
+                    del self._entries[key]
+
+    def release(self, name: str) -> None:
+        """Forgets and deletes one cache entry (e.g. a transcript that was replaced)."""
+        self.invalidate(name)
+        try:
+            self._client.delete_cached_content(name)
+        except Exception:
+            pass
+
+    def clear(self) -> None:
+        """Deletes every cache this manager created."""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            try:
+                self._client.delete_cached_content(entry.name)
+            except Exception:
+                pass
@@ -0,0 +1,244 @@
+"""
+Embedding cache and vector index for transcript retrieval.
+
+`EmbeddingCache` persists embeddings in SQLite keyed by sha256(model + text), so the
+same segment is never embedded twice. `TranscriptVectorIndex` keeps L2-normalized
+float32 rows in a memory-mapped .npy matrix and answers batched top-k cosine queries
+with a single matrix product.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ui_ux_team.blue_ui.config.runtime_paths import user_config_dir
+
+EMBEDDING_CACHE_FILE = "embedding_cache.sqlite3"
+DEFAULT_SEGMENT_CHARS = 800
+DEFAULT_SEGMENT_OVERLAP = 120
+# Most texts the Gemini batch-embed endpoint accepts per request.
+EMBED_BATCH_LIMIT = 100
+
+
+def embedding_key(model_name: str, text: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(str(model_name).encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(str(text).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Returns float32 rows scaled to unit length (zero rows stay zero)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def cosine_similarity_matrix(queries: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Cosine similarity of every query row against every matrix row (Q x N)."""
+    return normalize_rows(queries) @ normalize_rows(matrix).T
+
+
+def split_transcript(
+    text: str,
+    max_chars: int = DEFAULT_SEGMENT_CHARS,
+    overlap: int = DEFAULT_SEGMENT_OVERLAP,
+) -> List[str]:
+    """Splits a transcript into overlapping segments, preferring line boundaries."""
+    text = (text or "").strip()
+    if not text:
+        return []
+    max_chars = max(100, int(max_chars))
+    overlap = max(0, min(int(overlap), max_chars // 2))
+
+    segments: List[str] = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + max_chars)
+        if end < len(text):
+            cut = text.rfind("\n", start + max_chars // 2, end)
+            if cut > start:
+                end = cut
+        segment = text[start:end].strip()
+        if segment:
+            segments.append(segment)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return segments
+
+
+class EmbeddingCache:
+    """Persistent embedding store keyed by content hash and model."""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else user_config_dir() / EMBEDDING_CACHE_FILE
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get_many(self, model_name: str, texts: Sequence[str]) -> Dict[str, List[float]]:
+        """Returns {text: vector} for texts already cached under this model."""
+        keys = {embedding_key(model_name, t): t for t in texts}
+        if not keys:
+            return {}
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            conn = self._connection()
+            key_list = list(keys)
+            # SQLite caps bound parameters; query in slices.
+            for i in range(0, len(key_list), 500):
+                chunk = key_list[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for key, blob in rows:
+                    found[keys[key]] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, model_name: str, items: Iterable[Tuple[str, Sequence[float]]]) -> None:
+        rows = []
+        for text, vector in items:
+            if vector is None or len(vector) == 0:
+                continue
+            arr = np.asarray(vector, dtype=np.float32)
+            rows.append((embedding_key(model_name, text), model_name, int(arr.size), arr.tobytes()))
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connection()
+            conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def cached_embeddings(
+    client,
+    cache: Optional[EmbeddingCache],
+    model_name: str,
+    texts: Sequence[str],
+    *,
+    batch_size: int = EMBED_BATCH_LIMIT,
+    reserve: Optional[Callable[[], None]] = None,
+) -> List[List[float]]:
+    """
+    Embeds `texts` in input order, calling `client.embed_content` only for cache misses,
+    at most `batch_size` texts per call. `reserve()` runs before every call (e.g. to take
+    a request from the usage limits) and stops the remaining calls by raising.
+    Raises if an API call fails (vectors of earlier calls stay cached); missing vectors
+    come back as empty lists.
+    """
+    texts = [str(t) for t in texts]
+    hits = cache.get_many(model_name, texts) if cache is not None else {}
+    misses = list(dict.fromkeys(t for t in texts if t not in hits))
+    batch_size = max(1, int(batch_size))
+    for start in range(0, len(misses), batch_size):
+        batch = misses[start:start + batch_size]
+        if reserve is not None:
+            reserve()
+        vectors = client.embed_content(model_name=model_name, contents=batch)
+        fresh = list(zip(batch, vectors or []))
+        hits.update(fresh)
+        if cache is not None:
+            cache.put_many(model_name, fresh)
+    return [list(hits.get(t, [])) for t in texts]
+
+
+class TranscriptVectorIndex:
+    """
+    Memory-mapped float32 matrix of normalized segment embeddings with batched top-k search.
+    Rows are stored in `<directory>/vectors.npy`, segment texts in `<directory>/segments.json`.
+    """
+
+    def __init__(self, directory: Optional[Path] = None):
+        if directory is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix="dj_blue_vectors_")
+            directory = Path(self._tmp.name)
+        else:
+            self._tmp = None
+        self.directory = Path(directory)
+        self.segments: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.directory / "vectors.npy"
+
+    @property
+    def segments_path(self) -> Path:
+        return self.directory / "segments.json"
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def build(self, segments: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        if len(segments) != len(vectors):
+            raise ValueError("segments and vectors must have the same length")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        matrix = normalize_rows(np.asarray(vectors, dtype=np.float32)) if len(vectors) else np.zeros((0, 0), np.float32)
+        np.save(self.vectors_path, matrix)
+        self.segments_path.write_text(json.dumps(list(segments)), encoding="utf-8")
+        self._load()
+
+    def load(self) -> bool:
+        if not (self.vectors_path.exists() and self.segments_path.exists()):
+            return False
+        self._load()
+        return True
+
+    def _load(self) -> None:
+        self._matrix = np.load(self.vectors_path, mmap_mode="r")
+        self.segments = json.loads(self.segments_path.read_text(encoding="utf-8"))
+
+    def search(self, queries: Sequence[Sequence[float]], k: int = 4) -> List[List[Tuple[int, float]]]:
+        """Top-k (segment index, cosine score) per query row, best first."""
+        if self._matrix is None or not len(self.segments):
+            return [[] for _ in queries]
+        q = normalize_rows(np.asarray(queries, dtype=np.float32))
+        scores = q @ self._matrix.T
+        k = max(1, min(int(k), scores.shape[1]))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, idx in zip(scores, top):
+            order = idx[np.argsort(-row[idx])]
+            results.append([(int(i), float(row[i])) for i in order])
+        return results
+
+    def top_passages(self, query: Sequence[float], k: int = 4) -> List[str]:
+        """Best-matching segments for one query, in transcript order."""
+        hits = self.search([query], k=k)[0]
+        return [self.segments[i] for i, _ in sorted(hits)]
+
+    def close(self) -> None:
+        self._matrix = None
+        if self._tmp is not None:
+            self._tmp.cleanup()
+            self._tmp = None
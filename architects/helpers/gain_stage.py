@@ -0,0 +1,125 @@
+"""
+In-place gain for int16 PCM blocks on the audio thread.
+
+`GainStage.process()` works on preallocated float32/int16 scratch buffers (grown only
+when a block is larger than any seen before), so a steady-state callback allocates no
+sample memory. Gain changes are ramped linearly per sample over `ramp_frames` instead of
+stepping at a block boundary, which removes zipper noise when the volume slider moves.
+At unity gain with no ramp in flight the block is returned untouched.
+
+Loudness normalization is folded into the same multiply: the player sets
+`volume * loudness_gain(track LUFS)` as the gain, so it costs nothing extra per block.
+A boosted quiet track can still have full-scale transients, so above unity gain samples
+past `LIMITER_KNEE` are soft-limited (tanh) towards full scale instead of hard-clipped.
+The limiter only runs on blocks that actually cross the knee.
+"""
+
+import math
+
+import numpy as np
+
+RAMP_SECONDS = 0.02
+TARGET_LUFS = -14.0
+MAX_BOOST_DB = 6.0  # quiet tracks are raised at most this much
+LIMITER_KNEE = 0.8 * 32767  # boosted samples above this (about -2 dBFS) are compressed, never clipped
+_LIMITER_RANGE = 32767 - LIMITER_KNEE
+
+
+def loudness_gain(lufs, target_lufs: float = TARGET_LUFS, max_boost_db: float = MAX_BOOST_DB) -> float:
+    """Linear gain that brings a track measured at `lufs` to `target_lufs`; 1.0 when unknown."""
+    try:
+        lufs = float(lufs)
+    except (TypeError, ValueError):
+        return 1.0
+    if not math.isfinite(lufs):
+        return 1.0
+    return 10.0 ** (min(float(target_lufs) - lufs, max_boost_db) / 20.0)
+
+
+class GainStage:
+    """Per-player gain; `set_gain` may be called from any thread, `process` from the audio thread."""
+
+    def __init__(self, nchannels: int, sample_rate: int, frames_per_block: int = 1024,
+                 ramp_seconds: float = RAMP_SECONDS):
+        self.nchannels = int(nchannels)
+        self.ramp_frames = max(1, int(round(sample_rate * ramp_seconds)))
+        self._ramp = np.arange(1, self.ramp_frames + 1, dtype=np.float32) / np.float32(self.ramp_frames)
+        self._target = 1.0
+        # Audio-thread state: the ramp in flight and the gain reached by the last sample.
+        self._ramp_from = 1.0
+        self._ramp_to = 1.0
+        self._ramp_pos = self.ramp_frames
+        self._gain = 1.0
+        self._allocate(frames_per_block)
+
+    def _allocate(self, frames: int) -> None:
+        self._scratch = np.empty(frames * self.nchannels, dtype=np.float32)
+        self._excess = np.empty(frames * self.nchannels, dtype=np.float32)
+        self._out = np.empty(frames * self.nchannels, dtype=np.int16)
+        self._gains = np.empty(frames, dtype=np.float32)
+
+    @property
+    def gain(self) -> float:
+        return self._target
+
+    def set_gain(self, gain: float, ramp: bool = True) -> None:
+        """Sets the target gain; without `ramp` (nothing playing yet) it applies immediately."""
+        gain = max(0.0, float(gain))
+        if not ramp:
+            self._ramp_from = self._ramp_to = self._gain = gain
+            self._ramp_pos = self.ramp_frames
+        self._target = gain
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Applies the gain to interleaved int16 `samples`. The result may be `samples` itself
+        or a view of an internal buffer that is overwritten by the next call.
+        """
+        target = self._target
+        if target != self._ramp_to:
+            self._ramp_from, self._ramp_to, self._ramp_pos = self._gain, target, 0
+        ramping = self._ramp_pos < self.ramp_frames
+        if not ramping and target == 1.0:
+            return samples
+
+        count = samples.size
+        frames = count // self.nchannels
+        if count > self._scratch.size:
+            self._allocate(frames)
+        work = self._scratch[:count]
+        np.copyto(work, samples, casting="unsafe")
+        block = work.reshape(frames, self.nchannels)
+
+        ramped = 0
+        if ramping:
+            ramped = min(frames, self.ramp_frames - self._ramp_pos)
+            gains = self._gains[:ramped]
+            np.multiply(self._ramp[self._ramp_pos:self._ramp_pos + ramped], self._ramp_to - self._ramp_from, out=gains)
+            gains += self._ramp_from
+            block[:ramped] *= gains[:, None]
+            self._ramp_pos += ramped
+            self._gain = float(gains[-1]) if ramped else self._gain
+        if ramped < frames:
+            block[ramped:] *= self._ramp_to
+            self._gain = self._ramp_to
+        if max(self._ramp_from, self._ramp_to) > 1.0 and (work.max() > LIMITER_KNEE or work.min() < -LIMITER_KNEE):
+            self._limit(work)
+
+        np.rint(work, out=work)
+        np.clip(work, -32768, 32767, out=work)
+        out = self._out[:count]
+        np.copyto(out, work, casting="unsafe")
+        return out
+
+    def _limit(self, work: np.ndarray) -> None:
+        """Soft knee in place: |x| above LIMITER_KNEE approaches full scale along a tanh curve."""
+        excess = self._excess[:work.size]
+        np.abs(work, out=excess)
+        excess -= LIMITER_KNEE
+        np.maximum(excess, 0.0, out=excess)
+        excess /= _LIMITER_RANGE
+        np.tanh(excess, out=excess)
+        excess *= _LIMITER_RANGE
+        np.copysign(excess, work, out=excess)
+        np.clip(work, -LIMITER_KNEE, LIMITER_KNEE, out=work)
+        work += excess
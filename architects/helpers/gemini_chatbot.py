@@ -2,6 +2,8 @@ import datetime
 import typing
 
 from ui_ux_team.blue_ui import settings as app_settings
+from architects.helpers.context_cache import ContextCacheManager, is_cache_gone_error
+from architects.helpers.embedding_index import EmbeddingCache, TranscriptVectorIndex, cached_embeddings, split_transcript
 from architects.helpers.genai_client import GenAIClient, GenAIChatSession
 from ui_ux_team.blue_ui.app.api_usage_guard import record_usage, reserve_request
 
@@ -16,6 +18,12 @@ DEFAULT_SYSTEM_INSTRUCTION = (
     "Constraint: Maintain strict factual accuracy and do not hallucinate information."
 )
 
+# Transcripts longer than this are answered from retrieved passages when they can't be cached.
+RETRIEVAL_MIN_CHARS = 16000
+RETRIEVAL_TOP_K = 4
+EMBEDDING_MODEL = "models/embedding-001"
+
+
 class GeminiChatbot:
     """
     A generic, plug-and-play chatbot component wrapping the GenAIClient compatibility layer.
@@ -34,6 +42,10 @@ class GeminiChatbot:
         self.current_transcript = ""
         self.last_error = ""
         self.cached_content_name = None
+        self.context_cache = ContextCacheManager(self.client)
+        self._cache_contents = []
+        self.embedding_cache = EmbeddingCache()
+        self.vector_index = None
 
     @staticmethod
     def _normalize_model_name(model_name: str) -> str:
@@ -61,40 +73,182 @@ class GeminiChatbot:
         transcript_for_cache = self.current_transcript.strip()
         
         config = {"system_instruction": self.system_instruction}
-        
-        # New SDK Context Caching Logic (Simplified for the compatibility layer)
-        # Note: If context caching is needed, we'd add it to GenAIClient.
-        # For now, we follow the "preserve behavior" rule by using history for context.
-        
+
         try:
+            # System instruction + transcript are static for the whole session, so they go into
+            # server-side cached content once instead of being resent with every turn.
+            self._release_cached_context()
+            self.context_cache = ContextCacheManager(self.client, ttl_seconds=max(1, int(ttl_minutes)) * 60)
+            self._cache_contents = (
+                [f"Use the following transcript as context:\n\n{transcript_for_cache}"] if transcript_for_cache else []
+            )
+            self.cached_content_name = self._cached_context_name()
+            self._close_vector_index()
+            if not self.cached_content_name and len(transcript_for_cache) >= RETRIEVAL_MIN_CHARS:
+                self.vector_index = self._build_vector_index(transcript_for_cache)
+
             history = []
-            if transcript_for_cache:
+            pinned_turns = 0
+            if transcript_for_cache and not self.cached_content_name and not self.vector_index:
                 history = [
-                    {"role": "user", "parts": [{"text": f"Use the following transcript as context:\n\n{transcript_for_cache}"}]},
+                    {"role": "user", "parts": [{"text": self._cache_contents[0]}]},
                     {"role": "model", "parts": [{"text": "Understood. I will prioritize the transcript context."}]}
                 ]
+                pinned_turns = len(history)
             
             self.chat_session = GenAIChatSession(
                 client=self.client.client,
                 model_name=self.model_name,
                 history=history,
-                config=config
+                config=config,
+                cached_content=self.cached_content_name,
+                pinned_turns=pinned_turns,
             )
             return True
         except Exception as e:
             self.last_error = f"Error loading context: {e}"
             return False
 
+    def _embed(self, texts: typing.List[str]) -> typing.List[typing.List[float]]:
+        """Embeds texts through the persistent cache; each request for cache misses counts against usage limits."""
+        def reserve() -> None:
+            allowed, reason = reserve_request("embedding", model_name=EMBEDDING_MODEL)
+            if not allowed:
+                raise RuntimeError(reason)
+
+        return cached_embeddings(self.client, self.embedding_cache, EMBEDDING_MODEL, texts, reserve=reserve)
+
+    def _build_vector_index(self, transcript: str) -> typing.Optional[TranscriptVectorIndex]:
+        segments = split_transcript(transcript)
+        try:
+            vectors = self._embed(segments)
+        except Exception as e:
+            print(f"[GeminiChatbot] Transcript indexing failed, sending full transcript: {e}")
+            return None
+        if not segments or any(not v for v in vectors):
+            return None
+        index = TranscriptVectorIndex()
+        index.build(segments, vectors)
+        return index
+
+    def _close_vector_index(self) -> None:
+        if self.vector_index is not None:
+            self.vector_index.close()
+        self.vector_index = None
+
+    def _with_retrieved_context(self, message: str) -> str:
+        """Prefixes the message with the most relevant transcript passages."""
+        if self.vector_index is None:
+            return message
+        try:
+            query = self._embed([message])[0]
+        except Exception as e:
+            print(f"[GeminiChatbot] Passage retrieval failed, sending full transcript: {e}")
+            self._close_vector_index()
+            self._fall_back_to_inline_context()
+            return message
+        passages = self.vector_index.top_passages(query, k=RETRIEVAL_TOP_K)
+        if not passages:
+            return message
+        joined = "\n\n---\n\n".join(passages)
+        return f"Relevant transcript passages:\n\n{joined}\n\nQuestion: {message}"
+
+    def _cached_context_name(self) -> typing.Optional[str]:
+        if not self._cache_contents:
+            return None
+        return self.context_cache.get_or_create(
+            self.model_name,
+            contents=self._cache_contents,
+            system_instruction=self.system_instruction,
+            display_name="dj-blue-chat-context",
+        )
+
+    def _release_cached_context(self) -> None:
+        if self.cached_content_name:
+            self.context_cache.release(self.cached_content_name)
+        self.cached_content_name = None
+
+    def _refresh_cached_context(self) -> None:
+        """Keeps the session's cached content alive; re-seeds history if the cache is gone."""
+        if not self.cached_content_name:
+            return
+        name = self._cached_context_name()
+        if name == self.cached_content_name:
+            return
+        if not name:
+            self._fall_back_to_inline_context()
+            return
+        self.cached_content_name = name
+        self.chat_session.set_cached_content(name)
+
+    def _fall_back_to_inline_context(self) -> None:
+        self.cached_content_name = None
+        self.chat_session.set_cached_content(None)
+        seed = [
+            {"role": "user", "parts": [{"text": self._cache_contents[0]}]},
+            {"role": "model", "parts": [{"text": "Understood. I will prioritize the transcript context."}]}
+        ]
+        self.chat_session.replace_history(seed + self.chat_session.history, pinned_turns=len(seed))
+
+    def _compact_history(self) -> None:
+        """Summarizes older turns once the history window grows past its budget."""
+        if not self.chat_session.needs_compaction():
+            return
+        allowed, reason = reserve_request("chat", model_name=self.model_name)
+        if not allowed:
+            print(f"[GeminiChatbot] Skipping history summary: {reason}")
+            return
+        result = self.chat_session.compact_history()
+        record_usage(scope="chat", model_name=self.model_name, usage=result.get("usage", {}))
+        if result.get("error"):
+            print(f"[GeminiChatbot] History summary failed, older turns dropped: {result['error']}")
+
     def send_message(self, message: str) -> typing.Dict:
+        return self._send(message)
+
+    def send_message_stream(self, message: str, on_chunk: typing.Callable[[str], None]) -> typing.Dict:
+        """Like `send_message`, but calls `on_chunk` with each text delta as it arrives."""
+        return self._send(message, on_chunk=on_chunk)
+
+    def _send(self, message: str, on_chunk: typing.Optional[typing.Callable[[str], None]] = None) -> typing.Dict:
         if not self.chat_session:
              return {"error": "Chat session not initialized. Please load context first."}
 
         try:
+            self._refresh_cached_context()
+            self._compact_history()
+            message = self._with_retrieved_context(message)
+
             allowed, reason = reserve_request("chat", model_name=self.model_name)
             if not allowed:
                 return {"error": reason, "limit_blocked": True}
 
-            response = self.chat_session.send_message(message)
+            streamed = []
+
+            def forward(text: str) -> None:
+                streamed.append(text)
+                on_chunk(text)
+
+            def dispatch() -> typing.Dict:
+                if on_chunk is None:
+                    return self.chat_session.send_message(message)
+                return self.chat_session.send_message_stream(message, on_chunk=forward)
+
+            try:
+                response = dispatch()
+            except Exception as e:
+                # A partially streamed answer can't be retried without duplicating text.
+                if not self.cached_content_name or streamed or not is_cache_gone_error(e):
+                    raise
+                # Cached content expired or was evicted server-side: continue without it.
+                print(f"[GeminiChatbot] Cached context expired, resending transcript inline: {e}")
+                self.context_cache.invalidate(self.cached_content_name)
+                self._fall_back_to_inline_context()
+                # The retry is a second billed request.
+                allowed, reason = reserve_request("chat", model_name=self.model_name)
+                if not allowed:
+                    return {"error": reason, "limit_blocked": True}
+                response = dispatch()
             usage = response.get("usage", {})
             record_usage(scope="chat", model_name=self.model_name, usage=usage)
 
@@ -7,7 +7,7 @@ from __future__ import annotations
 
 import time
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Union
 
 from google import genai
 from google.genai import types
@@ -102,6 +102,37 @@ class GenAIClient:
 
         return uploaded
 
+    def create_cached_content(
+        self,
+        model_name: str,
+        contents: Optional[List[Any]] = None,
+        system_instruction: Optional[str] = None,
+        ttl_seconds: int = 600,
+        display_name: Optional[str] = None,
+    ) -> Any:
+        """Creates server-side cached content (static prompt/context) for a model."""
+        cfg_dict: Dict[str, Any] = {"ttl": f"{int(ttl_seconds)}s"}
+        if contents:
+            cfg_dict["contents"] = [
+                types.Content(role="user", parts=[types.Part.from_text(text=c)]) if isinstance(c, str) else c
+                for c in self._normalize_contents(contents)
+            ]
+        if system_instruction:
+            cfg_dict["system_instruction"] = types.Content(parts=[types.Part.from_text(text=system_instruction)])
+        if display_name:
+            cfg_dict["display_name"] = display_name
+        return self.client.caches.create(model=model_name, config=types.CreateCachedContentConfig(**cfg_dict))
+
+    def refresh_cached_content(self, name: str, ttl_seconds: int = 600) -> Any:
+        """Extends the TTL of an existing cached content."""
+        return self.client.caches.update(
+            name=name, config=types.UpdateCachedContentConfig(ttl=f"{int(ttl_seconds)}s")
+        )
+
+    def delete_cached_content(self, name: str) -> None:
+        """Deletes cached content."""
+        self.client.caches.delete(name=name)
+
     def list_models(self) -> List[Any]:
         """Lists available models."""
         return list(self.client.models.list())
@@ -130,49 +161,211 @@ class GenAIClient:
 class GenAIChatSession:
     """Wrapper for chat sessions to maintain history and normalization."""
 
-    def __init__(self, client: genai.Client, model_name: str, history: Optional[List[Dict]] = None, config: Optional[Dict] = None):
+    SUMMARY_PROMPT = (
+        "Summarize the following conversation between a user and an assistant. "
+        "Keep facts, decisions, open questions and any transcript details that were discussed. "
+        "Be concise; respond with the summary only."
+    )
+
+    def __init__(
+        self,
+        client: genai.Client,
+        model_name: str,
+        history: Optional[List[Dict]] = None,
+        config: Optional[Dict] = None,
+        cached_content: Optional[str] = None,
+        pinned_turns: int = 0,
+        max_history_chars: int = 24000,
+        keep_recent_turns: int = 6,
+    ):
         self.client = client
         self.model_name = model_name
         self.history = history or []
         self.config = config
+        # Name of server-side cached content holding system instruction + transcript.
+        self.cached_content = cached_content
+        # Leading turns (e.g. transcript seeding) that are never summarized away.
+        self.pinned_turns = max(0, int(pinned_turns))
+        self.max_history_chars = max(0, int(max_history_chars))
+        self.keep_recent_turns = max(2, int(keep_recent_turns))
+        self._normalized_turns: List[types.Content] = []
+        self._final_config: Optional[types.GenerateContentConfig] = None
+        self._config_key: Optional[tuple] = None
 
     def send_message(self, message: str) -> Dict[str, Any]:
         """Sends a message and updates local history shim."""
         self.history.append({"role": "user", "parts": [{"text": message}]})
+
+        # Only turns added since the previous call are normalized.
+        normalized_history = self._normalized_history()
+
+        try:
+            response = self.client.models.generate_content(
+                model=self.model_name,
+                contents=normalized_history,
+                config=self._build_config()
+            )
+        except Exception:
+            # Drop the unanswered turn so a retry doesn't send it twice.
+            self._drop_unanswered_turn()
+            raise
         
-        # Normalize history before sending
-        normalized_history = self._normalize_history(self.history)
-        
-        # Build types.GenerateContentConfig
+        normalized = self._normalize_response(response)
+        if normalized.get("text"):
+            self.history.append({"role": "model", "parts": [{"text": normalized["text"]}]})
+            
+        return normalized
+
+    def send_message_stream(
+        self, message: str, on_chunk: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Streams a reply via `generate_content_stream`, calling `on_chunk` with each text delta.
+        Returns the same normalized dict as `send_message` once the stream completes.
+        """
+        self.history.append({"role": "user", "parts": [{"text": message}]})
+        normalized_history = self._normalized_history()
+
+        pieces: List[str] = []
+        usage_source = None
+        try:
+            stream = self.client.models.generate_content_stream(
+                model=self.model_name,
+                contents=normalized_history,
+                config=self._build_config()
+            )
+            for chunk in stream:
+                text = getattr(chunk, "text", None)
+                if text:
+                    pieces.append(text)
+                    if on_chunk:
+                        on_chunk(text)
+                if getattr(chunk, "usage_metadata", None):
+                    usage_source = chunk
+        except Exception:
+            self._drop_unanswered_turn()
+            raise
+
+        full_text = "".join(pieces)
+        # Usage totals arrive on the final chunk(s) of the stream.
+        normalized = {
+            "text": full_text,
+            "usage": self._normalize_usage(usage_source.usage_metadata) if usage_source is not None else {},
+        }
+        if full_text:
+            self.history.append({"role": "model", "parts": [{"text": full_text}]})
+        return normalized
+
+    def set_cached_content(self, name: Optional[str]) -> None:
+        """Points the session at new cached content (or None to send system instruction inline)."""
+        self.cached_content = name
+
+    def replace_history(self, history: List[Dict], pinned_turns: Optional[int] = None) -> None:
+        """Swaps the history wholesale and drops memoized turns."""
+        self.history = list(history)
+        if pinned_turns is not None:
+            self.pinned_turns = max(0, int(pinned_turns))
+        self._normalized_turns = []
+
+    def _build_config(self) -> Optional[types.GenerateContentConfig]:
+        """Builds (and memoizes) the request config for the current cache/config state."""
+        key = (id(self.config), self.cached_content)
+        if self._config_key == key:
+            return self._final_config
+
         final_config = None
-        if self.config:
+        if self.config or self.cached_content:
             is_gemini = "gemini" in self.model_name.lower()
-            cfg_dict = dict(self.config)
+            cfg_dict = dict(self.config or {})
             sys_inst = cfg_dict.pop("system_instruction", None)
-            
+
             actual_sys_inst = None
-            if sys_inst and is_gemini:
+            if self.cached_content:
+                # System instruction lives inside the cached content; the API rejects both.
+                cfg_dict["cached_content"] = self.cached_content
+            elif sys_inst and is_gemini:
                 if isinstance(sys_inst, str):
                     actual_sys_inst = types.Content(parts=[types.Part.from_text(text=sys_inst)])
                 else:
                     actual_sys_inst = sys_inst
-            
+
             final_config = types.GenerateContentConfig(
                 system_instruction=actual_sys_inst,
                 **cfg_dict
             )
 
-        response = self.client.models.generate_content(
-            model=self.model_name,
-            contents=normalized_history,
-            config=final_config
+        self._final_config = final_config
+        self._config_key = key
+        return final_config
+
+    def _drop_unanswered_turn(self) -> None:
+        """Removes the last user turn after a failed send, along with its memoized Content."""
+        self.history.pop()
+        del self._normalized_turns[len(self.history):]
+
+    def _normalized_history(self) -> List[types.Content]:
+        """Returns SDK Content for the full history, normalizing only unseen turns."""
+        if len(self._normalized_turns) > len(self.history):
+            self._normalized_turns = []
+        pending = self.history[len(self._normalized_turns):]
+        if pending:
+            self._normalized_turns.extend(self._normalize_history(pending))
+        return list(self._normalized_turns)
+
+    # --- Rolling summarization window ---
+
+    @staticmethod
+    def _turn_chars(turn: Dict) -> int:
+        return sum(len(p.get("text", "")) for p in turn.get("parts", []) if isinstance(p, dict))
+
+    def history_chars(self) -> int:
+        """Characters in the summarizable (non-pinned) part of the history."""
+        return sum(self._turn_chars(turn) for turn in self.history[self.pinned_turns:])
+
+    def needs_compaction(self) -> bool:
+        if not self.max_history_chars:
+            return False
+        window = len(self.history) - self.pinned_turns
+        return window > self.keep_recent_turns and self.history_chars() > self.max_history_chars
+
+    def compact_history(self) -> Dict[str, Any]:
+        """
+        Folds older turns into a single summary turn so the prompt stays under
+        `max_history_chars`. Falls back to dropping the oldest turns when summarizing fails.
+        """
+        pinned = self.history[:self.pinned_turns]
+        window = self.history[self.pinned_turns:]
+        # Keep an even number of recent turns so user/model alternation is preserved.
+        keep = self.keep_recent_turns - (self.keep_recent_turns % 2)
+        older, recent = window[:-keep], window[-keep:]
+        if not older:
+            return {"usage": {}}
+
+        transcript = "\n".join(
+            f"{turn.get('role', 'user')}: "
+            + " ".join(p.get("text", "") for p in turn.get("parts", []) if isinstance(p, dict))
+            for turn in older
         )
-        
-        normalized = self._normalize_response(response)
-        if normalized.get("text"):
-            self.history.append({"role": "model", "parts": [{"text": normalized["text"]}]})
-            
-        return normalized
+        result: Dict[str, Any] = {"usage": {}}
+        try:
+            response = self.client.models.generate_content(
+                model=self.model_name,
+                contents=[f"{self.SUMMARY_PROMPT}\n\n{transcript}"],
+            )
+            result = self._normalize_response(response)
+            summary = (result.get("text") or "").strip()
+        except Exception as e:
+            result = {"usage": {}, "error": str(e)}
+            summary = ""
+
+        folded: List[Dict] = []
+        if summary:
+            folded = [
+                {"role": "user", "parts": [{"text": f"Summary of our earlier conversation:\n{summary}"}]},
+                {"role": "model", "parts": [{"text": "Understood. I will keep that earlier conversation in mind."}]},
+            ]
+        self.replace_history(pinned + folded + recent)
+        return result
 
     def _normalize_history(self, history: List[Dict]) -> List[Any]:
         """Ensures history entries match the new SDK's expectation."""
@@ -203,11 +396,14 @@ class GenAIChatSession:
             "usage": {},
         }
         if hasattr(response, "usage_metadata") and response.usage_metadata:
-            u = response.usage_metadata
-            normalized["usage"] = {
-                "prompt_tokens": getattr(u, "prompt_token_count", 0),
-                "candidates_tokens": getattr(u, "candidates_token_count", 0),
-                "total_tokens": getattr(u, "total_token_count", 0),
-                "cached_tokens": getattr(u, "cached_content_token_count", 0),
-            }
+            normalized["usage"] = self._normalize_usage(response.usage_metadata)
         return normalized
+
+    @staticmethod
+    def _normalize_usage(u: Any) -> Dict[str, Any]:
+        return {
+            "prompt_tokens": getattr(u, "prompt_token_count", 0),
+            "candidates_tokens": getattr(u, "candidates_token_count", 0),
+            "total_tokens": getattr(u, "total_token_count", 0),
+            "cached_tokens": getattr(u, "cached_content_token_count", 0),
+        }
@@ -17,7 +17,7 @@ from typing import Any, Dict, Optional, Type
 TYPE_KEY = "__type__"
 SONG_TYPE = "Song"
 _SONG_CLASS: Optional[Type[Any]] = None
-_SKIP_ATTRS = {"mem_man"}
+_SKIP_ATTRS = {"mem_man", "_analysis"}  # the analysis lives in the analysis cache
 
 
 def make_json_safe(value: Any) -> Any:
@@ -0,0 +1,363 @@
+"""
+In-memory index of the music library.
+
+The folder is scanned once with `os.scandir` (recursively, on a background thread),
+then kept current through filesystem events when `watchdog` is installed. Without it
+(or when the OS refuses another watch) changes made while the app runs are not seen
+until the folder is changed or the app restarts. Tracks without cached analysis are
+queued for background analysis.
+
+Queries wait at most `QUERY_WAIT_SECONDS` for the initial scan and otherwise answer
+from the state so far (empty until the scan lands), so UI code never blocks on a slow
+disk; `on_changed` fires once the scan is in.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+# Optional dependency: watchdog (inotify/FSEvents/ReadDirectoryChangesW)
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ModuleNotFoundError:  # pragma: no cover - optional dependency
+    FileSystemEventHandler = object  # type: ignore
+    Observer = None  # type: ignore
+
+AUDIO_EXTS = {".wav", ".mp3", ".flac", ".ogg", ".m4a", ".aac"}
+# Longest a query waits for the initial scan before answering from the state so far.
+QUERY_WAIT_SECONDS = 0.25
+
+
+def is_audio_path(path: str | Path) -> bool:
+    return Path(path).suffix.lower() in AUDIO_EXTS
+
+
+@dataclass
+class TrackEntry:
+    path: Path
+    size: int
+    mtime_ns: int
+    tags: Dict = field(default_factory=dict)
+
+
+def _default_analyzer() -> Optional[Callable[[str], Dict]]:
+    try:
+        from mood_readers.librosa_cli import analyze_file_cached
+    except (ImportError, SystemExit):  # librosa_cli exits when librosa is missing
+        return None
+    return analyze_file_cached
+
+
+def _default_cache_lookup() -> Optional[Callable[[str], Optional[Dict]]]:
+    try:
+        from mood_readers.librosa_cli import default_analysis_cache
+    except (ImportError, SystemExit):
+        return None
+    return default_analysis_cache().get
+
+
+class _WatchHandler(FileSystemEventHandler):
+    def __init__(self, index: "LibraryIndex"):
+        super().__init__()
+        self._index = index
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self._index.add_path(event.src_path)
+        else:
+            self._index.scan_subtree(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._index.add_path(event.src_path)
+
+    def on_deleted(self, event):
+        self._index.remove_path(event.src_path)
+
+    def on_moved(self, event):
+        self._index.remove_path(event.src_path)
+        if event.is_directory:
+            self._index.scan_subtree(event.dest_path)
+        else:
+            self._index.add_path(event.dest_path)
+
+
+class LibraryIndex:
+    """
+    Track index for one music folder. Queries wait (at most `timeout` seconds) for the
+    initial scan, and never touch the filesystem.
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        *,
+        recursive: bool = True,
+        watch: bool = True,
+        auto_analyze: bool = True,
+        analyzer: Optional[Callable[[str], Dict]] = None,
+        cache_lookup: Optional[Callable[[str], Optional[Dict]]] = None,
+        on_changed: Optional[Callable[[], None]] = None,
+    ):
+        self.root = Path(root).expanduser().resolve()
+        self.recursive = recursive
+        self.watch = watch
+        self.auto_analyze = auto_analyze
+        self._analyzer = analyzer
+        self._on_changed = on_changed
+        self._tracks: Dict[str, TrackEntry] = {}
+        self._lock = threading.RLock()
+        self._ready = threading.Event()
+        self._generation = 0
+        self._revision = 0  # bumped on any membership or tag change
+        self._observer = None
+        self._analysis_queue: "queue.Queue[tuple]" = queue.Queue()
+        self._analysis_thread: Optional[threading.Thread] = None
+        self._cache_lookup = cache_lookup
+
+    # --- lifecycle ---
+
+    def start(self) -> "LibraryIndex":
+        """Starts the background scan (and the watcher once the scan completes)."""
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self._ready.clear()
+        thread = threading.Thread(target=self._initial_scan, args=(generation,), name="LibraryIndexScan", daemon=True)
+        thread.start()
+        return self
+
+    def set_root(self, root: str | Path) -> None:
+        new_root = Path(root).expanduser().resolve()
+        if new_root == self.root and self._generation:
+            return
+        self._stop_watcher()
+        with self._lock:
+            self.root = new_root
+            self._tracks = {}
+            self._revision += 1
+        self.start()
+
+    def stop(self) -> None:
+        self._stop_watcher()
+        with self._lock:
+            self._generation += 1
+        self._ready.set()
+        self._analysis_queue.put((None, None))
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    # --- queries ---
+
+    def tracks(self, timeout: Optional[float] = QUERY_WAIT_SECONDS) -> List[Path]:
+        self.wait_ready(timeout)
+        with self._lock:
+            entries = list(self._tracks.values())
+        return sorted((e.path for e in entries), key=lambda p: (p.name.lower(), str(p).lower()))
+
+    def has_tracks(self, timeout: Optional[float] = QUERY_WAIT_SECONDS) -> bool:
+        self.wait_ready(timeout)
+        with self._lock:
+            return bool(self._tracks)
+
+    def first_track(self, timeout: Optional[float] = QUERY_WAIT_SECONDS) -> Optional[Path]:
+        tracks = self.tracks(timeout)
+        return tracks[0] if tracks else None
+
+    def filenames(self, timeout: Optional[float] = QUERY_WAIT_SECONDS) -> Set[str]:
+        self.wait_ready(timeout)
+        with self._lock:
+            return {e.path.name for e in self._tracks.values()}
+
+    def find_by_name(self, name: str, timeout: Optional[float] = QUERY_WAIT_SECONDS) -> Optional[Path]:
+        self.wait_ready(timeout)
+        with self._lock:
+            matches = [e.path for e in self._tracks.values() if e.path.name == name]
+        return min(matches, key=lambda p: len(p.parts)) if matches else None
+
+    @property
+    def revision(self) -> int:
+        """Changes whenever tracks are added/removed or their tags are updated."""
+        with self._lock:
+            return self._revision
+
+    def tags(self, path: str | Path) -> Dict:
+        with self._lock:
+            entry = self._tracks.get(self._key(path))
+            return dict(entry.tags) if entry else {}
+
+    # --- incremental updates ---
+
+    def add_path(self, path: str | Path) -> None:
+        if not is_audio_path(path):
+            return
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        key = self._key(path)
+        with self._lock:
+            previous = self._tracks.get(key)
+            if previous and previous.size == st.st_size and previous.mtime_ns == st.st_mtime_ns:
+                return
+            entry = TrackEntry(Path(key), int(st.st_size), int(st.st_mtime_ns))
+            self._tracks[key] = entry
+            self._revision += 1
+            generation = self._generation
+        self._load_or_queue_tags(entry, generation)
+        self._notify()
+
+    def remove_path(self, path: str | Path) -> None:
+        prefix = self._key(path)
+        with self._lock:
+            doomed = [k for k in self._tracks if k == prefix or k.startswith(prefix + os.sep)]
+            for key in doomed:
+                del self._tracks[key]
+            if doomed:
+                self._revision += 1
+        if doomed:
+            self._notify()
+
+    def scan_subtree(self, directory: str | Path) -> None:
+        with self._lock:
+            generation = self._generation
+        found = self._scan(Path(directory))
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._tracks.update(found)
+            self._revision += 1
+        for entry in found.values():
+            self._load_or_queue_tags(entry, generation)
+        if found:
+            self._notify()
+
+    # --- internals ---
+
+    @staticmethod
+    def _key(path: str | Path) -> str:
+        return os.path.abspath(os.path.expanduser(str(path)))
+
+    def _scan(self, directory: Path) -> Dict[str, TrackEntry]:
+        found: Dict[str, TrackEntry] = {}
+        stack = [str(directory)]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for dirent in it:
+                        try:
+                            if dirent.is_dir(follow_symlinks=False):
+                                if self.recursive and not dirent.name.startswith("."):
+                                    stack.append(dirent.path)
+                            elif dirent.is_file() and is_audio_path(dirent.name):
+                                st = dirent.stat()
+                                key = self._key(dirent.path)
+                                found[key] = TrackEntry(Path(key), int(st.st_size), int(st.st_mtime_ns))
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return found
+
+    def _initial_scan(self, generation: int) -> None:
+        try:
+            found = self._scan(self.root)
+        except Exception as exc:  # noqa: BLE001
+            print(f"[LibraryIndex] Scan failed for {self.root}: {exc}")
+            found = {}
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._tracks = found
+            self._revision += 1
+        self._ready.set()
+        self._notify()
+        self._start_watcher(generation)
+        for entry in list(found.values()):
+            self._load_or_queue_tags(entry, generation)
+
+    def _start_watcher(self, generation: int) -> None:
+        if not self.watch or Observer is None or not self.root.is_dir():
+            return
+        try:
+            observer = Observer()
+            observer.schedule(_WatchHandler(self), str(self.root), recursive=self.recursive)
+            observer.daemon = True
+            observer.start()
+        except Exception as exc:  # noqa: BLE001 - e.g. inotify watch limit reached
+            print(f"[LibraryIndex] Filesystem watching unavailable: {exc}")
+            return
+        with self._lock:
+            if generation != self._generation:
+                observer.stop()
+                return
+            self._observer = observer
+
+    def _stop_watcher(self) -> None:
+        with self._lock:
+            observer, self._observer = self._observer, None
+        if observer is not None:
+            try:
+                observer.stop()
+            except Exception:
+                pass
+
+    def _load_or_queue_tags(self, entry: TrackEntry, generation: int) -> None:
+        if not self.auto_analyze:
+            return
+        if self._cache_lookup is None:
+            self._cache_lookup = _default_cache_lookup() or (lambda _path: None)
+        cached = self._cache_lookup(str(entry.path))
+        if cached is not None:
+            with self._lock:
+                entry.tags = cached
+                self._revision += 1
+            return
+        self._ensure_analysis_thread()
+        self._analysis_queue.put((generation, entry))
+
+    def _ensure_analysis_thread(self) -> None:
+        with self._lock:
+            if self._analysis_thread is not None and self._analysis_thread.is_alive():
+                return
+            self._analysis_thread = threading.Thread(
+                target=self._analysis_loop, name="LibraryIndexAnalysis", daemon=True
+            )
+            self._analysis_thread.start()
+
+    def _analysis_loop(self) -> None:
+        analyzer = self._analyzer or _default_analyzer()
+        while True:
+            generation, entry = self._analysis_queue.get()
+            if entry is None:
+                return
+            if analyzer is None or generation != self._generation:
+                continue
+            with self._lock:
+                if self._tracks.get(str(entry.path)) is not entry:
+                    continue
+            try:
+                result = analyzer(str(entry.path))
+            except Exception as exc:  # noqa: BLE001
+                result = {"error": str(exc)}
+            # Tag updates don't change membership, so listeners aren't notified.
+            if "error" not in result:
+                with self._lock:
+                    entry.tags = result
+                    self._revision += 1
+
+    def _notify(self) -> None:
+        if self._on_changed is None:
+            return
+        try:
+            self._on_changed()
+        except Exception as exc:  # noqa: BLE001
+            print(f"[LibraryIndex] change callback failed: {exc}")
@@ -1,80 +1,83 @@
 import miniaudio
 import os
 import numpy as np
-import array
-import platform
+
+from architects.helpers.gain_stage import TARGET_LUFS, GainStage, loudness_gain
+from architects.helpers.pcm_cache import pcm_stream
+from architects.helpers.playback_engine import DecodeAhead, PlaybackClock, PlaybackEngine, shared_engine
+
+POSITION_NOTIFY_SECONDS = 0.1
+
 
 class MiniaudioPlayer:
-    def __init__(self, file_path):
+    def __init__(self, file_path, engine: PlaybackEngine = None, *, crossfade_seconds: float = 0.0,
+                 transition_bpm: float = None, loudness_lufs: float = None, target_lufs: float = TARGET_LUFS):
         """
         Simple audio player using miniaudio.
         Supports any format miniaudio supports (mp3, wav, flac, etc.)
+
+        Playback goes through a shared PlaybackEngine that keeps one output device open;
+        start/seek only hand it a new decoder, so they never reopen the device. Tracks in
+        the engine's decoded-PCM cache are served from memory without any decoder; others
+        are queued for background decoding into it when they start.
+
+        `position_seconds()` follows the frames the device has actually played (see
+        PlaybackClock); listeners added with `add_position_listener` are called from the
+        audio thread about every POSITION_NOTIFY_SECONDS and on start/pause/seek/stop/end.
+
+        With `crossfade_seconds` the file is opened and pre-decoded in the background right
+        away, and start() crossfades from whatever is playing instead of cutting it off.
+        `transition_bpm` (the outgoing track's tempo) rounds the fade to whole beats and
+        starts it on a beat.
+
+        `loudness_lufs` (the track's cached integrated loudness) normalizes it to
+        `target_lufs`; the correction is part of the gain stage's volume multiply.
         """
         self.file_path = file_path
-        self._device = None
+        self._engine = engine or shared_engine()
         self._stream = None
         self._paused = False
         self._running = False
         self._volume = 1.0 # 0.0 to 1.0
-        self._nchannels = 2
-        self._sample_rate = 44100
-        self._frames_to_read = 1024
+        self._nchannels = self._engine.nchannels
+        self._sample_rate = self._engine.sample_rate
+        self._frames_to_read = self._engine.frames_per_block
+        self._track_gain = loudness_gain(loudness_lufs, target_lufs)
+        self._gain = GainStage(self._nchannels, self._sample_rate, self._frames_to_read)
+        self._gain.set_gain(self._track_gain, ramp=False)
         self._duration_seconds = 0.0
         self._num_frames = 0
-        self._position_frames = 0
-        self._position_seconds = 0.0
-        self._backend_name = "unknown"
-        self._default_device_name = "unknown"
+        self._clock = PlaybackClock(self._sample_rate)
+        self._position_listeners = []
+        self._notify_frames = int(POSITION_NOTIFY_SECONDS * self._sample_rate)
+        self._frames_since_notify = 0
         self._load_file_info()
+        self._fade_frames, self._beat_frames = self._transition_frames(crossfade_seconds, transition_bpm)
+        self._decode_ahead = None
+        if self._fade_frames and os.path.exists(self.file_path) and self.file_path not in self._engine.pcm_cache:
+            self._decode_ahead = DecodeAhead(
+                self.file_path,
+                sample_rate=self._sample_rate,
+                nchannels=self._nchannels,
+                preroll_frames=self._fade_frames + self._sample_rate,
+                frames_per_block=self._frames_to_read,
+                prepare=lambda raw_stream: self._open_stream(0, raw_stream),
+            )
 
-    @staticmethod
-    def _preferred_backends():
-        system = platform.system()
-        if system == "Linux":
-            return [miniaudio.Backend.PULSEAUDIO, miniaudio.Backend.ALSA, miniaudio.Backend.JACK]
-        if system == "Darwin":
-            return [miniaudio.Backend.COREAUDIO]
-        if system == "Windows":
-            return [miniaudio.Backend.WASAPI, miniaudio.Backend.DSOUND, miniaudio.Backend.WINMM]
-        return []
-
-    def _default_playback_device_id(self, backends):
-        self._default_device_name = "system-default"
+    def _transition_frames(self, crossfade_seconds, bpm):
+        """(fade frames, beat frames); the fade is a whole number of beats when the BPM is known."""
+        seconds = max(0.0, float(crossfade_seconds or 0.0))
+        if seconds <= 0:
+            return 0, 0
         try:
-            devices = miniaudio.Devices(backends=backends)
-            playbacks = devices.get_playbacks()
-            for pb in playbacks or []:
-                is_default = (
-                    pb.get("is_default")
-                    or pb.get("isDefault")
-                    or pb.get("isDefaultDevice")
-                    or pb.get("default")
-                )
-                if is_default:
-                    self._default_device_name = str(pb.get("name", "system-default"))
-                    return pb.get("id")
-            if playbacks:
-                # Keep OS-selected default device behavior; only expose first for diagnostics.
-                self._default_device_name = f"system-default (enum first={playbacks[0].get('name', 'unknown')})"
-        except Exception:
-            self._default_device_name = "system-default"
-        return None
-
-    def _make_playback_device(self):
-        backends = self._preferred_backends()
-        self._default_playback_device_id(backends)
-        device = miniaudio.PlaybackDevice(
-            output_format=miniaudio.SampleFormat.SIGNED16,
-            nchannels=self._nchannels,
-            sample_rate=self._sample_rate,
-            backends=backends,
-            app_name="dj-blue-ai",
-        )
-        backend_name = str(getattr(device, "backend", "unknown")).lower()
-        if backend_name == "null":
-            raise RuntimeError("No usable audio backend (miniaudio NULL backend)")
-        self._backend_name = backend_name
-        return device
+            bpm = float(bpm or 0.0)
+        except (TypeError, ValueError):
+            bpm = 0.0
+        if bpm <= 0:
+            return int(seconds * self._sample_rate), 0
+        beat_frames = int(round(60.0 / bpm * self._sample_rate))
+        beats = max(1, int(round(seconds * bpm / 60.0)))
+        return beats * beat_frames, beat_frames
 
     def _load_file_info(self):
         try:
@@ -98,14 +101,28 @@ class MiniaudioPlayer:
             return False
 
         try:
-            self._build_stream(seek_frame=0, seek_seconds=0.0)
-            self._device = self._make_playback_device()
-            self._device.start(self._stream)
+            if self._decode_ahead is not None and self._decode_ahead.error is None:
+                # Handed over by the engine once DecodeAhead has opened and wrapped the stream.
+                started = self._engine.transition(
+                    self, self._open_decoded_ahead, self._fade_frames, self._beat_frames,
+                    ready=self._decode_ahead.is_ready,
+                )
+            elif self._fade_frames:
+                self._build_stream(seek_frame=0)
+                started = self._engine.transition(self, self._stream, self._fade_frames, self._beat_frames)
+            else:
+                self._build_stream(seek_frame=0)
+                started = self._engine.play(self, self._stream)
+            if not started:
+                self._stream = None
+                return False
+            self._engine.pcm_cache.prefetch(self.file_path)
             self._running = True
             self._paused = False
+            self._notify_position()
             print(
                 f"MiniaudioPlayer: Playing {self.file_path} at volume {self._volume} "
-                f"(backend={self._backend_name}, default_device={self._default_device_name})"
+                f"(backend={self._engine.backend_name}, default_device={self._engine.device_name})"
             )
             return True
         except Exception as e:
@@ -113,20 +130,37 @@ class MiniaudioPlayer:
             self._running = False
             return False
 
-    def _build_stream(self, seek_frame: int, seek_seconds: float = 0.0):
-        raw_stream = miniaudio.stream_file(
-            self.file_path,
-            nchannels=self._nchannels,
-            sample_rate=self._sample_rate,
-            frames_to_read=self._frames_to_read,
-            seek_frame=max(0, int(seek_frame)),
-        )
-        self._position_frames = max(0, int(seek_frame))
-        self._position_seconds = max(0.0, float(seek_seconds))
-        self._stream = self._volume_generator(raw_stream)
-        next(self._stream)
-
-    def _volume_generator(self, stream):
+    def _open_decoded_ahead(self):
+        # Runs on the render path: only adopts what the DecodeAhead worker prepared.
+        ahead, self._decode_ahead = self._decode_ahead, None
+        self._stream, self._clock = ahead.prepared()
+        return self._stream
+
+    def _build_stream(self, seek_frame: int, raw_stream=None):
+        self._stream, self._clock = self._open_stream(seek_frame, raw_stream)
+
+    def _open_stream(self, seek_frame: int, raw_stream=None):
+        """(primed volume generator, its clock) for the file from `seek_frame`."""
+        pcm = self._engine.pcm_cache.get(self.file_path) if raw_stream is None else None
+        if pcm is not None:
+            raw_stream = pcm_stream(pcm, self._nchannels, seek_frame, self._frames_to_read)
+        elif raw_stream is None:
+            raw_stream = miniaudio.stream_file(
+                self.file_path,
+                nchannels=self._nchannels,
+                sample_rate=self._sample_rate,
+                frames_to_read=self._frames_to_read,
+                seek_frame=max(0, int(seek_frame)),
+            )
+        # A fresh clock per stream: a block of the previous stream that is still being rendered
+        # ahead advances the old clock, not this one.
+        clock = PlaybackClock(self._sample_rate)
+        clock.reset(seek_frame)
+        stream = self._volume_generator(raw_stream, clock)
+        next(stream)
+        return stream, clock
+
+    def _volume_generator(self, stream, clock):
         """Playback callback generator that honors requested frame sizes."""
         required_frames = yield b""
 
@@ -136,64 +170,73 @@ class MiniaudioPlayer:
                 chunk = stream.send(request)
             except StopIteration:
                 self._running = False
+                self._notify_position()
                 return
 
-            if isinstance(chunk, array.array):
-                sample_count = len(chunk)
-                chunk_bytes = chunk.tobytes()
-            else:
-                chunk_bytes = bytes(chunk)
-                sample_count = len(chunk_bytes) // 2  # int16
+            # array('h') / ndarray / bytes are all viewed in place; the gain stage reuses its buffers.
+            samples = chunk if isinstance(chunk, np.ndarray) else np.frombuffer(chunk, dtype=np.int16)
+            frame_count = samples.size // self._nchannels
+            # Frames already rendered ahead (and in the device buffer) play before this block.
+            clock.advance(frame_count, self._engine.pending_frames())
+            self._frames_since_notify += frame_count
+            if self._frames_since_notify >= self._notify_frames:
+                self._notify_position()
 
-            frame_count = sample_count // self._nchannels
-            self._position_frames += max(0, frame_count)
-            self._position_seconds += max(0, frame_count) / float(self._sample_rate)
+            required_frames = yield self._gain.process(samples)
 
-            if self._volume == 1.0:
-                required_frames = yield chunk_bytes
-                continue
+    def add_position_listener(self, callback):
+        """`callback()` runs on the audio or caller thread; read position_seconds() from it."""
+        self._position_listeners.append(callback)
 
-            samples = np.frombuffer(chunk_bytes, dtype=np.int16).astype(np.float32)
-            scaled = np.clip(samples * self._volume, -32768.0, 32767.0).astype(np.int16)
-            required_frames = yield scaled.tobytes()
+    def _notify_position(self):
+        self._frames_since_notify = 0
+        for callback in list(self._position_listeners):
+            try:
+                callback()
+            except Exception as e:
+                print(f"MiniaudioPlayer position listener error: {e}")
 
     def set_volume(self, volume):
         """Sets the volume (0.0 to 1.0)."""
         self._volume = max(0.0, min(1.0, float(volume)))
-        # Note: If already playing, the generator will pick up the new value 
-        # on the next chunk because it accesses self._volume in each iteration.
+        # While playing, the gain stage ramps to the new value over a few milliseconds.
+        self._gain.set_gain(self._volume * self._track_gain, ramp=self._running)
 
     def pause(self):
         """Pauses playback."""
-        if self._device and self._running and not self._paused:
-            # Stopping the device stops consuming the stream.
-            # The stream generator state is preserved in Python.
-            self._device.stop() 
+        if self._running and not self._paused:
+            # The engine renders silence; the stream generator state is preserved.
+            self._engine.set_paused(self, True)
+            self._clock.hold()
             self._paused = True
+            self._notify_position()
             print("MiniaudioPlayer: Paused")
 
     def resume(self):
         """Resumes playback from pause."""
-        if self._device and self._running and self._paused:
-            self._device.start(self._stream)
+        if self._running and self._paused:
+            if not self._engine.owns(self):
+                # Another player took the device meanwhile; reclaim it with our stream.
+                if self._stream is None or not self._engine.play(self, self._stream):
+                    return
+            self._engine.set_paused(self, False)
+            self._clock.resume()
             self._paused = False
+            self._notify_position()
             print("MiniaudioPlayer: Resumed")
 
     def stop(self):
         """Stops playback and resets state."""
-        if self._device:
-            self._device.close() # Closes the device and stops playback
-        self._device = None
+        self._engine.release(self)
         self._stream = None
         self._running = False
         self._paused = False
-        self._position_frames = 0
-        self._position_seconds = 0.0
+        self._clock.reset(0)
 
     def close(self):
         """Cleanup."""
         self.stop()
-    
+
     @property
     def paused(self):
         return self._paused
@@ -205,7 +248,7 @@ class MiniaudioPlayer:
         return self._duration_seconds
 
     def position_seconds(self) -> float:
-        return max(0.0, self._position_seconds)
+        return self._clock.seconds()
 
     def seek(self, seconds: float):
         if not os.path.exists(self.file_path):
@@ -214,29 +257,22 @@ class MiniaudioPlayer:
         target_seconds = max(0.0, float(seconds))
         if self._duration_seconds > 0:
             target_seconds = min(target_seconds, self._duration_seconds)
-        if self._duration_seconds > 0 and self._num_frames > 0:
-            ratio = target_seconds / self._duration_seconds
-            target_frame = int(max(0.0, min(1.0, ratio)) * self._num_frames)
-        else:
-            target_frame = int(target_seconds * self._sample_rate)
+        # Decoders seek in output frames (engine rate), not in the file's native frames.
+        target_frame = int(round(target_seconds * self._sample_rate))
 
         was_playing = self._running and not self._paused
         was_running = self._running
 
         try:
-            if self._device:
-                try:
-                    self._device.stop()
-                except Exception:
-                    pass
-                self._device.close()
-                self._device = None
-
-            self._build_stream(seek_frame=target_frame, seek_seconds=target_seconds)
-            self._device = self._make_playback_device()
+            # Only the decoder is re-pointed; the output device keeps running.
+            self._build_stream(seek_frame=target_frame)
+            if was_running and self._engine.owns(self):
+                self._engine.replace_source(self, self._stream, start_frame=target_frame)
+            elif was_playing:
+                if not self._engine.play(self, self._stream):
+                    raise RuntimeError("output device unavailable")
 
             if was_playing:
-                self._device.start(self._stream)
                 self._paused = False
                 self._running = True
             elif was_running:
@@ -245,14 +281,12 @@ class MiniaudioPlayer:
             else:
                 self._paused = True
                 self._running = False
-            print(
-                f"MiniaudioPlayer: Seek -> {target_seconds:.2f}s "
-                f"(backend={self._backend_name}, default_device={self._default_device_name})"
-            )
+            self._notify_position()
+            print(f"MiniaudioPlayer: Seek -> {target_seconds:.2f}s")
             return True
         except Exception as e:
             print(f"MiniaudioPlayer seek error: {e}")
-            self._device = None
+            self._engine.release(self)
             self._running = False
             self._paused = False
             return False
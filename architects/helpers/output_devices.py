@@ -0,0 +1,125 @@
+"""
+Follows the OS default output device and the latency profile for the playback engine.
+
+miniaudio keeps rendering to the device it opened, so when headphones are plugged in or
+a Bluetooth sink becomes the default, audio would stay on the old output (or stop). While
+the engine has a device open, `OutputDeviceManager` polls on a background thread and calls
+`PlaybackEngine.reopen_device()` (which opens the current default) when the outputs change;
+the current track keeps its position. `set_profile()` switches the latency profile the same way.
+
+pyminiaudio's `get_playbacks()` does not say which device is the default, so a change is
+detected from the set of listed outputs, identified by name and raw device id bytes (the
+cffi handles are fresh copies on every call). On PulseAudio/PipeWire the default sink from
+`pactl get-default-sink` is compared as well, which also catches a default switched in the
+sound settings without any device appearing or disappearing.
+"""
+
+import shutil
+import subprocess
+import threading
+from typing import Callable, Optional
+
+import miniaudio
+
+from architects.helpers.playback_engine import LATENCY_PROFILES, PlaybackEngine, preferred_backends
+
+POLL_SECONDS = 2.0
+
+
+def _list_playbacks() -> list:
+    return miniaudio.Devices(backends=preferred_backends()).get_playbacks() or []
+
+
+def _id_bytes(device_id) -> bytes:
+    if device_id is None:
+        return b""
+    try:
+        return bytes(miniaudio.ffi.buffer(device_id))
+    except (TypeError, AttributeError):
+        return str(device_id).encode("utf-8", "replace")
+
+
+def playback_device_keys(playbacks) -> frozenset:
+    """Stable identity of every output in a get_playbacks() listing: (name, id bytes)."""
+    return frozenset((str(pb.get("name", "")), _id_bytes(pb.get("id"))) for pb in playbacks or [])
+
+
+def _pulse_default_sink() -> Optional[str]:
+    """Default sink name on PulseAudio/PipeWire, None where pactl is missing or too old."""
+    if shutil.which("pactl") is None:
+        return None
+    try:
+        result = subprocess.run(
+            ["pactl", "get-default-sink"], capture_output=True, text=True, timeout=1.0, check=False
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip() or None
+
+
+class OutputDeviceManager:
+    def __init__(
+        self,
+        engine: PlaybackEngine,
+        poll_seconds: float = POLL_SECONDS,
+        list_playbacks: Optional[Callable[[], list]] = None,
+        default_sink: Optional[Callable[[], Optional[str]]] = None,
+    ):
+        self.engine = engine
+        self.poll_seconds = max(0.1, float(poll_seconds))
+        self._list_playbacks = list_playbacks or _list_playbacks
+        self._default_sink = default_sink or _pulse_default_sink
+        self._outputs = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _current_outputs(self) -> Optional[tuple]:
+        try:
+            devices = playback_device_keys(self._list_playbacks())
+        except Exception as exc:
+            print(f"OutputDeviceManager: device enumeration failed: {exc}")
+            return None
+        return devices, self._default_sink()
+
+    def check(self) -> bool:
+        """One poll; reopens the engine device when the outputs or the default sink changed. True if it did."""
+        if not self.engine.device_open:
+            self._outputs = None  # re-baseline once the device is opened again
+            return False
+        current = self._current_outputs()
+        if current is None:
+            return False
+        previous, self._outputs = self._outputs, current
+        if previous is None or previous == current:
+            return False
+        added = sorted(name for name, _ in current[0] - previous[0])
+        print(f"OutputDeviceManager: outputs changed (added={added}, default_sink={current[1]!r}); reopening")
+        return self.engine.reopen_device()
+
+    def set_profile(self, profile: str) -> bool:
+        if profile not in LATENCY_PROFILES:
+            print(f"OutputDeviceManager: unknown latency profile {profile!r}")
+            return False
+        return self.engine.set_latency_profile(profile)
+
+    def stats(self) -> dict:
+        return self.engine.stats()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="OutputDeviceManager", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(1.0)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.poll_seconds):
+            self.check()
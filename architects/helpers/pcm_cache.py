@@ -0,0 +1,242 @@
+"""
+Memory-budgeted LRU cache of fully decoded PCM, shared through the playback engine.
+
+Entries are interleaved int16 arrays at the engine's rate and channel count, keyed by
+(absolute path, mtime, size) so an edited file is never served stale. Tracks decode on a
+single background worker (`prefetch`) after they are first played or queued; a cached
+track then starts and seeks by slicing (`pcm_stream`) with no decoder at all. Tracks
+larger than `MMAP_THRESHOLD_BYTES` are streamed into a temp file and memory-mapped, so the
+OS can page them out. Least recently used entries are evicted once the total exceeds the
+MB budget; an entry larger than the whole budget is never stored.
+"""
+
+import os
+import queue
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import miniaudio
+import numpy as np
+
+DEFAULT_BUDGET_MB = 256
+MMAP_THRESHOLD_BYTES = 64 * 1024 * 1024  # ~6 min of 44.1 kHz stereo int16
+DECODE_BLOCK_FRAMES = 65536
+
+
+def pcm_stream(pcm: np.ndarray, nchannels: int, start_frame: int = 0, frames_per_block: int = 1024):
+    """Primed generator with the stream_file protocol over cached PCM (views, no copies)."""
+    offset = max(0, int(start_frame)) * nchannels
+
+    def serve():
+        nonlocal offset
+        required_frames = yield b""
+        while offset < pcm.size:
+            end = offset + (int(required_frames) if required_frames else frames_per_block) * nchannels
+            chunk = pcm[offset:end]
+            offset = end
+            required_frames = yield chunk
+
+    generator = serve()
+    next(generator)
+    return generator
+
+
+class _Entry:
+    __slots__ = ("pcm", "nbytes", "temp_path")
+
+    def __init__(self, pcm: np.ndarray, temp_path: Optional[str] = None):
+        self.pcm = pcm
+        self.nbytes = int(pcm.nbytes)
+        self.temp_path = temp_path
+
+
+class DecodedPCMCache:
+    def __init__(self, sample_rate: int, nchannels: int, budget_mb: int = DEFAULT_BUDGET_MB,
+                 temp_dir: Optional[str] = None):
+        self.sample_rate = int(sample_rate)
+        self.nchannels = int(nchannels)
+        self._budget = max(0, int(budget_mb)) * 1024 * 1024
+        self._temp_dir = temp_dir
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._used = 0
+        self._pending = set()
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._worker = None
+        self.hits = 0
+        self.misses = 0
+
+    # --- budget ---
+
+    @property
+    def budget_bytes(self) -> int:
+        return self._budget
+
+    @property
+    def used_bytes(self) -> int:
+        return self._used
+
+    def set_budget_mb(self, budget_mb: int) -> None:
+        with self._lock:
+            self._budget = max(0, int(budget_mb)) * 1024 * 1024
+            evicted = self._evict_locked()
+        self._discard(evicted)
+
+    def _evict_locked(self) -> list:
+        evicted = []
+        while self._entries and self._used > self._budget:
+            _, entry = self._entries.popitem(last=False)
+            self._used -= entry.nbytes
+            evicted.append(entry)
+        return evicted
+
+    @staticmethod
+    def _discard(entries) -> None:
+        for entry in entries:
+            entry.pcm = None
+            if entry.temp_path:
+                try:
+                    os.remove(entry.temp_path)
+                except OSError:
+                    pass  # still mapped on Windows; the temp dir is cleaned by the OS
+
+    def clear(self) -> None:
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+            self._used = 0
+        self._discard(entries)
+
+    # --- lookup ---
+
+    @staticmethod
+    def _key(path) -> Optional[tuple]:
+        try:
+            resolved = os.path.abspath(str(path))
+            stat = os.stat(resolved)
+        except OSError:
+            return None
+        return resolved, stat.st_mtime_ns, stat.st_size
+
+    def get(self, path) -> Optional[np.ndarray]:
+        key = self._key(path)
+        with self._lock:
+            entry = self._entries.get(key) if key is not None else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.pcm
+
+    def __contains__(self, path) -> bool:
+        key = self._key(path)
+        with self._lock:
+            return key is not None and key in self._entries
+
+    def put(self, path, pcm: np.ndarray, temp_path: Optional[str] = None) -> bool:
+        key = self._key(path)
+        entry = _Entry(pcm, temp_path)
+        if key is None or entry.nbytes > self._budget:
+            self._discard([entry])
+            return False
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._used -= previous.nbytes
+            self._entries[key] = entry
+            self._used += entry.nbytes
+            evicted = self._evict_locked()
+        self._discard(evicted + ([previous] if previous is not None else []))
+        return True
+
+    # --- decoding ---
+
+    def _estimated_bytes(self, path: str) -> int:
+        try:
+            duration = float(miniaudio.get_file_info(path).duration or 0.0)
+        except Exception:
+            return 0
+        return int(duration * self.sample_rate) * self.nchannels * 2
+
+    def load(self, path) -> Optional[np.ndarray]:
+        """Decodes `path` into the cache (synchronously) unless it is cached or over budget."""
+        path = os.path.abspath(str(path))
+        cached = self.get(path)
+        if cached is not None:
+            return cached
+        estimate = self._estimated_bytes(path)
+        if self._budget <= 0 or estimate > self._budget:
+            return None
+        try:
+            if estimate > MMAP_THRESHOLD_BYTES:
+                pcm, temp_path = self._decode_to_mmap(path)
+            else:
+                decoded = miniaudio.decode_file(
+                    path,
+                    output_format=miniaudio.SampleFormat.SIGNED16,
+                    nchannels=self.nchannels,
+                    sample_rate=self.sample_rate,
+                )
+                pcm, temp_path = np.frombuffer(decoded.samples, dtype=np.int16), None
+        except Exception as exc:
+            print(f"DecodedPCMCache: decode failed for {path}: {exc}")
+            return None
+        return pcm if self.put(path, pcm, temp_path) else None
+
+    def _decode_to_mmap(self, path: str):
+        stream = miniaudio.stream_file(
+            path,
+            nchannels=self.nchannels,
+            sample_rate=self.sample_rate,
+            frames_to_read=DECODE_BLOCK_FRAMES,
+        )
+        fd, temp_path = tempfile.mkstemp(prefix="dj_blue_pcm_", suffix=".raw", dir=self._temp_dir)
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                for chunk in stream:
+                    handle.write(chunk.tobytes() if hasattr(chunk, "tobytes") else bytes(chunk))
+            if os.path.getsize(temp_path) == 0:
+                raise ValueError("no audio decoded")
+            return np.memmap(temp_path, dtype=np.int16, mode="r"), temp_path
+        except Exception:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+
+    def prefetch(self, path) -> None:
+        """Queues `path` for background decoding (no-op if cached, queued, or caching is off)."""
+        if self._budget <= 0:
+            return
+        path = os.path.abspath(str(path))
+        with self._lock:
+            if path in self._pending:
+                return
+            self._pending.add(path)
+            self._queue.put(path)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="DecodedPCMCache", daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                path = self._queue.get(timeout=30.0)
+            except queue.Empty:
+                with self._lock:
+                    if self._queue.empty():
+                        self._worker = None
+                        return
+                continue
+            try:
+                self.load(path)
+            finally:
+                with self._lock:
+                    self._pending.discard(path)
+                self._queue.task_done()
+
+    def wait_idle(self) -> None:
+        """Blocks until every queued prefetch has finished."""
+        self._queue.join()
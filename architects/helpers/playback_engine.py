@@ -0,0 +1,904 @@
+"""
+Long-lived playback engine: one miniaudio output device, one swappable source.
+
+The device is opened once (backend probing and device enumeration happen only then)
+and is fed by a single render generator. Players hand the engine a primed source
+generator; swapping it is one attribute assignment, so track changes and seeks only
+re-point the decoder and never close or reopen the device. Without a source, or while
+paused, the device renders silence. Decoded tracks are kept in `pcm_cache` (see
+`DecodedPCMCache`) so replays and seeks of recent tracks skip decoding. While a consumer
+has started `spectrum` (see `SpectrumTap`), rendered blocks are also copied into its ring
+buffer for the equalizer.
+
+Transitions: `transition()` queues an incoming source that is mixed in with an
+equal-power crossfade once it is ready (see `DecodeAhead`), optionally starting on the
+next beat of the outgoing track. The outgoing track keeps playing until then, so a slow
+file open never leaves a gap.
+
+Devices: buffering follows a latency profile (`LATENCY_PROFILES`). `reopen_device()` moves
+playback to a fresh device (another profile, or a new OS default output, see
+`OutputDeviceManager`) while the current source keeps its position. Callback gaps longer
+than the whole device buffer are counted as underruns (miniaudio does not report xruns).
+
+Render-ahead: by default a producer thread runs the decoders, gain and mixing about
+`RENDER_AHEAD_MS` ahead of the device into a `RenderRing`, and the device callback only
+copies out of it, so a GIL stall from the UI or analysis has that much slack before the
+speaker starts missing blocks. Source changes (play, seek, stop) bump a generation and
+blocks rendered for an older one are skipped, so they are still heard right away; pause
+stops reading the ring and keeps its contents. A callback that finds the ring short while
+something is playing counts a `ring_underrun`. `render_ahead_ms=0` renders on the device
+callback instead.
+"""
+
+import platform
+import threading
+import time
+from typing import Callable, Optional
+
+import miniaudio
+import numpy as np
+
+from architects.helpers.pcm_cache import DEFAULT_BUDGET_MB, DecodedPCMCache
+
+SAMPLE_RATE = 44100
+NCHANNELS = 2
+FRAMES_PER_BLOCK = 1024
+BYTES_PER_SAMPLE = 2  # int16
+# Profile name -> (period length in ms, period count); the device buffer is their product.
+LATENCY_PROFILES = {
+    "low_latency": (10, 3),
+    "balanced": (40, 4),
+    "power_saving": (200, 3),
+}
+DEFAULT_LATENCY_PROFILE = "balanced"
+RENDER_AHEAD_MS = 300
+
+
+def preferred_backends():
+    system = platform.system()
+    if system == "Linux":
+        return [miniaudio.Backend.PULSEAUDIO, miniaudio.Backend.ALSA, miniaudio.Backend.JACK]
+    if system == "Darwin":
+        return [miniaudio.Backend.COREAUDIO]
+    if system == "Windows":
+        return [miniaudio.Backend.WASAPI, miniaudio.Backend.DSOUND, miniaudio.Backend.WINMM]
+    return []
+
+
+def default_playback_device_name(backends) -> str:
+    """Name of the OS default output (diagnostics only; playback always uses the default)."""
+    try:
+        playbacks = miniaudio.Devices(backends=backends).get_playbacks()
+    except Exception:
+        return "system-default"
+    for pb in playbacks or []:
+        if pb.get("is_default") or pb.get("isDefault") or pb.get("isDefaultDevice") or pb.get("default"):
+            return str(pb.get("name", "system-default"))
+    if playbacks:
+        return f"system-default (enum first={playbacks[0].get('name', 'unknown')})"
+    return "system-default"
+
+
+class PlaybackClock:
+    """
+    Position of one source as heard at the output. The render path advances it by the
+    frames it renders; reads subtract what is still queued (render-ahead ring and device
+    buffer) and extrapolate with the wall clock since that render, never going backwards.
+    The state is a single tuple that is swapped whole, so `frames()` takes no lock.
+    """
+
+    def __init__(self, sample_rate: int):
+        self.sample_rate = int(sample_rate)
+        # (floor frame, rendered-up-to frame, latency frames, monotonic time of last render)
+        self._state = (0, 0, 0, None)
+
+    def reset(self, frame: int = 0) -> None:
+        frame = max(0, int(frame))
+        self._state = (frame, frame, 0, None)
+
+    def advance(self, frames: int, latency_frames: int = 0) -> None:
+        floor = self.frames()
+        _, end, _, _ = self._state
+        self._state = (floor, end + max(0, int(frames)), max(0, int(latency_frames)), time.monotonic())
+
+    def hold(self) -> None:
+        """Stops the extrapolation at the current position (pause); the next `advance` or `resume` ends it."""
+        heard = self.frames()
+        _, end, _, _ = self._state
+        self._state = (heard, end, end - heard, None)
+
+    def resume(self) -> None:
+        floor, end, latency, stamp = self._state
+        if stamp is None:
+            self._state = (floor, end, latency, time.monotonic())
+
+    def frames(self) -> int:
+        floor, end, latency, stamp = self._state
+        if stamp is None:
+            return end - latency
+        heard = end - latency + (time.monotonic() - stamp) * self.sample_rate
+        return int(max(floor, min(end, heard)))
+
+    def seconds(self) -> float:
+        return self.frames() / float(self.sample_rate)
+
+
+class SpectrumTap:
+    """
+    Band levels of the engine output for visualizers. The audio thread only copies the left
+    channel of each rendered block into a ring buffer (`feed`); a background thread running
+    while the tap is started computes a Hann-windowed FFT about `rate_hz` times a second and
+    writes log-spaced band levels in 0..1 into `levels`, a fixed float32 array that readers
+    may hold on to.
+    """
+
+    def __init__(self, sample_rate: int, nchannels: int, bands: int = 48, fft_size: int = 2048,
+                 rate_hz: float = 30.0, min_hz: float = 40.0, max_hz: float = 16000.0, floor_db: float = -70.0):
+        self.sample_rate = int(sample_rate)
+        self.nchannels = int(nchannels)
+        self.fft_size = int(fft_size)
+        self.interval = 1.0 / max(1.0, float(rate_hz))
+        self.floor_db = float(floor_db)
+        self.levels = np.zeros(int(bands), dtype=np.float32)
+        self._ring = np.zeros(self.fft_size, dtype=np.float32)
+        self._write = 0
+        self._window = np.hanning(self.fft_size).astype(np.float32)
+        # A full-scale sine peaks at amplitude * sum(window) / 2 in the magnitude spectrum.
+        self._reference = 32768.0 * float(self._window.sum()) / 2.0
+        bins = np.geomspace(min_hz, max_hz, int(bands) + 1) * self.fft_size / self.sample_rate
+        self._edges = np.unique(np.clip(np.round(bins).astype(int), 1, self.fft_size // 2))
+        self._band_pos = np.linspace(0.0, 1.0, int(bands))
+        self._edge_pos = np.linspace(0.0, 1.0, max(1, self._edges.size - 1))
+        self._fresh = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.active = False
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            if not self._stop.is_set():
+                return
+            self._thread.join(1.0)  # a stopped thread is still finishing its last wait
+        self._stop.clear()
+        self.active = True
+        self._thread = threading.Thread(target=self._run, name="SpectrumTap", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.active = False
+        self._stop.set()
+        self._fresh.set()
+        self.levels.fill(0.0)
+
+    def feed(self, block) -> None:
+        """Audio thread: copies the left channel of an interleaved int16 block (no allocation)."""
+        samples = block if isinstance(block, np.ndarray) else np.frombuffer(block, dtype=np.int16)
+        left = samples[0::self.nchannels][-self.fft_size:]
+        count = left.size
+        start = self._write
+        first = min(count, self.fft_size - start)
+        self._ring[start:start + first] = left[:first]
+        if count > first:
+            self._ring[: count - first] = left[first:]
+        self._write = (start + count) % self.fft_size
+        self._fresh.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if not self._fresh.wait(0.5):
+                self.levels *= 0.5  # output went quiet (paused or idle): let the bars fall
+                continue
+            self._fresh.clear()
+            if self._stop.is_set():
+                break
+            self.compute()
+            self._stop.wait(self.interval)
+
+    def compute(self) -> None:
+        frame = np.roll(self._ring, -self._write) * self._window
+        magnitude = np.abs(np.fft.rfft(frame))
+        bands = np.maximum.reduceat(magnitude[self._edges[0]:self._edges[-1]], self._edges[:-1] - self._edges[0])
+        decibels = 20.0 * np.log10(np.maximum(bands, 1e-9) / self._reference)
+        normalized = np.clip(1.0 - decibels / self.floor_db, 0.0, 1.0)
+        self.levels[:] = np.interp(self._band_pos, self._edge_pos, normalized)
+
+
+class RenderRing:
+    """
+    Single-producer/single-consumer ring of rendered blocks. Slots are preallocated and
+    tagged with the engine generation they were rendered for; the producer only advances
+    the write count and the consumer only the read count, so neither side takes a lock.
+
+    The ring holds twice `target_slots`: after a generation change the stale blocks still
+    occupy at most half of it, so the producer can render the new source right away while
+    the consumer skips them on its next read. Only current-generation blocks count toward
+    the target and `buffered_frames()`.
+    """
+
+    def __init__(self, target_slots: int, frames_per_block: int, nchannels: int):
+        self.nchannels = int(nchannels)
+        self.frames_per_block = int(frames_per_block)
+        self.target_slots = max(1, int(target_slots))
+        self._data = np.zeros((2 * self.target_slots, self.frames_per_block * self.nchannels), dtype=np.int16)
+        self._frames = np.zeros(self._data.shape[0], dtype=np.int64)
+        self._generations = np.zeros(self._data.shape[0], dtype=np.int64)
+        self._written = 0  # slots written so far (producer)
+        self._read = 0  # slots fully consumed so far (consumer)
+        self._offset = 0  # frames already consumed from the slot at `_read` (consumer)
+        self._generation = None  # generation of the latest write (producer)
+        self._generation_start = 0  # first slot written for it (producer)
+
+    @property
+    def slots(self) -> int:
+        return self._data.shape[0]
+
+    def free_slots(self) -> int:
+        return self.slots - (self._written - self._read)
+
+    def _pending_slots(self, generation: int) -> int:
+        if self._generation != generation:
+            return 0
+        return max(0, self._written - max(self._read, self._generation_start))
+
+    def wants(self, generation: int) -> bool:
+        """Producer: True while `generation` has less than the target buffered and a slot is free."""
+        return self.free_slots() > 0 and self._pending_slots(generation) < self.target_slots
+
+    def buffered_frames(self, generation: int) -> int:
+        """Frames of `generation` waiting in the ring (stale blocks are not counted)."""
+        slots = self._pending_slots(generation)
+        if not slots:
+            return 0
+        partial = self._offset if self._read >= self._generation_start else 0
+        return max(0, slots * self.frames_per_block - partial)
+
+    def write(self, block, generation: int) -> bool:
+        """Producer: copies one block (at most `frames_per_block` frames) into the next free slot."""
+        if self.free_slots() <= 0:
+            return False
+        samples = block if isinstance(block, np.ndarray) else np.frombuffer(block, dtype=np.int16)
+        count = min(samples.size, self._data.shape[1])
+        if generation != self._generation:
+            self._generation, self._generation_start = generation, self._written
+        slot = self._written % self.slots
+        self._data[slot, :count] = samples[:count]
+        self._frames[slot] = count // self.nchannels
+        self._generations[slot] = generation
+        self._written += 1  # publishes the slot
+        return True
+
+    def read_into(self, out: np.ndarray, frames: int, generation: int) -> int:
+        """Consumer: copies up to `frames` frames of `generation` into `out`; returns frames copied."""
+        nch = self.nchannels
+        copied = 0
+        while copied < frames and self._read < self._written:
+            slot = self._read % self.slots
+            available = int(self._frames[slot]) - self._offset
+            if self._generations[slot] != generation or available <= 0:
+                self._read, self._offset = self._read + 1, 0  # stale or drained slot
+                continue
+            take = min(available, frames - copied)
+            out[copied * nch:(copied + take) * nch] = self._data[slot, self._offset * nch:(self._offset + take) * nch]
+            copied += take
+            if take == available:
+                self._read, self._offset = self._read + 1, 0
+            else:
+                self._offset += take
+        return copied
+
+
+class DecodeAhead:
+    """
+    Opens a file and decodes its first `preroll_frames` on a background thread, leaving the
+    decoder positioned right after them. `stream()` serves the preroll from memory and then
+    continues from that decoder, so starting the track needs no file I/O on the audio thread.
+    With `prepare`, the worker also passes that stream through `prepare` before reporting
+    ready, and `prepared()` returns the result (use one of `stream()` and `prepared()`).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sample_rate: int = SAMPLE_RATE,
+        nchannels: int = NCHANNELS,
+        preroll_frames: int = SAMPLE_RATE,
+        frames_per_block: int = FRAMES_PER_BLOCK,
+        start_frame: int = 0,
+        prepare: Optional[Callable[[object], object]] = None,
+    ):
+        self.path = str(path)
+        self.sample_rate = int(sample_rate)
+        self.nchannels = int(nchannels)
+        self.preroll_frames = max(0, int(preroll_frames))
+        self.frames_per_block = int(frames_per_block)
+        self.start_frame = max(0, int(start_frame))
+        self.error: Optional[Exception] = None
+        self._preroll = np.zeros(0, dtype=np.int16)
+        self._decoder = None
+        self._prepare = prepare
+        self._prepared = None
+        self._ready = threading.Event()
+        threading.Thread(target=self._load, name="DecodeAhead", daemon=True).start()
+
+    def _load(self) -> None:
+        try:
+            decoder = miniaudio.stream_file(
+                self.path,
+                nchannels=self.nchannels,
+                sample_rate=self.sample_rate,
+                frames_to_read=self.frames_per_block,
+                seek_frame=self.start_frame,
+            )
+            chunks, frames = [], 0
+            while frames < self.preroll_frames:
+                try:
+                    chunk = np.frombuffer(decoder.send(self.frames_per_block), dtype=np.int16)
+                except StopIteration:
+                    decoder = None
+                    break
+                chunks.append(chunk)
+                frames += chunk.size // self.nchannels
+            if chunks:
+                self._preroll = np.concatenate(chunks)
+            self._decoder = decoder
+            if self._prepare is not None:
+                self._prepared = self._prepare(self._primed())
+        except Exception as exc:  # reported through `error`
+            self.error = exc
+        finally:
+            self._ready.set()
+
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def stream(self):
+        """Primed generator with the stream_file protocol: send(frames) -> int16 samples."""
+        self._ready.wait()
+        if self.error is not None:
+            raise self.error
+        return self._primed()
+
+    def prepared(self):
+        """What `prepare` returned for the stream; waits for the worker."""
+        self._ready.wait()
+        if self.error is not None:
+            raise self.error
+        return self._prepared
+
+    def _primed(self):
+        generator = self._serve()
+        next(generator)
+        return generator
+
+    def _serve(self):
+        preroll, offset = self._preroll, 0
+        required_frames = yield b""
+        while offset < preroll.size:
+            wanted = (int(required_frames) if required_frames else self.frames_per_block) * self.nchannels
+            end = min(preroll.size, offset + wanted)
+            chunk = preroll[offset:end]
+            offset = end
+            if chunk.size < wanted and self._decoder is not None:
+                # Top the last preroll block up from the decoder so block sizes stay exact.
+                try:
+                    tail = np.frombuffer(self._decoder.send((wanted - chunk.size) // self.nchannels), dtype=np.int16)
+                    chunk = np.concatenate((chunk, tail))
+                except StopIteration:
+                    self._decoder = None
+            required_frames = yield chunk
+        while self._decoder is not None:
+            frames = int(required_frames) if required_frames else self.frames_per_block
+            try:
+                chunk = self._decoder.send(frames)
+            except StopIteration:
+                return
+            required_frames = yield chunk
+
+
+class _Transition:
+    """A queued incoming source and how far its crossfade has got."""
+
+    __slots__ = ("owner", "source", "fade_frames", "beat_frames", "ready", "delay", "done")
+
+    def __init__(self, owner, source, fade_frames: int, beat_frames: int, ready: Callable[[], bool]):
+        self.owner = owner
+        self.source = source
+        self.fade_frames = max(1, int(fade_frames))
+        self.beat_frames = max(0, int(beat_frames))
+        self.ready = ready
+        self.delay: Optional[int] = None  # outgoing frames left before the fade starts
+        self.done = 0  # incoming frames mixed so far
+
+
+class _RenderCursor:
+    """
+    The current source of one generation and how many of its frames were rendered. Control
+    calls replace the cursor instead of editing it, so a block still being rendered for an
+    older generation only advances a cursor that is no longer read.
+    """
+
+    __slots__ = ("generation", "source", "frame")
+
+    def __init__(self, generation: int, source, frame: int = 0):
+        self.generation = generation
+        self.source = source
+        self.frame = max(0, int(frame))
+
+
+def _open_device(sample_rate: int, nchannels: int, buffersize_msec: int = 0, periods: int = 0):
+    return miniaudio.PlaybackDevice(
+        output_format=miniaudio.SampleFormat.SIGNED16,
+        nchannels=nchannels,
+        sample_rate=sample_rate,
+        buffersize_msec=buffersize_msec,
+        callback_periods=periods,
+        backends=preferred_backends(),
+        app_name="dj-blue-ai",
+    )
+
+
+class PlaybackEngine:
+    """Owns the output device; renders whichever source is current (silence otherwise)."""
+
+    def __init__(
+        self,
+        sample_rate: int = SAMPLE_RATE,
+        nchannels: int = NCHANNELS,
+        frames_per_block: int = FRAMES_PER_BLOCK,
+        device_factory: Optional[Callable[..., object]] = None,
+        pcm_cache_mb: int = DEFAULT_BUDGET_MB,
+        latency_profile: str = DEFAULT_LATENCY_PROFILE,
+        render_ahead_ms: int = RENDER_AHEAD_MS,
+    ):
+        self.sample_rate = int(sample_rate)
+        self.nchannels = int(nchannels)
+        self.frames_per_block = int(frames_per_block)
+        self.pcm_cache = DecodedPCMCache(self.sample_rate, self.nchannels, pcm_cache_mb)
+        self.spectrum = SpectrumTap(self.sample_rate, self.nchannels)
+        self._device_factory = device_factory or _open_device
+        self._device = None
+        self._lock = threading.RLock()  # serializes control calls; the render path only takes it to end a source or fade
+        self._owner = None
+        self._paused = False
+        self._transition: Optional[_Transition] = None
+        self._silence = b""
+        self.latency_frames = 0  # estimated frames between a render callback and the speaker
+        self.latency_profile = latency_profile if latency_profile in LATENCY_PROFILES else DEFAULT_LATENCY_PROFILE
+        self._buffer_seconds = 0.0
+        self._last_callback: Optional[float] = None
+        self.underruns = 0
+        self.late_callbacks = 0
+        self.device_switches = 0
+        # Render-ahead state: sources are rendered by `_produce` into `_ring` (None = on the callback).
+        self.render_ahead_ms = max(0, int(render_ahead_ms))
+        slots = -(-self.render_ahead_ms * self.sample_rate // (1000 * self.frames_per_block))
+        self._ring = RenderRing(slots, self.frames_per_block, self.nchannels) if self.render_ahead_ms else None
+        self._generation = 0  # bumped whenever the current source is replaced or dropped
+        self._cursor = _RenderCursor(0, None)
+        self._primed_generation = -1  # last generation the producer has written a block for
+        self._out = np.zeros(0, dtype=np.int16)
+        self._producer: Optional[threading.Thread] = None
+        self._producer_stop = threading.Event()
+        self._producer_wake = threading.Event()
+        self.ring_underruns = 0
+        self.backend_name = "unknown"
+        self.device_name = "unknown"
+
+    # --- device ---
+
+    def ensure_device(self) -> bool:
+        """Opens and starts the device on first use; later calls are free."""
+        with self._lock:
+            if self._device is not None:
+                return True
+            try:
+                period_ms, periods = LATENCY_PROFILES[self.latency_profile]
+                device = self._device_factory(
+                    self.sample_rate, self.nchannels, buffersize_msec=period_ms, periods=periods
+                )
+                backend_name = str(getattr(device, "backend", "unknown")).lower()
+                if backend_name == "null":
+                    device.close()
+                    raise RuntimeError("No usable audio backend (miniaudio NULL backend)")
+                renderer = self._render() if self._ring is None else self._render_buffered()
+                next(renderer)
+                device.start(renderer)
+            except Exception as exc:
+                print(f"PlaybackEngine: could not open output device: {exc}")
+                return False
+            self._device = device
+            self.backend_name = backend_name
+            self._start_producer()
+            # One period is being played while the others are queued behind it.
+            period_frames = int(getattr(device, "buffersize_msec", 0) * self.sample_rate / 1000)
+            self.latency_frames = period_frames * (periods - 1)
+            self._buffer_seconds = period_ms * periods / 1000.0
+            if self._device_factory is _open_device:
+                self.device_name = default_playback_device_name(preferred_backends())
+            print(
+                f"PlaybackEngine: Output open (backend={self.backend_name}, default_device={self.device_name}, "
+                f"profile={self.latency_profile})"
+            )
+            return True
+
+    @property
+    def device_open(self) -> bool:
+        return self._device is not None
+
+    def reopen_device(self) -> bool:
+        """
+        Closes the output and opens a fresh one on the current default device and profile.
+        Sources are untouched, so the current track (or fade) continues where it was.
+        Must not be called with the lock held: closing waits for the device callback, and
+        the callback takes the lock to end a source or fade.
+        """
+        with self._lock:
+            device, self._device = self._device, None
+        if device is not None:
+            try:
+                device.close()  # no more callbacks from the old device past this point
+            except Exception:
+                pass
+        with self._lock:
+            if not self.ensure_device():
+                return False
+            self.device_switches += 1
+            return True
+
+    def set_latency_profile(self, profile: str) -> bool:
+        """Switches buffering (see LATENCY_PROFILES); an open device is reopened with it."""
+        if profile not in LATENCY_PROFILES:
+            return False
+        with self._lock:
+            if profile == self.latency_profile:
+                return True
+            self.latency_profile = profile
+            reopen = self._device is not None
+        return self.reopen_device() if reopen else True
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend_name,
+            "device": self.device_name,
+            "latency_profile": self.latency_profile,
+            "latency_ms": round(self.latency_frames * 1000.0 / self.sample_rate, 1),
+            "underruns": self.underruns,
+            "late_callbacks": self.late_callbacks,
+            "device_switches": self.device_switches,
+            "render_ahead_ms": self.render_ahead_ms,
+            "ring_underruns": self.ring_underruns,
+        }
+
+    def buffered_frames(self) -> int:
+        """Frames rendered but not yet handed to the device (render-ahead ring)."""
+        return self._ring.buffered_frames(self._generation) if self._ring is not None else 0
+
+    def pending_frames(self) -> int:
+        """Estimated frames between rendering a block now and hearing it."""
+        return self.latency_frames + self.buffered_frames()
+
+    def _flush(self, source=None, start_frame: int = 0) -> None:
+        """Called with the lock held when the current source changes: older blocks are skipped."""
+        self._generation += 1
+        self._cursor = _RenderCursor(self._generation, source, start_frame)
+        self._producer_wake.set()
+
+    def close(self) -> None:
+        with self._lock:
+            device, self._device = self._device, None
+            self._owner = None
+            self._transition = None
+            self._flush()
+        self._stop_producer()
+        if device is not None:
+            print(f"PlaybackEngine: closing ({self.stats()})")
+        self.pcm_cache.clear()
+        self.spectrum.stop()
+        if device is not None:
+            try:
+                device.close()
+            except Exception:
+                pass
+
+    # --- sources ---
+
+    @property
+    def owner(self):
+        return self._owner
+
+    def owns(self, owner) -> bool:
+        """True for the current owner and for the owner of a pending transition."""
+        transition = self._transition
+        return self._owner is owner or (transition is not None and transition.owner is owner)
+
+    def is_busy(self) -> bool:
+        """True while a source is audible, i.e. there is something to crossfade out of."""
+        return self._cursor.source is not None and not self._paused
+
+    def play(self, owner, source, start_frame: int = 0) -> bool:
+        """Makes `source` (a primed generator of int16 PCM) current, replacing any other."""
+        with self._lock:
+            if not self.ensure_device():
+                return False
+            self._transition = None
+            self._owner = owner
+            self._paused = False
+            self._flush(source, start_frame)
+            return True
+
+    def transition(
+        self,
+        owner,
+        source,
+        fade_frames: int,
+        beat_frames: int = 0,
+        ready: Optional[Callable[[], bool]] = None,
+    ) -> bool:
+        """
+        Crossfades from the current source into `source` over `fade_frames`. The fade starts
+        once `ready()` is true, on the next multiple of `beat_frames` of the current source
+        when given. With nothing audible this is `play()`. `source` may also be a callable
+        returning the generator; it runs on the render path once `ready()` is true, so it must
+        only hand over a source opened beforehand (see `DecodeAhead`'s `prepare`).
+        """
+        with self._lock:
+            if not self.is_busy() or not self.ensure_device():
+                return self.play(owner, source() if callable(source) else source)
+            self._transition = _Transition(owner, source, fade_frames, beat_frames, ready or (lambda: True))
+            self._producer_wake.set()
+            return True
+
+    def replace_source(self, owner, source, start_frame: int = 0) -> bool:
+        """Re-points the decoder for the owner (seek); keeps the pause state, ends a pending fade."""
+        with self._lock:
+            transition = self._transition
+            if transition is not None and transition.owner is owner:
+                self._owner = owner
+            elif self._owner is not owner:
+                return False
+            self._transition = None
+            self._flush(source, start_frame)
+            return True
+
+    def release(self, owner) -> None:
+        """Drops the source if `owner` still holds it (a newer owner is left playing)."""
+        with self._lock:
+            transition = self._transition
+            if transition is not None:
+                if transition.owner is owner:
+                    # Stopping the incoming track stops the whole transition.
+                    self._transition = None
+                    self._owner = None
+                    self._paused = False
+                    self._flush()
+                # The outgoing owner keeps its source until the crossfade has finished.
+                return
+            if self._owner is owner:
+                self._owner = None
+                self._paused = False
+                self._flush()
+
+    def set_paused(self, owner, paused: bool) -> None:
+        """Takes effect on the next callback; buffered blocks are kept for the resume."""
+        with self._lock:
+            if self.owns(owner):
+                self._paused = bool(paused)
+                self._producer_wake.set()
+
+    # --- render (audio thread) ---
+
+    def _silence_bytes(self, frames: int) -> bytes:
+        size = frames * self.nchannels * BYTES_PER_SAMPLE
+        silence = self._silence  # shared by the producer and the callback
+        if len(silence) != size:
+            silence = self._silence = bytes(size)
+        return silence
+
+    def _pull(self, source, frames: int):
+        """`frames` frames of int16 samples from `source` (zero-padded), or None once it has ended."""
+        try:
+            chunk = source.send(frames)
+        except StopIteration:
+            return None
+        except Exception as exc:  # a broken decoder must not kill the device
+            print(f"PlaybackEngine: source failed: {exc}")
+            return None
+        samples = chunk if isinstance(chunk, np.ndarray) else np.frombuffer(chunk, dtype=np.int16)
+        wanted = frames * self.nchannels
+        if samples.size < wanted:
+            samples = np.concatenate((samples, np.zeros(wanted - samples.size, dtype=np.int16)))
+        return samples[:wanted]
+
+    def _render_block(self, frames: int, cursor: _RenderCursor, transition):
+        """The next `frames` frames of `cursor`/`transition`, or None while paused or without a source."""
+        source = cursor.source
+        if self._paused or source is None and transition is None:
+            return None
+        if transition is not None:
+            return self._render_transition(cursor, transition, frames)
+        block = self._pull(source, frames)
+        if block is None:
+            self._end_source(cursor)
+            block = self._silence_bytes(frames)
+        cursor.frame += frames
+        return block
+
+    def _end_source(self, cursor: _RenderCursor) -> None:
+        """Drops the ended source of `cursor`, unless a control call has replaced it meanwhile."""
+        with self._lock:
+            if self._generation == cursor.generation:
+                cursor.source = None
+
+    def _end_transition(self, cursor: _RenderCursor, transition: _Transition) -> None:
+        with self._lock:
+            if self._transition is transition and self._generation == cursor.generation:
+                self._transition = None
+
+    def _render(self):
+        """Device callback without render-ahead: renders each block on the audio thread."""
+        self._last_callback = None
+        required_frames = yield b""
+        while True:
+            frames = int(required_frames) if required_frames else self.frames_per_block
+            self._count_gap(frames)
+            block = self._render_block(frames, self._cursor, self._transition)
+            if block is None:
+                required_frames = yield self._silence_bytes(frames)
+                continue
+            if self.spectrum.active:
+                self.spectrum.feed(block)
+            required_frames = yield block
+
+    def _render_buffered(self):
+        """Device callback with render-ahead: only copies blocks out of the ring."""
+        self._last_callback = None
+        required_frames = yield b""
+        while True:
+            frames = int(required_frames) if required_frames else self.frames_per_block
+            self._count_gap(frames)
+            if self._paused:
+                required_frames = yield self._silence_bytes(frames)
+                continue
+            size = frames * self.nchannels
+            if self._out.size < size:
+                self._out = np.zeros(size, dtype=np.int16)
+            out = self._out[:size]
+            generation = self._generation
+            copied = self._ring.read_into(out, frames, generation)
+            if copied < frames:
+                out[copied * self.nchannels:] = 0
+                playing = self._cursor.source is not None or self._transition is not None
+                if playing and self._primed_generation == generation:
+                    self.ring_underruns += 1
+                if not copied:
+                    required_frames = yield self._silence_bytes(frames)
+                    continue
+            if self.spectrum.active:
+                self.spectrum.feed(out)
+            required_frames = yield out
+
+    # --- render-ahead producer ---
+
+    def _start_producer(self) -> None:
+        if self._ring is None or self._producer is not None and self._producer.is_alive():
+            return
+        self._producer_stop.clear()
+        self._producer = threading.Thread(target=self._produce, name="PlaybackRenderAhead", daemon=True)
+        self._producer.start()
+
+    def _stop_producer(self) -> None:
+        self._producer_stop.set()
+        self._producer_wake.set()
+        producer, self._producer = self._producer, None
+        if producer is not None and producer is not threading.current_thread():
+            producer.join(1.0)
+
+    def _produce(self) -> None:
+        ring, frames = self._ring, self.frames_per_block
+        block_seconds = frames / float(self.sample_rate)
+        while not self._producer_stop.is_set():
+            with self._lock:  # a consistent (cursor, transition) pair; rendering runs unlocked
+                cursor, transition = self._cursor, self._transition
+                idle = self._paused or cursor.source is None and transition is None
+            if idle:
+                self._producer_wake.wait(0.5)
+                self._producer_wake.clear()
+                continue
+            generation = cursor.generation
+            if not ring.wants(generation):
+                self._producer_wake.wait(block_seconds / 2)  # the callback frees a slot per block
+                self._producer_wake.clear()
+                continue
+            block = self._render_block(frames, cursor, transition)
+            if block is None or self._generation != generation:
+                continue  # the source was replaced while this block was rendered
+            ring.write(block, generation)
+            self._primed_generation = generation
+
+    def _count_gap(self, frames: int) -> None:
+        now = time.perf_counter()
+        last, self._last_callback = self._last_callback, now
+        if last is None:
+            return
+        gap = now - last
+        if self._buffer_seconds and gap > self._buffer_seconds:
+            self.underruns += 1  # the whole device buffer drained before this callback
+        elif gap > 1.5 * frames / self.sample_rate:
+            self.late_callbacks += 1
+
+    def _render_transition(self, cursor: _RenderCursor, transition: _Transition, frames: int):
+        source = cursor.source
+        outgoing = self._pull(source, frames) if source is not None else None
+        if transition.delay is None:
+            if not transition.ready():
+                # The incoming track is still being opened: keep the outgoing one playing.
+                if outgoing is None:
+                    if source is not None:
+                        self._end_source(cursor)
+                    return self._silence_bytes(frames)
+                cursor.frame += frames
+                return outgoing
+            if callable(transition.source):
+                try:
+                    transition.source = transition.source()
+                except Exception as exc:
+                    print(f"PlaybackEngine: transition source failed: {exc}")
+                    self._end_transition(cursor, transition)
+                    return outgoing if outgoing is not None else self._silence_bytes(frames)
+            beat = transition.beat_frames
+            transition.delay = (-cursor.frame) % beat if beat and outgoing is not None else 0
+        if outgoing is None:
+            transition.delay = 0  # outgoing ended early: bring the incoming track in right away
+        elif transition.delay >= frames:
+            transition.delay -= frames
+            cursor.frame += frames
+            return outgoing
+
+        nch = self.nchannels
+        start, transition.delay = transition.delay, 0
+        count = frames - start
+        incoming = self._pull(transition.source, count)
+        if incoming is None:
+            incoming = np.zeros(count * nch, dtype=np.int16)
+        # Equal-power curve; past the end of the fade the gains settle at 0 (out) and 1 (in).
+        phase = np.minimum(1.0, (transition.done + 1 + np.arange(count)) / transition.fade_frames) * (np.pi / 2)
+        mixed = np.zeros(frames * nch, dtype=np.float32)
+        if outgoing is not None:
+            mixed[: start * nch] = outgoing[: start * nch]
+            mixed[start * nch:] = outgoing[start * nch:] * np.repeat(np.cos(phase), nch)
+        mixed[start * nch:] += incoming * np.repeat(np.sin(phase), nch)
+        transition.done += count
+
+        cursor.frame += frames
+        if transition.done >= transition.fade_frames:
+            with self._lock:
+                if self._transition is transition and self._generation == cursor.generation:
+                    self._transition = None
+                    self._owner = transition.owner
+                    cursor.source = transition.source
+                    cursor.frame = transition.done
+        return np.clip(np.rint(mixed), -32768, 32767).astype(np.int16)
+
+
+_shared_engine: Optional[PlaybackEngine] = None
+_shared_lock = threading.Lock()
+
+
+def shared_engine() -> PlaybackEngine:
+    """Process-wide engine used by every MiniaudioPlayer."""
+    global _shared_engine
+    with _shared_lock:
+        if _shared_engine is None:
+            _shared_engine = PlaybackEngine()
+        return _shared_engine
+
+
+def close_shared_engine() -> None:
+    global _shared_engine
+    with _shared_lock:
+        engine, _shared_engine = _shared_engine, None
+    if engine is not None:
+        engine.close()
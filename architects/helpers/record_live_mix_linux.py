@@ -2,7 +2,7 @@ import sys
 import time
 import subprocess
 import threading
-from typing import Optional, List
+from typing import Callable, Optional, List
 import numpy as np
 import pulsectl
 import collections
@@ -89,12 +89,14 @@ class AudioSource:
                 self.proc.kill()
 
 class LiveMixer:
-    def __init__(self, blacklist: Optional[List[str]] = None):
+    def __init__(self, blacklist: Optional[List[str]] = None, block_listeners: Optional[List[Callable]] = None):
         self.sources = {} # Key: Serial/ID -> AudioSource
         self.pulse = pulsectl.Pulse('live-mixer')
         self.mix_buffer = [] # Accumulation list of numpy arrays
         self.buffer_lock = threading.Lock()
         self.running = True
+        # Called with every mixed (CHUNK_SIZE, CHANNELS) int16 block on the mixer thread; keep them cheap.
+        self.block_listeners: List[Callable] = list(block_listeners or [])
         
         if blacklist is not None:
             self.blacklist = blacklist
@@ -136,6 +138,12 @@ class LiveMixer:
             
             with self.buffer_lock:
                 self.mix_buffer.append(final_chunk)
+
+            for listener in self.block_listeners:
+                try:
+                    listener(final_chunk)
+                except Exception as e:
+                    print(f"[!] Block listener failed: {e}")
             
             # Maintain timing
             # If processing took less than chunk time, sleep remainder
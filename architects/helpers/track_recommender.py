@@ -0,0 +1,209 @@
+"""
+Harmonic-mixing next-track recommender.
+
+For every mood bucket a k-nearest-neighbour list is precomputed per track, using a
+distance over Camelot wheel steps, tempo ratio (half/double time folded) and mood
+membership. "Next track for mood X after track Y" then only reads Y's k neighbours
+in bucket X and applies a recency penalty to recently played tracks.
+
+The graph is saved as `neighbors.npy` / `distances.npy` plus `graph.json`; a graph
+whose input signature no longer matches the library is rebuilt.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, Iterable, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from mood_readers.feature_store import FeatureStore
+
+DEFAULT_K = 12
+# Distance weights: one Camelot step == one unit; ~8% tempo difference == one unit.
+CAMELOT_WEIGHT = 1.0
+TEMPO_WEIGHT = 9.0
+MOOD_WEIGHT = 2.0
+UNKNOWN_KEY_STEPS = 3.0
+UNKNOWN_TEMPO_DISTANCE = 1.0
+# Penalty added to a track played `n` plays ago: RECENCY_PENALTY * RECENCY_DECAY ** n.
+RECENCY_PENALTY = 10.0
+RECENCY_DECAY = 0.8
+RECENCY_WINDOW = 32
+BUILD_BLOCK_ROWS = 512
+
+
+def default_graph_dir() -> Path:
+    from ui_ux_team.blue_ui.config.runtime_paths import user_config_dir
+
+    return user_config_dir() / "recommender"
+
+
+def _key_distance_table() -> np.ndarray:
+    """Camelot steps between key codes (number - 1) * 2 + minor; code 24 is an unknown key."""
+    codes = np.arange(24)
+    number, minor = codes // 2, codes % 2
+    diff = np.abs(number[:, None] - number[None, :])
+    table = np.full((25, 25), UNKNOWN_KEY_STEPS, dtype=np.float32)
+    table[:24, :24] = np.minimum(diff, 12 - diff) + (minor[:, None] != minor[None, :])
+    return CAMELOT_WEIGHT * table
+
+
+_KEY_DISTANCES = _key_distance_table()
+
+
+def harmonic_distance_matrix(store: FeatureStore, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """Weighted key + tempo distance between `rows` and `cols` of the store (len(rows) x len(cols))."""
+    number = store.column("camelot_number").astype(np.int16)
+    codes = np.where(number > 0, (number - 1) * 2 + store.column("camelot_minor"), 24)
+    dist = _KEY_DISTANCES[codes[rows][:, None], codes[cols][None, :]]
+
+    bpm = store.column("bpm")
+    known = np.isfinite(bpm) & (bpm > 0)
+    log_bpm = np.log2(np.where(known, bpm, 1.0)).astype(np.float32)
+    # Half/double time mixes cleanly, so tempo distance is to the nearest octave of the ratio.
+    tempo = log_bpm[rows][:, None] - log_bpm[cols][None, :]
+    tempo -= np.rint(tempo)
+    np.abs(tempo, out=tempo)
+    tempo *= TEMPO_WEIGHT
+    tempo[~known[rows], :] = UNKNOWN_TEMPO_DISTANCE
+    tempo[:, ~known[cols]] = UNKNOWN_TEMPO_DISTANCE
+    dist += tempo
+    return dist
+
+
+class NextTrackRecommender:
+    """Per-mood k-nearest-neighbour graph over a feature store, with recency-aware lookups."""
+
+    def __init__(self, store: FeatureStore, mood_buckets: Mapping[str, Iterable[str]], k: int = DEFAULT_K):
+        self.store = store
+        self.k = max(1, int(k))
+        self.moods: List[str] = list(mood_buckets)
+        self.paths: List[str] = store.paths()
+        row_of = {p: i for i, p in enumerate(self.paths)}
+        # membership[m, i]: track i is in mood bucket m (paths outside the store are ignored).
+        self.membership = np.zeros((len(self.moods), len(self.paths)), dtype=bool)
+        for m, mood in enumerate(self.moods):
+            rows = [row_of[p] for p in mood_buckets[mood] if p in row_of]
+            self.membership[m, rows] = True
+        self.signature = self._signature()
+        self.neighbors: Optional[np.ndarray] = None  # (moods, tracks, k) row indices, -1 padded
+        self.distances: Optional[np.ndarray] = None
+        self._row_of = row_of
+        self._recent: Deque[int] = deque(maxlen=RECENCY_WINDOW)
+
+    def _signature(self) -> str:
+        digest = hashlib.sha256()
+        digest.update(json.dumps([self.k, self.moods, self.paths]).encode("utf-8"))
+        for name in ("bpm", "camelot_number", "camelot_minor"):
+            digest.update(np.ascontiguousarray(self.store.column(name)).tobytes())
+        digest.update(np.packbits(self.membership).tobytes())
+        return digest.hexdigest()
+
+    # --- graph ---
+
+    def build(self) -> "NextTrackRecommender":
+        n, k = len(self.paths), self.k
+        self.neighbors = np.full((len(self.moods), n, k), -1, dtype=np.int32)
+        self.distances = np.full((len(self.moods), n, k), np.inf, dtype=np.float32)
+        if n == 0:
+            return self
+
+        mood_vectors = self.membership.T.astype(np.float32)
+        norms = np.linalg.norm(mood_vectors, axis=1, keepdims=True)
+        mood_vectors = np.divide(mood_vectors, norms, out=np.zeros_like(mood_vectors), where=norms > 0)
+        all_rows = np.arange(n)
+
+        for m in range(len(self.moods)):
+            members = np.flatnonzero(self.membership[m])
+            if members.size == 0:
+                continue
+            take = min(k, members.size)
+            for start in range(0, n, BUILD_BLOCK_ROWS):
+                rows = all_rows[start:start + BUILD_BLOCK_ROWS]
+                dist = harmonic_distance_matrix(self.store, rows, members)
+                dist += MOOD_WEIGHT * (1.0 - mood_vectors[rows] @ mood_vectors[members].T)
+                dist[rows[:, None] == members[None, :]] = np.inf  # never recommend the same track
+                top = np.argpartition(dist, take - 1, axis=1)[:, :take]
+                top_dist = np.take_along_axis(dist, top, axis=1)
+                order = np.argsort(top_dist, axis=1)
+                top, top_dist = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_dist, order, axis=1)
+                self.neighbors[m, rows, :take] = np.where(np.isfinite(top_dist), members[top], -1)
+                self.distances[m, rows, :take] = top_dist
+        return self
+
+    def save(self, directory: Path) -> None:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "neighbors.npy", self.neighbors)
+        np.save(directory / "distances.npy", self.distances)
+        meta = {"signature": self.signature, "k": self.k, "moods": self.moods, "paths": self.paths}
+        (directory / "graph.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+
+    def load(self, directory: Path) -> bool:
+        """Loads a saved graph if it was built from the same inputs; returns False otherwise."""
+        directory = Path(directory)
+        try:
+            meta = json.loads((directory / "graph.json").read_text(encoding="utf-8"))
+            if meta.get("signature") != self.signature:
+                return False
+            self.neighbors = np.load(directory / "neighbors.npy")
+            self.distances = np.load(directory / "distances.npy")
+        except (OSError, ValueError):
+            return False
+        return True
+
+    @classmethod
+    def load_or_build(cls, store: FeatureStore, mood_buckets: Mapping[str, Iterable[str]],
+                      directory: Optional[Path] = None, k: int = DEFAULT_K) -> "NextTrackRecommender":
+        recommender = cls(store, mood_buckets, k=k)
+        if directory is not None and recommender.load(directory):
+            return recommender
+        recommender.build()
+        if directory is not None:
+            try:
+                recommender.save(directory)
+            except OSError as exc:
+                print(f"[TrackRecommender] Could not save neighbour graph: {exc}")
+        return recommender
+
+    # --- queries ---
+
+    def note_played(self, path: str) -> None:
+        row = self._row_of.get(str(path))
+        if row is not None:
+            self._recent.append(row)
+
+    def next_track(self, mood: str, after: Optional[str] = None, exclude: Sequence[str] = ()) -> Optional[str]:
+        """
+        Best neighbour of `after` in mood bucket `mood`, after recency penalties.
+        Returns None when `after` is unknown or has no neighbour in that bucket.
+        """
+        if self.neighbors is None or mood not in self.moods:
+            return None
+        row = self._row_of.get(str(after)) if after is not None else None
+        if row is None:
+            return None
+        m = self.moods.index(mood)
+        candidates = self.neighbors[m, row]
+        scores = self.distances[m, row].astype(np.float64)
+        penalties = self._recency_penalties()
+        excluded = {self._row_of.get(str(p)) for p in exclude}
+        best, best_score = None, np.inf
+        for candidate, score in zip(candidates, scores):
+            candidate = int(candidate)
+            if candidate < 0 or candidate in excluded:
+                continue
+            score += penalties.get(candidate, 0.0)
+            if score < best_score:
+                best, best_score = candidate, score
+        return self.paths[best] if best is not None else None
+
+    def _recency_penalties(self) -> Dict[int, float]:
+        penalties: Dict[int, float] = {}
+        for age, row in enumerate(reversed(self._recent)):
+            penalties[row] = penalties.get(row, 0.0) + RECENCY_PENALTY * RECENCY_DECAY ** age
+        return penalties
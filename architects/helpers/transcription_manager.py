@@ -1,6 +1,7 @@
 import threading
 import time
-from typing import Optional, Callable, Dict, Any, List
+from collections import deque
+from typing import Optional, Callable, Deque, Dict, Any, List, Tuple
 
 import tempfile
 import os
@@ -10,8 +11,12 @@ from architects.helpers.audio_utils import (
     SoundPacketBuilder, 
     pcm_to_wav_bytes
 )
-from architects.helpers.api_utils import LLMUtilitySuite
-from mood_readers.librosa_cli import analyze_audio_bytes_logic
+from architects.helpers.api_utils import (
+    CUSTOM_TRANSCRIPTION_PROMPT_MEET_TYPE_SIMPLE,
+    INLINE_AUDIO_LIMIT_BYTES,
+    LLMUtilitySuite,
+)
+from mood_readers.live_mood_estimator import LiveMoodEstimator
 from architects.platform_detection.platform_detection import os_info
 from ui_ux_team.blue_ui import settings as app_settings
 
@@ -20,7 +25,13 @@ class TranscriptionManager:
     Manages audio recording, processing, and transcription via LLM API.
     Decouples functional logic from the UI.
     """
-    def __init__(self, api_key: str, chunk_seconds: int = 30, blacklist: Optional[List[str]] = None):
+    def __init__(
+        self,
+        api_key: str,
+        chunk_seconds: int = 30,
+        blacklist: Optional[List[str]] = None,
+        max_batch_chunks: int = 4,
+    ):
         if not api_key:
             raise ValueError("API Key is required for TranscriptionManager")
             
@@ -30,12 +41,20 @@ class TranscriptionManager:
         self._callback: Optional[Callable[[str], None]] = None
         
         self._chunk_seconds = chunk_seconds
+        # Upper bound for packing a transcription backlog into one request.
+        self._max_batch_chunks = max(1, int(max_batch_chunks))
+        self._backlog: Deque[bytes] = deque()
         
         # Use the blacklist provided by the user
         self._blacklist = blacklist or ['pw-record', 'live-mixer', 'easyeffects', 'loopback', 'speech-dispatcher', 'python']
         
         self._worker_thread: Optional[threading.Thread] = None
 
+        # Live tempo/key/energy estimate, fed block-by-block while recording.
+        self._mood: Optional[LiveMoodEstimator] = None
+        self._mood_streaming = False
+        self._mood_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+
     def set_callback(self, callback: Callable[[Dict[str, Any]], None]):
         """
         Sets the callback function to receive the raw transcription dictionary.
@@ -43,6 +62,17 @@ class TranscriptionManager:
         """
         self._callback = callback
 
+    def set_mood_callback(self, callback: Optional[Callable[[Dict[str, Any]], None]]):
+        """
+        Sets a callback for live mood estimates (published every few seconds of audio,
+        independent of the transcription API). May be called from the audio thread.
+        """
+        self._mood_callback = callback
+
+    def latest_mood(self) -> Optional[Dict[str, Any]]:
+        """Most recent live mood estimate, or None before enough audio was recorded."""
+        return self._mood.latest() if self._mood is not None else None
+
     def start_recording(self):
         """Starts the audio controller and the transcription worker thread."""
         if self._recorder is not None:
@@ -62,6 +92,8 @@ class TranscriptionManager:
             print(f'[TranscriptionManager] {info.get("system")} detected, using AudioController')
             self._recorder = AudioController(chunk_seconds=self._chunk_seconds)
 
+        self._attach_mood_estimator()
+
         try:
             self._recorder.start()
         except Exception as exc:
@@ -80,6 +112,7 @@ class TranscriptionManager:
             raise RuntimeError(f"Failed to start audio recorder: {exc}") from exc
 
         self._is_recording = True
+        self._backlog.clear()
         self._worker_thread = threading.Thread(target=self._worker_loop, daemon=True)
         self._worker_thread.start()
 
@@ -107,26 +140,75 @@ class TranscriptionManager:
     def is_recording(self) -> bool:
         return self._recorder is not None
 
+    def _attach_mood_estimator(self):
+        """Streams mixer blocks into the estimator when the recorder supports it; otherwise chunks feed it."""
+        rate = getattr(getattr(self._recorder, "mic", None), "rate", 48000)
+        self._mood = LiveMoodEstimator(sample_rate=rate, channels=2, on_estimate=self._on_mood_estimate)
+        add_listener = getattr(self._recorder, "add_block_listener", None)
+        self._mood_streaming = callable(add_listener)
+        if self._mood_streaming:
+            add_listener(self._mood.push_pcm)
+
+    def _on_mood_estimate(self, estimate: Dict[str, Any]):
+        if self._mood_callback:
+            self._mood_callback(estimate)
+
     def _worker_loop(self):
         """Background loop to process audio chunks and call API."""
         while self._is_recording and self._recorder:
             # Check if there are chunks to process
-            audio_bytes = self._recorder.pop_combined_stereo()
-            
-            if audio_bytes:
+            batch = self._next_batch()
+
+            if len(batch) == 1:
                 print("[TranscriptionManager] Sending audio to transcription API...")
-                self._process_chunk(audio_bytes)
+                self._process_chunk(batch[0])
+            elif batch:
+                print(f"[TranscriptionManager] Backlog detected, sending {len(batch)} chunks in one request...")
+                self._process_batch(batch)
             else:
                 # print("[TranscriptionManager] No audio chunk ready")
                 pass
 
             time.sleep(1)
 
-    def _process_chunk(self, audio_bytes: bytes):
-        """Processes a single audio chunk."""
+    def _batch_size_for_backlog(self, depth: int) -> int:
+        """A single ready chunk keeps the low-latency path; deeper backlogs are packed together."""
+        return max(1, min(self._max_batch_chunks, int(depth)))
+
+    def _next_batch(self) -> List[bytes]:
+        """Pops the next group of PCM chunks to send, sized by backlog depth and inline payload budget."""
+        recorder = self._recorder
+        if recorder is None:
+            return []
+
+        pending_fn = getattr(recorder, "pending_chunks", None)
+        waiting = pending_fn() if callable(pending_fn) else 1
+        target = self._batch_size_for_backlog(len(self._backlog) + waiting)
+
+        while len(self._backlog) < target:
+            audio_bytes = recorder.pop_combined_stereo()
+            if not audio_bytes:
+                break
+            if self._mood is not None and not self._mood_streaming:
+                self._mood.push_pcm(audio_bytes)
+            self._backlog.append(audio_bytes)
+
+        batch: List[bytes] = []
+        payload_bytes = 0
+        while self._backlog and len(batch) < target:
+            # WAV header is 44 bytes on top of the raw PCM payload.
+            next_size = len(self._backlog[0]) + 44
+            if batch and payload_bytes + next_size > INLINE_AUDIO_LIMIT_BYTES:
+                break
+            batch.append(self._backlog.popleft())
+            payload_bytes += next_size
+        return batch
+
+    def _prepare_chunk(self, audio_bytes: bytes) -> Optional[Tuple[bytes, str]]:
+        """Converts raw PCM into WAV bytes plus optional analysis tags for the prompt."""
         # Validate recorder state again just in case
-        if not self._recorder: 
-            return
+        if not self._recorder:
+            return None
 
         # Prepare WAV for API
         wav_bytes = pcm_to_wav_bytes(
@@ -136,17 +218,15 @@ class TranscriptionManager:
             sampwidth=self._recorder.mic.sampwidth
         )
 
-        # In-memory Librosa analysis
+        # Latest live estimate (already computed on the audio thread as blocks arrived)
         analysis_tags = ""
-        try:
-            analysis = analyze_audio_bytes_logic(wav_bytes)
+        analysis = self.latest_mood()
+        if analysis:
             bpm = analysis.get("bpm", "N/A")
             camelot = analysis.get("key_camelot", "N/A")
             mood = analysis.get("mood_detailed", "N/A")
             analysis_tags = f"[Audio Analysis: {bpm} BPM, Camelot Key: {camelot}, Mood: {mood}]"
-            print(f"[TranscriptionManager] Librosa Analysis: {analysis_tags}")
-        except Exception as e:
-            print(f"[TranscriptionManager] Librosa analysis failed: {e}")
+            print(f"[TranscriptionManager] Live Analysis: {analysis_tags}")
 
         # Optional: Packet builder logic (preserved from original code)
         packet = SoundPacketBuilder(
@@ -157,49 +237,90 @@ class TranscriptionManager:
         )
         compressed_bytes = packet.prep_pck()
         print(f"[TranscriptionManager] Compressed audio prepared ({len(compressed_bytes)} bytes)")
+        return wav_bytes, analysis_tags
+
+    def _process_chunk(self, audio_bytes: bytes):
+        """Processes a single audio chunk."""
+        prepared = self._prepare_chunk(audio_bytes)
+        if prepared is None:
+            return
+        wav_bytes, analysis_tags = prepared
 
         # Call API
         try:
             prompt = None
             if analysis_tags:
-                from architects.helpers.api_utils import CUSTOM_TRANSCRIPTION_PROMPT_MEET_TYPE_SIMPLE
-                prompt = f"{analysis_tags}\n\n{CUSTOM_TRANSCRIPTION_PROMPT_MEET_TYPE_SIMPLE}"
+                # Tags vary per chunk; keep them out of the static (cacheable) prompt.
+                prompt = CUSTOM_TRANSCRIPTION_PROMPT_MEET_TYPE_SIMPLE
 
             result = self._llm_utils.transcribe_audio_bytes(
                 wav_bytes,
                 mime_type="audio/wav",
                 model_name=app_settings.transcription_model(),
                 prompt=prompt,
+                prompt_context=analysis_tags or None,
                 structured=True,
             )
+            self._deliver_result(result, analysis_tags)
+        except Exception as e:
+            print(f"[TranscriptionManager] Error during transcription: {e}")
 
-            if result.get("error"):
-                print(f"[TranscriptionManager] API error: {result.get('error')}")
-                if self._callback:
-                    self._callback(result)
-                if result.get("limit_blocked"):
-                    # Stop loop to prevent repeated rate-limit spam.
-                    self.stop_recording()
-                return
-            
-            # Cleanup result
-            result.pop("raw_response", None)
-            result.pop("source", None)
-            result.pop("model", None)
-            
-            # Add analysis to result for callback
-            if analysis_tags:
-                result["audio_analysis"] = analysis_tags
+    def _process_batch(self, batch: List[bytes]):
+        """Processes several backlogged chunks with one request and replays results in order."""
+        prepared = []
+        for audio_bytes in batch:
+            item = self._prepare_chunk(audio_bytes)
+            if item is not None:
+                prepared.append(item)
+        if not prepared:
+            return
 
-            print("--- DEBUG TRANSCRIPT")
-            print(result)
-            print("-------- END -------\n")
+        chunks = [
+            {"id": f"c{index}", "data": wav_bytes, "context": analysis_tags}
+            for index, (wav_bytes, analysis_tags) in enumerate(prepared)
+        ]
+        try:
+            results = self._llm_utils.transcribe_audio_batch(
+                chunks,
+                model_name=app_settings.transcription_model(),
+                mime_type="audio/wav",
+            )
+            for result, (_, analysis_tags) in zip(results, prepared):
+                if not self._deliver_result(result, analysis_tags):
+                    break
+        except Exception as e:
+            print(f"[TranscriptionManager] Error during batch transcription: {e}")
 
+    def _deliver_result(self, result: Dict[str, Any], analysis_tags: str) -> bool:
+        """Forwards one transcription result to the callback. Returns False when recording was stopped."""
+        if result.get("error"):
+            print(f"[TranscriptionManager] API error: {result.get('error')}")
             if self._callback:
                 self._callback(result)
+            if result.get("limit_blocked"):
+                # Stop loop to prevent repeated rate-limit spam.
+                self.stop_recording()
+                return False
+            return True
 
-        except Exception as e:
-            print(f"[TranscriptionManager] Error during transcription: {e}")
+        # Cleanup result
+        result.pop("raw_response", None)
+        result.pop("source", None)
+        result.pop("model", None)
+        result.pop("chunk_id", None)
+        result.pop("batch_size", None)
+
+        # Add analysis to result for callback
+        if analysis_tags:
+            result["audio_analysis"] = analysis_tags
+
+        print("--- DEBUG TRANSCRIPT")
+        print(result)
+        print("-------- END -------\n")
+
+        if self._callback:
+            self._callback(result)
+        return True
 
     @staticmethod
     def format_transcript_text(result: Dict[str, Any]) -> Optional[str]:
@@ -1,6 +1,36 @@
+import queue
+import threading
 from pathlib import Path
 from architects.helpers.managed_mem import ManagedMem
 
+# Songs whose file has no cached analysis yet; analyzed one at a time on a background thread.
+_analysis_queue = queue.Queue()
+_analysis_thread = None
+_analysis_thread_lock = threading.Lock()
+
+
+def _queue_analysis(song):
+    global _analysis_thread
+    with _analysis_thread_lock:
+        if _analysis_thread is None or not _analysis_thread.is_alive():
+            _analysis_thread = threading.Thread(target=_analysis_loop, name="SongAnalysis", daemon=True)
+            _analysis_thread.start()
+    _analysis_queue.put(song)
+
+
+def _analysis_loop():
+    from mood_readers import librosa_cli
+
+    while True:
+        song = _analysis_queue.get()
+        try:
+            result = librosa_cli.analyze_file_cached(str(song.filepath))
+        except Exception as exc:  # noqa: BLE001
+            result = {"error": str(exc)}
+        if "error" not in result:
+            song._apply_analysis(result)
+
+
 class Song():
     def __init__(self, song_filepath):
         # Required
@@ -47,12 +77,47 @@ class Song():
         pass
 
     def _get_camelot(self):
-        # use mood readers script to determine camelot
-        pass
+        # camelot from the mood readers analysis (cached per file content)
+        if self.camelot_tags is None:
+            analysis = self._cached_analysis()
+            camelot = (analysis or {}).get("key_camelot")
+            if camelot and camelot != "N/A":
+                self.camelot_tags = [camelot]
 
     def _get_tempo(self):
-        # use mood readers script to determine tempo
-        pass
+        # tempo from the mood readers analysis (cached per file content)
+        if self.tempo is None:
+            analysis = self._cached_analysis()
+            if analysis and analysis.get("bpm"):
+                self.tempo = int(analysis["bpm"])
+
+    def _cached_analysis(self):
+        """ analysis cache lookup, once per instance; a miss queues the file and returns None """
+        if "_analysis" not in self.__dict__:
+            self._analysis = self._lookup_analysis()
+        return self._analysis
+
+    def _lookup_analysis(self):
+        if not self.filepath.is_file():
+            return None
+        try:
+            from mood_readers.librosa_cli import default_analysis_cache
+        except (ImportError, SystemExit):  # librosa_cli exits when librosa is missing
+            return None
+        cached = default_analysis_cache().get(str(self.filepath))
+        if cached is None:
+            # Never analyzed (or changed since): analyze in the background, not in Song().
+            _queue_analysis(self)
+            return None
+        return None if "error" in cached else cached
+
+    def _apply_analysis(self, result):
+        """ called from the analysis thread once a queued file has been analyzed """
+        self._analysis = result
+        self._get_camelot()
+        self._get_tempo()
+        if self.mem_man is not None:
+            self.mem_man.settr(self._normalize_key(self.filepath), self)
 
     def _get_duration(self):
         # use pyaudio to get duration (could be useful for queue operations)
@@ -9,9 +9,15 @@ import shutil
 import tempfile
 import json
 import sys
+import threading
+import time
 from pathlib import Path
+from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
+import miniaudio
+import numpy as np
+
 # Ensure project root is in sys.path
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 if str(PROJECT_ROOT) not in sys.path:
@@ -20,7 +26,19 @@ if str(PROJECT_ROOT) not in sys.path:
 from architects.helpers.managed_mem import ManagedMem
 from ui_ux_team.blue_ui.app import api_usage_guard
 from architects.helpers.api_utils import LLMUtilitySuite
+from architects.helpers.context_cache import ContextCacheManager
+from architects.helpers.embedding_index import EmbeddingCache, TranscriptVectorIndex, cached_embeddings, split_transcript
+from architects.helpers.gain_stage import GainStage, loudness_gain
+from architects.helpers.gemini_chatbot import GeminiChatbot
+from architects.helpers.library_index import LibraryIndex
+from architects.helpers.miniaudio_player import MiniaudioPlayer
+from architects.helpers.output_devices import OutputDeviceManager
+from architects.helpers.pcm_cache import DecodedPCMCache
+from architects.helpers.playback_engine import PlaybackEngine
+from architects.helpers.genai_client import GenAIChatSession
+from architects.helpers.track_recommender import NextTrackRecommender
 from architects.helpers.transcription_manager import TranscriptionManager
+from mood_readers.feature_store import FeatureStore
 from ui_ux_team.blue_ui.app.secure_api_key import read_api_key, set_runtime_api_key, RUNTIME_SOURCE_DOTENV
 from ui_ux_team.blue_ui import settings as app_settings
 
@@ -74,6 +92,61 @@ class TestAPIUsageGuard(unittest.TestCase):
         state = api_usage_guard.current_usage_state()
         self.assertAlmostEqual(state["month_spend_usd"], cost, places=5)
 
+    def test_record_usage_discounts_cached_tokens(self):
+        fresh_cost = api_usage_guard.record_usage(
+            scope="test", model_name="gemini-2.5-flash", usage={"prompt_tokens": 1000000}
+        )
+        cached_cost = api_usage_guard.record_usage(
+            scope="test", model_name="gemini-2.5-flash", usage={"prompt_tokens": 1000000, "cached_tokens": 800000}
+        )
+        self.assertLess(cached_cost, fresh_cost)
+        state = api_usage_guard.current_usage_state()
+        self.assertEqual(state["month_cached_input_tokens"], 800000)
+        self.assertEqual(state["month_fresh_input_tokens"], 1200000)
+
+
+class TestContextCacheManager(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.create_cached_content.return_value = SimpleNamespace(name="cachedContents/abc")
+        self.manager = ContextCacheManager(self.client, ttl_seconds=600, min_cache_tokens=10)
+        self.prompt = "static instruction " * 20
+
+    def test_reuses_cache_per_model(self):
+        first = self.manager.get_or_create("models/gemini-2.5-flash", contents=[self.prompt])
+        second = self.manager.get_or_create("models/gemini-2.5-flash", contents=[self.prompt])
+        self.assertEqual(first, "cachedContents/abc")
+        self.assertEqual(second, first)
+        self.assertEqual(self.client.create_cached_content.call_count, 1)
+
+    def test_refreshes_ttl_near_expiry(self):
+        name = self.manager.get_or_create("models/gemini-2.5-flash", contents=[self.prompt])
+        entry = next(iter(self.manager._entries.values()))
+        entry.expires_at -= 590
+        self.assertEqual(self.manager.get_or_create("models/gemini-2.5-flash", contents=[self.prompt]), name)
+        self.client.refresh_cached_content.assert_called_once()
+
+    def test_falls_back_when_unsupported(self):
+        self.client.create_cached_content.side_effect = RuntimeError(
+            "400 INVALID_ARGUMENT. Cached content is too small. total_token_count=300, min_total_token_count=1024"
+        )
+        self.assertIsNone(self.manager.get_or_create("models/gemini-2.5-flash", contents=[self.prompt]))
+        self.assertIsNone(self.manager.get_or_create("models/gemini-2.5-flash", contents=[self.prompt]))
+        self.assertEqual(self.client.create_cached_content.call_count, 1)
+        self.assertIsNone(self.manager.get_or_create("models/gemma-3-27b-it", contents=[self.prompt]))
+        self.assertIsNone(self.manager.get_or_create("models/gemini-2.5-flash", contents=["short"]))
+
+
+    def test_transient_create_failure_is_retried_later(self):
+        self.client.create_cached_content.side_effect = [RuntimeError("503 UNAVAILABLE"), SimpleNamespace(name="c/1")]
+        self.assertIsNone(self.manager.get_or_create("models/gemini-2.5-flash", contents=[self.prompt]))
+        self.assertIsNone(self.manager.get_or_create("models/gemini-2.5-flash", contents=[self.prompt]))
+        self.assertEqual(self.client.create_cached_content.call_count, 1)
+
+        for key in self.manager._retry_after:
+            self.manager._retry_after[key] -= 301
+        self.assertEqual(self.manager.get_or_create("models/gemini-2.5-flash", contents=[self.prompt]), "c/1")
+
 
 class TestLLMUtilitySuite(unittest.TestCase):
     def setUp(self):
@@ -98,6 +171,1009 @@ class TestLLMUtilitySuite(unittest.TestCase):
         res = LLMUtilitySuite.send_chat_message(mock_session, "hello")
         self.assertEqual(res, "hello from AI")
 
+    @patch("architects.helpers.api_utils.record_usage")
+    @patch("architects.helpers.api_utils.reserve_request", return_value=(True, ""))
+    def test_transcribe_audio_batch_demuxes_in_order(self, mock_reserve, mock_record):
+        payload = {
+            "results": [
+                {"chunk_id": "c1", "content": "second", "emotion": "Tense"},
+                {"chunk_id": "c0", "content": "first", "emotion": "positive"},
+            ]
+        }
+        self.mock_client.generate_content.return_value = {"text": json.dumps(payload), "usage": {"total_tokens": 10}}
+        chunks = [{"id": "c0", "data": b"a"}, {"id": "c1", "data": b"b", "context": "[tags]"}]
+
+        results = self.suite.transcribe_audio_batch(chunks, model_name="gemini-2.5-flash-lite")
+
+        self.assertEqual(mock_reserve.call_count, 1)
+        self.assertEqual(self.mock_client.generate_content.call_count, 1)
+        self.assertEqual([r["chunk_id"] for r in results], ["c0", "c1"])
+        self.assertEqual([r["text"] for r in results], ["first", "second"])
+        self.assertEqual(results[1]["emotion"], "tense")
+        self.assertEqual(results[1]["usage"], {})
+        contents = self.mock_client.generate_content.call_args.kwargs["contents"]
+        self.assertIn("[chunk_id=c1] [tags]", contents)
+
+    @patch("architects.helpers.api_utils.record_usage")
+    @patch("architects.helpers.api_utils.reserve_request", return_value=(True, ""))
+    def test_transcribe_audio_uses_cached_prompt_and_falls_back(self, mock_reserve, _mock_record):
+        self.suite.context_cache = MagicMock()
+        self.suite.context_cache.get_or_create.return_value = "cachedContents/abc"
+        self.mock_client.generate_content.side_effect = [
+            RuntimeError("403 PERMISSION_DENIED. CachedContent not found (or permission denied)"),
+            {"text": json.dumps({"content": "hi"})},
+        ]
+
+        res = self.suite.transcribe_audio(b"wav", prompt="static", prompt_context="[tags]")
+
+        self.assertEqual(res["text"], "hi")
+        self.assertEqual(mock_reserve.call_count, 2)
+        first, second = self.mock_client.generate_content.call_args_list
+        self.assertEqual(first.kwargs["config"]["cached_content"], "cachedContents/abc")
+        self.assertEqual(first.kwargs["contents"][0], "[tags]")
+        self.assertNotIn("cached_content", second.kwargs["config"])
+        self.assertEqual(second.kwargs["contents"][0], "[tags]\n\nstatic")
+        self.suite.context_cache.invalidate.assert_called_once_with("cachedContents/abc")
+
+    @patch("architects.helpers.api_utils.record_usage")
+    @patch("architects.helpers.api_utils.reserve_request", return_value=(True, ""))
+    def test_cached_prompt_other_errors_are_not_retried(self, mock_reserve, _mock_record):
+        self.suite.context_cache = MagicMock()
+        self.suite.context_cache.get_or_create.return_value = "cachedContents/abc"
+        self.mock_client.generate_content.side_effect = RuntimeError("500 INTERNAL")
+
+        res = self.suite.transcribe_audio(b"wav", prompt="static")
+
+        self.assertIn("500 INTERNAL", res["error"])
+        self.assertEqual(self.mock_client.generate_content.call_count, 1)
+        self.assertEqual(mock_reserve.call_count, 1)
+        self.suite.context_cache.invalidate.assert_not_called()
+
+    @patch("architects.helpers.api_utils.record_usage")
+    @patch("architects.helpers.api_utils.reserve_request", side_effect=[(True, ""), (False, "cap exceeded")])
+    def test_expired_cache_retry_needs_quota(self, _mock_reserve, _mock_record):
+        self.suite.context_cache = MagicMock()
+        self.suite.context_cache.get_or_create.return_value = "cachedContents/abc"
+        self.mock_client.generate_content.side_effect = RuntimeError("Cache content 123 is expired.")
+
+        results = self.suite.transcribe_audio_batch([{"id": "c0", "data": b"a"}])
+
+        self.assertEqual(results[0]["error"], "cap exceeded")
+        self.assertTrue(results[0]["limit_blocked"])
+        self.assertEqual(self.mock_client.generate_content.call_count, 1)
+
+    @patch("architects.helpers.api_utils.record_usage")
+    @patch("architects.helpers.api_utils.reserve_request", return_value=(True, ""))
+    def test_transcribe_audio_batch_reports_missing_chunk(self, _mock_reserve, _mock_record):
+        payload = {"results": [{"chunk_id": "c0", "content": "only one"}]}
+        self.mock_client.generate_content.return_value = {"text": json.dumps(payload)}
+
+        results = self.suite.transcribe_audio_batch([{"id": "c0", "data": b"a"}, {"id": "c1", "data": b"b"}])
+
+        self.assertEqual(results[0]["text"], "only one")
+        self.assertIn("error", results[1])
+        # The default model is reported on success and failure alike.
+        self.assertIsNotNone(results[0]["model"])
+        self.assertEqual(results[0]["model"], results[1]["model"])
+
+
+class TestGeminiChatSession(unittest.TestCase):
+    def _response(self, text):
+        return SimpleNamespace(text=text, usage_metadata=None)
+
+    def test_history_is_normalized_incrementally(self):
+        client = MagicMock()
+        client.models.generate_content.side_effect = [self._response("a1"), self._response("a2")]
+        session = GenAIChatSession(client, "models/gemini-2.5-flash", config={"system_instruction": "sys"})
+
+        with patch.object(session, "_normalize_history", wraps=session._normalize_history) as normalize:
+            session.send_message("q1")
+            session.send_message("q2")
+
+        self.assertEqual([len(call.args[0]) for call in normalize.call_args_list], [1, 2])
+        contents = client.models.generate_content.call_args.kwargs["contents"]
+        self.assertEqual(len(contents), 3)
+
+    def test_failed_send_does_not_resend_stale_turn(self):
+        client = MagicMock()
+        client.models.generate_content.side_effect = [RuntimeError("network"), self._response("a2")]
+        session = GenAIChatSession(client, "models/gemini-2.5-flash")
+
+        with self.assertRaises(RuntimeError):
+            session.send_message("first question")
+        session.send_message("second question")
+
+        contents = client.models.generate_content.call_args.kwargs["contents"]
+        self.assertEqual(len(contents), 1)
+        self.assertEqual(contents[-1].parts[0].text, "second question")
+
+        def dropped_stream():
+            yield SimpleNamespace(text="partial", usage_metadata=None)
+            raise ConnectionError("stream dropped")
+
+        client.models.generate_content_stream.side_effect = [
+            dropped_stream(), iter([SimpleNamespace(text="a3", usage_metadata=None)]),
+        ]
+        with self.assertRaises(ConnectionError):
+            session.send_message_stream("third question")
+        session.send_message_stream("fourth question")
+
+        contents = client.models.generate_content_stream.call_args.kwargs["contents"]
+        self.assertEqual(len(contents), 3)
+        self.assertEqual(contents[-1].parts[0].text, "fourth question")
+
+    def test_cached_content_replaces_system_instruction(self):
+        client = MagicMock()
+        client.models.generate_content.return_value = self._response("ok")
+        session = GenAIChatSession(
+            client, "models/gemini-2.5-flash",
+            config={"system_instruction": "sys"}, cached_content="cachedContents/t1",
+        )
+        session.send_message("hello")
+        config = client.models.generate_content.call_args.kwargs["config"]
+        self.assertEqual(config.cached_content, "cachedContents/t1")
+        self.assertIsNone(config.system_instruction)
+
+    def test_stream_forwards_chunks_and_records_history(self):
+        client = MagicMock()
+        usage = SimpleNamespace(prompt_token_count=5, candidates_token_count=3, total_token_count=8,
+                                cached_content_token_count=0)
+        client.models.generate_content_stream.return_value = iter([
+            SimpleNamespace(text="Hel", usage_metadata=None),
+            SimpleNamespace(text="lo", usage_metadata=usage),
+        ])
+        session = GenAIChatSession(client, "models/gemini-2.5-flash")
+        chunks = []
+
+        result = session.send_message_stream("hi", on_chunk=chunks.append)
+
+        self.assertEqual(chunks, ["Hel", "lo"])
+        self.assertEqual(result["text"], "Hello")
+        self.assertEqual(result["usage"]["total_tokens"], 8)
+        self.assertEqual(session.history[-1], {"role": "model", "parts": [{"text": "Hello"}]})
+
+    def test_compaction_keeps_pinned_and_recent_turns(self):
+        client = MagicMock()
+        client.models.generate_content.return_value = self._response("short summary")
+        history = [
+            {"role": "user", "parts": [{"text": "transcript"}]},
+            {"role": "model", "parts": [{"text": "ok"}]},
+        ]
+        for i in range(10):
+            role = "user" if i % 2 == 0 else "model"
+            history.append({"role": role, "parts": [{"text": f"turn{i} " + "x" * 50}]})
+        session = GenAIChatSession(
+            client, "models/gemini-2.5-flash", history=history,
+            pinned_turns=2, max_history_chars=200, keep_recent_turns=4,
+        )
+
+        self.assertTrue(session.needs_compaction())
+        session.compact_history()
+
+        self.assertEqual(session.history[0]["parts"][0]["text"], "transcript")
+        self.assertIn("short summary", session.history[2]["parts"][0]["text"])
+        self.assertEqual(session.history[-1]["parts"][0]["text"], history[-1]["parts"][0]["text"])
+        self.assertEqual(len(session.history), 2 + 2 + 4)
+
+    def test_compaction_truncates_when_summary_fails(self):
+        client = MagicMock()
+        client.models.generate_content.side_effect = RuntimeError("quota")
+        history = [{"role": "user" if i % 2 == 0 else "model", "parts": [{"text": "y" * 100}]} for i in range(8)]
+        session = GenAIChatSession(client, "models/gemini-2.5-flash", history=history,
+                                   max_history_chars=100, keep_recent_turns=2)
+        result = session.compact_history()
+        self.assertIn("error", result)
+        self.assertEqual(len(session.history), 2)
+
+
+class TestGeminiChatbot(unittest.TestCase):
+    def setUp(self):
+        self.client_patcher = patch("architects.helpers.gemini_chatbot.GenAIClient")
+        self.mock_client_cls = self.client_patcher.start()
+        self.mock_client = MagicMock()
+        self.mock_client_cls.return_value = self.mock_client
+        self.mock_client.create_cached_content.return_value = SimpleNamespace(name="cachedContents/t1")
+        self.mock_client.client.models.generate_content.return_value = SimpleNamespace(
+            text="answer", usage_metadata=None
+        )
+
+    def tearDown(self):
+        self.client_patcher.stop()
+
+    @patch("architects.helpers.gemini_chatbot.record_usage")
+    @patch("architects.helpers.gemini_chatbot.reserve_request", return_value=(True, ""))
+    def test_long_transcript_goes_into_cached_content(self, _reserve, _record):
+        bot = GeminiChatbot("test_key", model_name="gemini-2.5-flash")
+        self.assertTrue(bot.load_context("lecture " * 2000))
+
+        self.assertEqual(bot.cached_content_name, "cachedContents/t1")
+        self.assertEqual(bot.chat_session.history, [])
+        self.assertEqual(bot.send_message("hi")["text"], "answer")
+        config = self.mock_client.client.models.generate_content.call_args.kwargs["config"]
+        self.assertEqual(config.cached_content, "cachedContents/t1")
+
+        bot.load_context("new lecture " * 2000)
+        self.mock_client.delete_cached_content.assert_called_once_with("cachedContents/t1")
+
+    @patch("architects.helpers.gemini_chatbot.record_usage")
+    @patch("architects.helpers.gemini_chatbot.reserve_request", return_value=(True, ""))
+    def test_expired_cache_falls_back_to_inline_transcript(self, mock_reserve, _record):
+        bot = GeminiChatbot("test_key", model_name="gemini-2.5-flash")
+        bot.load_context("lecture " * 2000)
+        self.mock_client.client.models.generate_content.side_effect = [
+            RuntimeError("cached content not found"),
+            SimpleNamespace(text="answer", usage_metadata=None),
+        ]
+
+        self.assertEqual(bot.send_message("hi")["text"], "answer")
+        self.assertEqual(mock_reserve.call_count, 2)
+        self.assertIsNone(bot.cached_content_name)
+        history = bot.chat_session.history
+        self.assertIn("lecture", history[0]["parts"][0]["text"])
+        self.assertEqual([turn["role"] for turn in history], ["user", "model", "user", "model"])
+
+    @patch("architects.helpers.gemini_chatbot.record_usage")
+    @patch("architects.helpers.gemini_chatbot.reserve_request", return_value=(True, ""))
+    def test_other_errors_keep_the_cache_and_are_not_retried(self, mock_reserve, _record):
+        bot = GeminiChatbot("test_key", model_name="gemini-2.5-flash")
+        bot.load_context("lecture " * 2000)
+        self.mock_client.client.models.generate_content.side_effect = RuntimeError("429 RESOURCE_EXHAUSTED")
+
+        self.assertIn("429", bot.send_message("hi")["error"])
+        self.assertEqual(bot.cached_content_name, "cachedContents/t1")
+        self.assertEqual(self.mock_client.client.models.generate_content.call_count, 1)
+        self.assertEqual(mock_reserve.call_count, 1)
+
+    @patch("architects.helpers.gemini_chatbot.record_usage")
+    @patch("architects.helpers.gemini_chatbot.reserve_request", side_effect=[(True, ""), (False, "cap exceeded")])
+    def test_expired_cache_retry_needs_quota(self, _reserve, _record):
+        bot = GeminiChatbot("test_key", model_name="gemini-2.5-flash")
+        bot.load_context("lecture " * 2000)
+        self.mock_client.client.models.generate_content.side_effect = RuntimeError("Cache content 1 is expired.")
+
+        self.assertEqual(bot.send_message("hi"), {"error": "cap exceeded", "limit_blocked": True})
+        self.assertEqual(self.mock_client.client.models.generate_content.call_count, 1)
+
+    @patch("architects.helpers.gemini_chatbot.record_usage")
+    @patch("architects.helpers.gemini_chatbot.reserve_request", return_value=(True, ""))
+    def test_stream_reports_usage_once(self, _reserve, mock_record):
+        self.mock_client.client.models.generate_content_stream.return_value = iter([
+            SimpleNamespace(text="a", usage_metadata=None),
+            SimpleNamespace(text="b", usage_metadata=None),
+        ])
+        bot = GeminiChatbot("test_key", model_name="gemini-2.5-flash")
+        bot.load_context("short transcript")
+        chunks = []
+
+        response = bot.send_message_stream("hi", chunks.append)
+
+        self.assertEqual(response["text"], "ab")
+        self.assertEqual(chunks, ["a", "b"])
+        mock_record.assert_called_once()
+
+    @patch("architects.helpers.gemini_chatbot.record_usage")
+    @patch("architects.helpers.gemini_chatbot.reserve_request", return_value=(True, ""))
+    def test_uncacheable_long_transcript_uses_retrieval(self, _reserve, _record):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        self.mock_client.create_cached_content.side_effect = RuntimeError("caching disabled")
+        self.mock_client.embed_content.side_effect = lambda model_name, contents: [
+            [1.0, 0.0] if "drums" in t else [0.0, 1.0] for t in contents
+        ]
+        bot = GeminiChatbot("test_key", model_name="gemini-2.5-flash")
+        bot.embedding_cache = EmbeddingCache(Path(tmp) / "emb.sqlite3")
+        transcript = "\n".join(["talk about guitars " * 5] * 150 + ["the drums solo was loud"] + ["more guitars " * 5] * 50)
+
+        self.assertTrue(bot.load_context(transcript))
+        self.assertIsNotNone(bot.vector_index)
+        self.assertEqual(bot.chat_session.history, [])
+
+        bot.send_message("what about the drums?")
+        sent = bot.chat_session.history[0]["parts"][0]["text"]
+        self.assertIn("drums solo", sent)
+        self.assertLess(len(sent), len(transcript) // 4)
+        bot.embedding_cache.close()
+
+    def test_short_transcript_is_seeded_into_history(self):
+        bot = GeminiChatbot("test_key", model_name="gemini-2.5-flash")
+        bot.load_context("short transcript")
+        self.assertIsNone(bot.cached_content_name)
+        self.assertEqual(len(bot.chat_session.history), 2)
+        self.assertEqual(bot.chat_session.pinned_turns, 2)
+
+
+class TestEmbeddingIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = EmbeddingCache(Path(self.tmp) / "emb.sqlite3")
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmp)
+
+    def test_cached_embeddings_only_requests_misses(self):
+        client = MagicMock()
+        client.embed_content.side_effect = lambda model_name, contents: [[float(len(t)), 1.0] for t in contents]
+
+        first = cached_embeddings(client, self.cache, "models/embedding-001", ["a", "bb", "a"])
+        second = cached_embeddings(client, self.cache, "models/embedding-001", ["bb", "ccc"])
+
+        self.assertEqual(first, [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]])
+        self.assertEqual(second, [[2.0, 1.0], [3.0, 1.0]])
+        self.assertEqual(client.embed_content.call_args_list[0].kwargs["contents"], ["a", "bb"])
+        self.assertEqual(client.embed_content.call_args_list[1].kwargs["contents"], ["ccc"])
+
+    def test_cached_embeddings_are_requested_in_batches(self):
+        client = MagicMock()
+        client.embed_content.side_effect = lambda model_name, contents: [[1.0] for _ in contents]
+        reserved = []
+        texts = [f"segment {i}" for i in range(250)]
+
+        vectors = cached_embeddings(client, self.cache, "models/embedding-001", texts, reserve=lambda: reserved.append(1))
+
+        self.assertEqual(len(vectors), 250)
+        self.assertEqual([len(c.kwargs["contents"]) for c in client.embed_content.call_args_list], [100, 100, 50])
+        self.assertEqual(len(reserved), 3)
+
+    def test_refused_batch_keeps_earlier_batches_cached(self):
+        client = MagicMock()
+        client.embed_content.side_effect = lambda model_name, contents: [[1.0] for _ in contents]
+        allowed = iter([True, False])
+
+        def reserve():
+            if not next(allowed):
+                raise RuntimeError("limit")
+
+        texts = [f"segment {i}" for i in range(150)]
+        with self.assertRaises(RuntimeError):
+            cached_embeddings(client, self.cache, "models/embedding-001", texts, reserve=reserve)
+        self.assertEqual(len(self.cache.get_many("models/embedding-001", texts)), 100)
+
+    def test_index_returns_top_k_by_cosine(self):
+        index = TranscriptVectorIndex(Path(self.tmp) / "idx")
+        index.build(["north", "east", "north-east"], [[0, 10], [3, 0], [1, 1]])
+
+        hits = index.search([[0, 1], [1, 0]], k=2)
+
+        self.assertEqual([i for i, _ in hits[0]], [0, 2])
+        self.assertEqual([i for i, _ in hits[1]], [1, 2])
+        self.assertAlmostEqual(hits[0][0][1], 1.0, places=5)
+        self.assertIsInstance(index._matrix, np.memmap)
+
+    def test_split_transcript_covers_text(self):
+        text = "\n".join(f"line {i} " + "w" * 40 for i in range(60))
+        segments = split_transcript(text, max_chars=300, overlap=50)
+        self.assertGreater(len(segments), 5)
+        self.assertTrue(all(len(seg) <= 300 for seg in segments))
+        self.assertIn("line 59", segments[-1])
+
+
+class TestLibraryIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        (self.tmp / "b_song.mp3").write_bytes(b"b")
+        (self.tmp / "notes.txt").write_text("x")
+        (self.tmp / "album").mkdir()
+        (self.tmp / "album" / "a_song.flac").write_bytes(b"a")
+        self.analyzed = []
+
+    def _index(self, **kwargs):
+        def analyzer(path):
+            self.analyzed.append(Path(path).name)
+            return {"bpm": 120, "key_camelot": "8B"}
+
+        index = LibraryIndex(
+            self.tmp, watch=False, analyzer=analyzer,
+            cache_lookup=lambda path: {"bpm": 99} if path.endswith("b_song.mp3") else None, **kwargs
+        )
+        self.addCleanup(index.stop)
+        return index.start()
+
+    def test_recursive_scan_and_queries(self):
+        index = self._index(auto_analyze=False)
+        self.assertTrue(index.wait_ready(5))
+        self.assertEqual([p.name for p in index.tracks()], ["a_song.flac", "b_song.mp3"])
+        self.assertEqual(index.filenames(), {"a_song.flac", "b_song.mp3"})
+        self.assertEqual(index.first_track().name, "a_song.flac")
+        self.assertEqual(index.find_by_name("a_song.flac").parent.name, "album")
+
+    def test_incremental_updates_and_analysis_queue(self):
+        changes = []
+        index = self._index(on_changed=lambda: changes.append(1))
+        index.wait_ready(5)
+
+        new_track = self.tmp / "album" / "c_song.wav"
+        new_track.write_bytes(b"c")
+        index.add_path(new_track)
+        index.remove_path(self.tmp / "album" / "a_song.flac")
+
+        self.assertEqual(index.filenames(), {"b_song.mp3", "c_song.wav"})
+        self.assertGreaterEqual(len(changes), 3)
+        deadline = time.monotonic() + 5
+        while "c_song.wav" not in self.analyzed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIn("c_song.wav", self.analyzed)
+        self.assertNotIn("b_song.mp3", self.analyzed)
+        self.assertEqual(index.tags(self.tmp / "b_song.mp3"), {"bpm": 99})
+
+    def test_queries_do_not_block_on_a_slow_scan(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        scan = LibraryIndex._scan
+
+        def slow_scan(index, directory):
+            release.wait(10)
+            return scan(index, directory)
+
+        with patch.object(LibraryIndex, "_scan", slow_scan):
+            index = self._index(auto_analyze=False)
+            started = time.monotonic()
+            self.assertEqual(index.tracks(timeout=0.05), [])
+            self.assertFalse(index.has_tracks(timeout=0.05))
+            self.assertIsNone(index.find_by_name("a_song.flac", timeout=0.05))
+            self.assertLess(time.monotonic() - started, 2.0)
+
+            release.set()
+            self.assertEqual(index.filenames(timeout=5), {"a_song.flac", "b_song.mp3"})
+
+    def test_revision_changes_with_membership(self):
+        index = self._index(auto_analyze=False)
+        index.wait_ready(5)
+        before = index.revision
+        index.remove_path(self.tmp / "b_song.mp3")
+        self.assertGreater(index.revision, before)
+
+
+class TestTrackRecommender(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        tags = {
+            "now.mp3": {"bpm": 120, "key_camelot": "8A"},
+            "adjacent.mp3": {"bpm": 122, "key_camelot": "9A"},
+            "relative.mp3": {"bpm": 121, "key_camelot": "8B"},
+            "double_time.mp3": {"bpm": 240, "key_camelot": "8A"},
+            "clash.mp3": {"bpm": 90, "key_camelot": "2B"},
+            "calm.mp3": {"bpm": 120, "key_camelot": "8A"},
+        }
+        self.store = FeatureStore()
+        self.store.upsert_many(tags.items())
+        self.buckets = {
+            "positive": ["now.mp3", "adjacent.mp3", "relative.mp3", "double_time.mp3", "clash.mp3"],
+            "calm": ["calm.mp3", "missing.mp3"],
+        }
+
+    def test_next_track_prefers_harmonic_neighbours_and_penalises_repeats(self):
+        rec = NextTrackRecommender(self.store, self.buckets, k=4).build()
+        first = rec.next_track("positive", after="now.mp3")
+        self.assertIn(first, {"double_time.mp3", "relative.mp3", "adjacent.mp3"})
+        nearest = [rec.paths[i] for i in rec.neighbors[0, rec.paths.index("now.mp3")][:3]]
+        self.assertNotIn("clash.mp3", nearest)
+
+        picks = [first]
+        for _ in range(2):
+            rec.note_played(picks[-1])
+            picks.append(rec.next_track("positive", after="now.mp3"))
+        self.assertEqual(len(set(picks)), 3)
+
+        self.assertEqual(rec.next_track("calm", after="now.mp3"), "calm.mp3")
+        self.assertIsNone(rec.next_track("calm", after="unknown.mp3"))
+        self.assertIsNone(rec.next_track("calm", after="now.mp3", exclude=["calm.mp3"]))
+
+    def test_graph_round_trips_and_rebuilds_when_inputs_change(self):
+        built = NextTrackRecommender.load_or_build(self.store, self.buckets, self.tmp)
+        loaded = NextTrackRecommender(self.store, self.buckets)
+        self.assertTrue(loaded.load(self.tmp))
+        np.testing.assert_array_equal(loaded.neighbors, built.neighbors)
+
+        self.store.upsert("clash.mp3", {"bpm": 120, "key_camelot": "8A"})
+        stale = NextTrackRecommender(self.store, self.buckets)
+        self.assertFalse(stale.load(self.tmp))
+
+
+class _FakeDevice:
+    """Stands in for miniaudio.PlaybackDevice; tests pull blocks from the render generator."""
+
+    backend = "fake"
+
+    def __init__(self, opened, **options):
+        opened.append(self)
+        self.options = options
+        self.renderer = None
+        self.closed = False
+
+    def start(self, renderer):
+        self.renderer = renderer
+
+    def close(self):
+        self.closed = True
+
+
+class TestPlaybackEngine(unittest.TestCase):
+    def setUp(self):
+        import soundfile as sf
+
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.opened = []
+        # Rendered on the (test-driven) callback so every pull sees the current source at once.
+        self.engine = PlaybackEngine(
+            device_factory=lambda sr, ch, **options: _FakeDevice(self.opened, **options), render_ahead_ms=0
+        )
+        self.tracks = {}
+        for name, level in (("a", 1000), ("b", -2000)):
+            path = self.tmp / f"{name}.wav"
+            sf.write(str(path), np.full((44100, 2), level, dtype=np.int16), 44100, subtype="PCM_16")
+            self.tracks[name] = str(path)
+
+    def _pull(self, frames=1024):
+        return np.frombuffer(self.opened[-1].renderer.send(frames), dtype=np.int16)
+
+    def test_track_changes_and_seeks_reuse_one_device(self):
+        first = MiniaudioPlayer(self.tracks["a"], engine=self.engine)
+        self.assertTrue(first.start())
+        self.assertTrue(np.all(self._pull() == 1000))
+
+        self.assertTrue(first.seek(0.5))
+        self.assertTrue(np.all(self._pull() == 1000))
+        self.assertAlmostEqual(first.position_seconds(), 0.5 + 1024 / 44100, places=3)
+
+        second = MiniaudioPlayer(self.tracks["b"], engine=self.engine)
+        self.assertTrue(second.start())
+        first.stop()  # the previous player no longer owns the engine
+        self.assertTrue(np.all(self._pull() == -2000))
+        self.assertEqual(len(self.opened), 1)
+
+        second.pause()
+        self.assertTrue(np.all(self._pull() == 0))
+        second.resume()
+        self.assertTrue(np.all(self._pull() == -2000))
+
+        self.engine.close()
+        self.assertTrue(self.opened[0].closed)
+
+    def test_source_end_renders_silence(self):
+        player = MiniaudioPlayer(self.tracks["a"], engine=self.engine)
+        player.start()
+        for _ in range(44100 // 1024 + 2):
+            block = self._pull()
+        self.assertTrue(np.all(block == 0))
+        self.assertFalse(player.is_playing())
+
+    def test_position_trails_rendered_frames_by_device_latency(self):
+        import soundfile as sf
+
+        notified = []
+        player = MiniaudioPlayer(self.tracks["a"], engine=self.engine)
+        player.add_position_listener(lambda: notified.append(player.position_seconds()))
+        player.start()
+        self.engine.latency_frames = 4096
+        self._pull()
+        self.assertEqual(player.position_seconds(), 0.0)  # first block is still in the device buffer
+        for _ in range(4):
+            self._pull()
+        self.assertAlmostEqual(player.position_seconds(), 1024 / 44100, delta=0.005)
+        self.assertGreaterEqual(len(notified), 2)  # on start and after ~0.1 s of rendered audio
+
+        # 1 ms steps at 48 kHz: seeking must land on the engine-rate frame, not the native-rate ratio.
+        path = self.tmp / "steps48k.wav"
+        steps = (np.arange(48000) // 48).astype(np.int16)
+        sf.write(str(path), np.stack([steps, steps], axis=1), 48000, subtype="PCM_16")
+        stepped = MiniaudioPlayer(str(path), engine=self.engine)
+        stepped.start()
+        self.assertTrue(stepped.seek(0.5))
+        self.assertEqual(stepped.position_seconds(), 0.5)
+        self.assertAlmostEqual(float(np.median(self._pull()[:40])), 500, delta=2)
+
+    def test_spectrum_tap_publishes_levels_of_rendered_audio(self):
+        import soundfile as sf
+
+        path = self.tmp / "tone.wav"
+        tone = (np.sin(2 * np.pi * 1000 * np.arange(44100) / 44100) * 16000).astype(np.int16)
+        sf.write(str(path), np.stack([tone, tone], axis=1), 44100, subtype="PCM_16")
+        tap = self.engine.spectrum
+        levels = tap.levels
+        tap.active = True  # feed without the background thread; compute() runs inline below
+        player = MiniaudioPlayer(str(path), engine=self.engine)
+        player.start()
+        self._pull(2048)
+        tap.compute()
+        peak_hz = np.geomspace(40, 16000, levels.size)[int(np.argmax(levels))]
+        self.assertTrue(600 < peak_hz < 1600, peak_hz)
+        self.assertGreater(levels.max(), 0.7)
+        self.assertIs(tap.levels, levels)  # written in place for readers holding the array
+        tap.stop()
+        self.assertEqual(float(levels.max()), 0.0)
+
+    def test_crossfade_mixes_into_next_track_and_promotes_it(self):
+        first = MiniaudioPlayer(self.tracks["a"], engine=self.engine)
+        first.start()
+        self._pull()
+        second = MiniaudioPlayer(self.tracks["b"], engine=self.engine, crossfade_seconds=0.1)
+        self.assertTrue(second._decode_ahead.wait(5))
+        self.assertTrue(second.start())
+        first.stop()  # the outgoing track keeps playing until the fade is done
+
+        faded = np.concatenate([self._pull() for _ in range(5)])  # 5120 frames > 4410 fade frames
+        left = faded[0::2]
+        self.assertTrue(np.all(np.diff(left.astype(np.int32)) <= 0))  # 1000 -> -2000, no dip to silence
+        self.assertGreater(left[0], 900)
+        self.assertTrue(np.all(left[4410:] == -2000))
+        self.assertIs(self.engine.owner, second)
+
+    def test_crossfade_stream_is_opened_on_the_decode_ahead_worker(self):
+        first = MiniaudioPlayer(self.tracks["a"], engine=self.engine)
+        first.start()
+        self._pull()
+        opened_on = []
+        open_stream = MiniaudioPlayer._open_stream
+
+        def recording(player, *args):
+            opened_on.append(threading.current_thread().name)
+            return open_stream(player, *args)
+
+        with patch.object(MiniaudioPlayer, "_open_stream", recording):
+            second = MiniaudioPlayer(self.tracks["b"], engine=self.engine, crossfade_seconds=0.1)
+            second._decode_ahead.wait(5)
+            second.start()
+            for _ in range(5):
+                self._pull()
+
+        self.assertEqual(opened_on, ["DecodeAhead"])
+        self.assertIs(self.engine.owner, second)
+        self.assertTrue(np.all(self._pull() == -2000))
+
+    def test_crossfade_starts_on_the_outgoing_beat(self):
+        first = MiniaudioPlayer(self.tracks["a"], engine=self.engine)
+        first.start()
+        self._pull()
+        # 120 BPM: one beat is 22050 frames and the 0.4 s fade rounds up to one beat.
+        second = MiniaudioPlayer(self.tracks["b"], engine=self.engine, crossfade_seconds=0.4, transition_bpm=120)
+        self.assertEqual((second._fade_frames, second._beat_frames), (22050, 22050))
+        second._decode_ahead.wait(5)
+        second.start()
+
+        before_beat = [self._pull() for _ in range(20)] + [self._pull(22050 - 21 * 1024)]
+        self.assertTrue(all(np.all(block == 1000) for block in before_beat))
+        self.assertLess(self._pull()[-2], 900)  # fading from the first frame after the beat
+
+    def test_outgoing_track_plays_until_next_is_ready(self):
+        first = MiniaudioPlayer(self.tracks["a"], engine=self.engine)
+        first.start()
+        ready = []
+
+        def incoming():
+            frames = yield b""
+            while True:
+                frames = yield np.full(frames * 2, -2000, dtype=np.int16)
+
+        source = incoming()
+        next(source)
+        self.engine.transition("next", source, fade_frames=1, ready=lambda: bool(ready))
+
+        self.assertTrue(np.all(self._pull() == 1000))
+        ready.append(True)
+        self.assertTrue(np.all(self._pull() == -2000))
+        self.assertEqual(self.engine.owner, "next")
+
+    @staticmethod
+    def _constant(level):
+        frames = yield b""
+        while True:
+            frames = yield np.full(frames * 2, level, dtype=np.int16)
+
+    def test_control_calls_during_a_render_are_kept(self):
+        replacement = self._constant(-2000)
+        next(replacement)
+
+        def ending():
+            yield b""
+            # Another thread seeks while this block is being rendered, then the old source ends.
+            self.engine.replace_source("owner", replacement, start_frame=5000)
+
+        source = ending()
+        next(source)
+        self.engine.play("owner", source)
+        self.assertTrue(np.all(self._pull() == 0))
+        self.assertEqual(self.engine._cursor.frame, 5000)  # the stale block did not move the seek
+        self.assertTrue(np.all(self._pull() == -2000))
+        self.assertEqual(self.engine._cursor.frame, 5000 + 1024)
+
+        # Same while a fade is pending: the new source must not be dropped with the ended one.
+        source = ending()
+        next(source)
+        self.engine.play("owner", source)
+        self.engine.transition("next", self._constant(500), fade_frames=1, ready=lambda: False)
+        replacement = self._constant(-2000)
+        next(replacement)
+        self._pull()
+        self.assertTrue(np.all(self._pull() == -2000))
+
+    def test_latency_profile_switch_reopens_device_mid_track(self):
+        player = MiniaudioPlayer(self.tracks["a"], engine=self.engine)
+        player.start()
+        self._pull()
+        self.assertEqual(self.opened[0].options, {"buffersize_msec": 40, "periods": 4})
+
+        self.assertTrue(self.engine.set_latency_profile("low_latency"))
+        self.assertEqual(len(self.opened), 2)
+        self.assertTrue(self.opened[0].closed)
+        self.assertEqual(self.opened[1].options, {"buffersize_msec": 10, "periods": 3})
+        self.assertTrue(np.all(self._pull() == 1000))
+        self.assertTrue(player.is_playing())
+        self.assertAlmostEqual(player.position_seconds(), 2048 / 44100, places=3)
+        self.assertFalse(self.engine.set_latency_profile("nonexistent"))
+        self.assertEqual(self.engine.stats()["device_switches"], 1)
+
+    def test_device_is_closed_outside_the_engine_lock(self):
+        player = MiniaudioPlayer(self.tracks["a"], engine=self.engine)
+        player.start()
+        self._pull()
+        old = self.opened[0]
+        callback_got_lock = []
+
+        def close():
+            # miniaudio waits for a running callback here, which may need the lock to promote a fade.
+            def callback():
+                got = self.engine._lock.acquire(timeout=1.0)
+                callback_got_lock.append(got)
+                if got:
+                    self.engine._lock.release()
+
+            thread = threading.Thread(target=callback)
+            thread.start()
+            thread.join()
+            old.closed = True
+
+        old.close = close
+        self.assertTrue(self.engine.set_latency_profile("low_latency"))
+        self.assertEqual(callback_got_lock, [True])
+        self.assertTrue(np.all(self._pull() == 1000))
+
+    @staticmethod
+    def _playback_listing(*devices):
+        """Shaped like miniaudio.Devices.get_playbacks(): name/type/id/formats, ids freshly allocated."""
+        listing = []
+        for name, raw_id in devices:
+            device_id = miniaudio.ffi.new("ma_device_id *")
+            miniaudio.ffi.memmove(device_id, raw_id, len(raw_id))
+            listing.append({
+                "name": name,
+                "type": miniaudio.DeviceType.PLAYBACK,
+                "id": device_id,
+                "formats": [{"format": "Unknown", "samplerate": 0, "channels": 0}],
+            })
+        return listing
+
+    def test_output_change_moves_playback_to_new_device(self):
+        devices = [("Speakers", b"alsa_output.pci.analog-stereo")]
+        sink = ["alsa_output.pci.analog-stereo"]
+        manager = OutputDeviceManager(
+            self.engine, list_playbacks=lambda: self._playback_listing(*devices), default_sink=lambda: sink[0]
+        )
+        self.assertFalse(manager.check())  # no device open yet
+
+        player = MiniaudioPlayer(self.tracks["a"], engine=self.engine)
+        player.start()
+        self.assertFalse(manager.check())  # baseline
+        self.assertFalse(manager.check())  # same devices behind new id handles
+        devices.append(("Headphones", b"bluez_output.00_11_22.a2dp"))
+        self.assertTrue(manager.check())
+        self.assertEqual(len(self.opened), 2)
+        self.assertTrue(np.all(self._pull() == 1000))
+        self.assertFalse(manager.check())
+
+        sink[0] = "bluez_output.00_11_22.a2dp"  # default switched without a device change
+        self.assertTrue(manager.check())
+        self.assertEqual(len(self.opened), 3)
+
+    def test_callback_gaps_count_underruns(self):
+        player = MiniaudioPlayer(self.tracks["a"], engine=self.engine)
+        player.start()
+        self._pull()
+        time.sleep(0.05)  # longer than a block, shorter than the 160 ms buffer
+        self._pull()
+        self.assertEqual(self.engine.underruns, 0)
+        self.assertGreaterEqual(self.engine.late_callbacks, 1)
+        time.sleep(0.2)
+        self._pull()
+        self.assertEqual(self.engine.stats()["underruns"], 1)
+
+
+class TestRenderAhead(unittest.TestCase):
+    def setUp(self):
+        import soundfile as sf
+
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.opened = []
+        self.engine = PlaybackEngine(device_factory=lambda sr, ch, **options: _FakeDevice(self.opened, **options))
+        self.addCleanup(self.engine.close)
+        self.tracks = {}
+        for name, level in (("a", 1000), ("b", -2000)):
+            path = self.tmp / f"{name}.wav"
+            sf.write(str(path), np.full((44100 * 2, 2), level, dtype=np.int16), 44100, subtype="PCM_16")
+            self.tracks[name] = str(path)
+
+    def _pull(self, frames=1024):
+        return np.frombuffer(self.opened[-1].renderer.send(frames), dtype=np.int16).copy()
+
+    def _wait_buffered(self, frames):
+        deadline = time.monotonic() + 5.0
+        while self.engine.buffered_frames() < frames and time.monotonic() < deadline:
+            time.sleep(0.005)
+        self.assertGreaterEqual(self.engine.buffered_frames(), frames)
+
+    def test_callback_copies_blocks_rendered_ahead(self):
+        player = MiniaudioPlayer(self.tracks["a"], engine=self.engine)
+        self.assertTrue(player.start())
+        self._wait_buffered(44100 * 250 // 1000)
+        self.assertTrue(np.all(self._pull(1500) == 1000))  # not a multiple of the block size
+        self.assertTrue(np.all(self._pull(548) == 1000))
+        self.assertLess(player.position_seconds(), 0.1)  # rendered-ahead frames are not heard yet
+        self.assertEqual(self.engine.stats()["ring_underruns"], 0)
+
+        player.pause()
+        self.assertTrue(np.all(self._pull() == 0))
+        player.resume()
+        self.assertTrue(np.all(self._pull() == 1000))  # the buffered blocks survive a pause
+
+    def test_source_change_skips_blocks_of_the_old_source(self):
+        first = MiniaudioPlayer(self.tracks["a"], engine=self.engine)
+        first.start()
+        time.sleep(0.3)  # the ring is full of the first track
+        second = MiniaudioPlayer(self.tracks["b"], engine=self.engine)
+        second.start()
+        first.stop()
+        self._wait_buffered(44100 * 250 // 1000)  # stale blocks do not hold back the new source
+        self.assertTrue(np.all(self._pull() == -2000))  # no dropout at the switch
+        self.assertEqual(self.engine.ring_underruns, 0)
+
+    def test_seek_position_ignores_stale_buffered_blocks(self):
+        player = MiniaudioPlayer(self.tracks["a"], engine=self.engine)
+        player.start()
+        self._wait_buffered(44100 * 250 // 1000)
+        self.assertTrue(player.seek(1.0))
+        self._wait_buffered(44100 * 250 // 1000)
+        self._pull()
+        self.assertAlmostEqual(player.position_seconds(), 1.0, delta=0.05)
+
+    def test_starved_ring_counts_underruns(self):
+        gate = threading.Event()
+        self.addCleanup(gate.set)
+
+        def slow_source():
+            required = yield b""
+            for _ in range(2):
+                required = yield np.full(required * 2, 500, dtype=np.int16)
+            gate.wait(5.0)  # a decoder stalled on disk
+            while True:
+                required = yield np.full(required * 2, 500, dtype=np.int16)
+
+        source = slow_source()
+        next(source)
+        self.assertTrue(self.engine.play(self, source))
+        self._wait_buffered(2048)
+        self._pull(2048)
+        self._pull()
+        self.assertGreaterEqual(self.engine.stats()["ring_underruns"], 1)
+
+
+class TestDecodedPCMCache(unittest.TestCase):
+    def setUp(self):
+        import soundfile as sf
+
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.paths = []
+        for i in range(4):
+            path = self.tmp / f"t{i}.wav"
+            sf.write(str(path), np.full((44100, 2), 1000 * (i + 1), dtype=np.int16), 44100, subtype="PCM_16")
+            self.paths.append(str(path))
+
+    def test_evicts_least_recently_used_over_budget(self):
+        cache = DecodedPCMCache(44100, 2, budget_mb=1)
+        block = np.zeros(200 * 1024, dtype=np.int16)  # 400 KiB
+        for path in self.paths[:2]:
+            self.assertTrue(cache.put(path, block.copy()))
+        self.assertIsNotNone(cache.get(self.paths[0]))  # now most recently used
+        cache.put(self.paths[2], block.copy())
+        self.assertNotIn(self.paths[1], cache)
+        self.assertIn(self.paths[0], cache)
+        self.assertLessEqual(cache.used_bytes, cache.budget_bytes)
+        self.assertFalse(cache.put(self.paths[3], np.zeros(600 * 1024, dtype=np.int16)))  # larger than the budget
+
+    def test_cached_track_plays_and_seeks_without_decoding(self):
+        engine = PlaybackEngine(device_factory=lambda sr, ch, **options: _FakeDevice(opened, **options), render_ahead_ms=0)
+        opened = []
+        pcm = engine.pcm_cache.load(self.paths[1])
+        self.assertEqual(pcm.size, 44100 * 2)
+
+        with patch("architects.helpers.miniaudio_player.miniaudio.stream_file", side_effect=AssertionError("decoded")):
+            player = MiniaudioPlayer(self.paths[1], engine=engine)
+            self.assertTrue(player.start())
+            self.assertTrue(player.seek(0.5))
+            block = np.frombuffer(opened[-1].renderer.send(1024), dtype=np.int16)
+        self.assertTrue(np.all(block == 2000))
+        self.assertGreater(engine.pcm_cache.hits, 0)
+        engine.close()
+
+    def test_long_tracks_are_memory_mapped(self):
+        cache = DecodedPCMCache(44100, 2, budget_mb=16, temp_dir=str(self.tmp))
+        with patch("architects.helpers.pcm_cache.MMAP_THRESHOLD_BYTES", 0):
+            pcm = cache.load(self.paths[0])
+        self.assertIsInstance(pcm, np.memmap)
+        self.assertTrue(np.all(pcm == 1000))
+        self.assertEqual(len(list(self.tmp.glob("dj_blue_pcm_*"))), 1)
+        del pcm
+        cache.clear()
+        self.assertEqual(list(self.tmp.glob("dj_blue_pcm_*")), [])
+
+
+class TestGainStage(unittest.TestCase):
+    def test_volume_change_ramps_per_sample_in_reused_buffers(self):
+        stage = GainStage(nchannels=2, sample_rate=44100, frames_per_block=1024, ramp_seconds=1024 / 44100)
+        block = np.full(2048, 10000, dtype=np.int16)
+        self.assertIs(stage.process(block), block)  # unity gain is a pass-through
+
+        stage.set_gain(0.5)
+        ramped = stage.process(block)
+        left = ramped[0::2].astype(np.int32)
+        self.assertTrue(np.array_equal(ramped[0::2], ramped[1::2]))
+        self.assertTrue(np.all(np.diff(left) <= 0))
+        self.assertEqual((left[0], left[-1]), (9995, 5000))
+
+        steady = stage.process(block)
+        self.assertTrue(np.all(steady == 5000))
+        self.assertTrue(np.shares_memory(steady, ramped))  # same scratch buffer, no new allocation
+
+    def test_gain_without_ramp_applies_immediately(self):
+        stage = GainStage(nchannels=2, sample_rate=44100)
+        stage.set_gain(0.25, ramp=False)
+        self.assertTrue(np.all(stage.process(np.full(64, -4000, dtype=np.int16)) == -1000))
+
+    def test_loudness_gain_targets_lufs_with_capped_boost(self):
+        self.assertAlmostEqual(loudness_gain(-8.0, target_lufs=-14.0), 10 ** (-6 / 20))
+        self.assertAlmostEqual(loudness_gain(-30.0, target_lufs=-14.0), 10 ** (6 / 20))  # capped at +6 dB
+        self.assertEqual(loudness_gain(None), 1.0)
+        self.assertEqual(loudness_gain(float("-inf")), 1.0)
+
+    def test_boosted_quiet_track_with_full_scale_peaks_is_limited_not_clipped(self):
+        stage = GainStage(nchannels=2, sample_rate=44100)
+        stage.set_gain(loudness_gain(-30.0, target_lufs=-14.0), ramp=False)  # +6 dB boost
+        block = np.full(2048, 1000, dtype=np.int16)
+        block[100:110] = 32767  # a full-scale transient in an otherwise quiet master
+        block[200:210] = -32768
+        block[300:310] = 20000
+
+        out = stage.process(block).astype(np.int32)
+
+        self.assertTrue(np.all(out[:100] == round(1000 * 10 ** (6 / 20))))  # below the knee: plain gain
+        self.assertLessEqual(int(np.abs(out).max()), 32767)
+        self.assertTrue(out[100] > out[300] > 26214)  # peaks keep their order instead of clipping flat
+        self.assertEqual(out[200], -out[100])
+
+    def test_player_applies_track_loudness_in_its_gain_stage(self):
+        import soundfile as sf
+
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp)
+        path = tmp / "loud.wav"
+        sf.write(str(path), np.full((44100, 2), 10000, dtype=np.int16), 44100, subtype="PCM_16")
+        opened = []
+        engine = PlaybackEngine(device_factory=lambda sr, ch, **options: _FakeDevice(opened, **options), render_ahead_ms=0)
+        self.addCleanup(engine.close)
+
+        player = MiniaudioPlayer(str(path), engine=engine, loudness_lufs=-8.0, target_lufs=-14.0)
+        player.start()
+        block = np.frombuffer(opened[-1].renderer.send(1024), dtype=np.int16)
+        self.assertTrue(np.all(block == 5012))
+        player.set_volume(0.5)
+        for _ in range(2):  # past the 20 ms ramp
+            block = np.frombuffer(opened[-1].renderer.send(1024), dtype=np.int16)
+        self.assertTrue(np.all(block == 2506))
+
 
 class TestTranscriptionManagerGuards(unittest.TestCase):
     class _StartFailRecorder:
@@ -146,6 +1222,58 @@ class TestTranscriptionManagerGuards(unittest.TestCase):
         self.assertEqual(recorder.stop_calls, 1)
         self.assertEqual(recorder.close_calls, 1)
 
+    def test_backlog_is_packed_into_one_batch(self):
+        class _BacklogRecorder:
+            def __init__(self, chunks):
+                self._chunks = list(chunks)
+
+            def pending_chunks(self):
+                return len(self._chunks)
+
+            def pop_combined_stereo(self):
+                return self._chunks.pop(0) if self._chunks else None
+
+        manager = TranscriptionManager(api_key="test_key", chunk_seconds=1, max_batch_chunks=3)
+        manager._recorder = _BacklogRecorder([b"1", b"2", b"3", b"4", b"5"])
+
+        self.assertEqual(manager._next_batch(), [b"1", b"2", b"3"])
+        self.assertEqual(manager._next_batch(), [b"4", b"5"])
+        self.assertEqual(manager._next_batch(), [])
+
+    def test_live_mood_is_streamed_from_mixer_blocks(self):
+        class _StreamingRecorder:
+            def __init__(self):
+                self.listeners = []
+                self.mic = MagicMock(rate=48000, sampwidth=2)
+
+            def add_block_listener(self, listener):
+                self.listeners.append(listener)
+
+            def start(self):
+                return None
+
+            def pop_combined_stereo(self):
+                return None
+
+        recorder = _StreamingRecorder()
+        estimates = []
+        with patch("architects.helpers.transcription_manager.os_info", return_value={"system": "Windows"}):
+            with patch("architects.helpers.transcription_manager.AudioController", return_value=recorder):
+                manager = TranscriptionManager(api_key="test_key", chunk_seconds=1)
+                manager.set_mood_callback(estimates.append)
+                manager.start_recording()
+        self.addCleanup(setattr, manager, "_is_recording", False)
+
+        self.assertEqual(len(recorder.listeners), 1)
+        block = np.zeros((960, 2), dtype=np.int16)
+        for _ in range(250):  # 5 s of 20 ms blocks
+            recorder.listeners[0](block)
+
+        self.assertEqual(len(estimates), 1)
+        self.assertEqual(manager.latest_mood()["bpm"], 0)
+        _, tags = manager._prepare_chunk(block.tobytes())
+        self.assertIn("[Audio Analysis: 0 BPM", tags)
+
     def test_stop_recording_swallows_recorder_errors(self):
         manager = TranscriptionManager(api_key="test_key", chunk_seconds=1)
         manager._recorder = self._StopCloseFailRecorder()
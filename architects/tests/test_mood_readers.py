@@ -0,0 +1,436 @@
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import soundfile as sf
+
+from mood_readers import librosa_cli
+from mood_readers import audio_decode
+from mood_readers.analysis_cache import AnalysisCache
+from mood_readers.feature_store import FeatureStore
+from mood_readers.live_mood_estimator import LiveMoodEstimator
+from mood_readers.loudness import integrated_loudness
+from mood_readers import playlist_tagger
+from mood_readers import waveform_overview
+
+SR = 22050
+
+
+def _write_click_track(path: Path, bpm: float = 120.0, seconds: float = 6.0) -> Path:
+    """Writes a mono click track (short decaying 1 kHz bursts on every beat)."""
+    y = np.zeros(int(SR * seconds), dtype=np.float32)
+    click = np.sin(2 * np.pi * 1000 * np.arange(int(0.03 * SR)) / SR) * np.exp(-np.linspace(0, 8, int(0.03 * SR)))
+    step = int(SR * 60.0 / bpm)
+    for start in range(0, len(y) - len(click), step):
+        y[start:start + len(click)] += click.astype(np.float32)
+    sf.write(str(path), y, SR)
+    return path
+
+
+class LibrosaCliParallelTests(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.root = Path(self.tempdir.name)
+        self.tracks = [
+            str(_write_click_track(self.root / f"track_{i}.wav", bpm=bpm))
+            for i, bpm in enumerate((100.0, 120.0, 140.0))
+        ]
+
+    def test_parallel_results_match_sequential_and_keep_index(self):
+        paths = self.tracks + [str(self.root / "missing.wav")]
+
+        sequential = {i: r for i, _, r in librosa_cli.iter_analysis_results(paths, jobs=1)}
+        parallel = {i: r for i, _, r in librosa_cli.iter_analysis_results(paths, jobs=2, chunk_size=1)}
+
+        self.assertEqual(sorted(parallel), [0, 1, 2, 3])
+        self.assertIn("error", parallel[3])
+        for i in range(3):
+            self.assertEqual(parallel[i]["bpm"], sequential[i]["bpm"])
+            self.assertEqual(parallel[i]["key_camelot"], sequential[i]["key_camelot"])
+
+    def test_cli_streams_csv_rows_with_index(self):
+        output = self.root / "out" / "results.csv"
+        with redirect_stdout(io.StringIO()):
+            code = librosa_cli.main(["--jobs", "1", "--no-cache", "-o", str(output)] + self.tracks)
+
+        self.assertEqual(code, 0)
+        with output.open(encoding="utf-8") as handle:
+            rows = list(csv.DictReader(handle))
+        self.assertEqual(sorted(int(r["index"]) for r in rows), [0, 1, 2])
+        self.assertTrue(all(r["bpm"] for r in rows))
+
+        with output.with_suffix(".json").open(encoding="utf-8") as handle:
+            saved = json.load(handle)
+        self.assertEqual([Path(r["file_path"]).name for r in saved], ["track_0.wav", "track_1.wav", "track_2.wav"])
+
+    def test_cli_updates_feature_store(self):
+        store_dir = self.root / "store"
+        with redirect_stdout(io.StringIO()):
+            code = librosa_cli.main(["--no-cache", "--store", str(store_dir)] + self.tracks)
+
+        self.assertEqual(code, 0)
+        store = FeatureStore.load(store_dir)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.analyzer_version, librosa_cli.ANALYZER_VERSION)
+        self.assertEqual(sorted(store.paths()), sorted(os.path.abspath(t) for t in self.tracks))
+
+
+class AnalyzeSignalTests(unittest.TestCase):
+    def test_key_templates_pick_every_triad(self):
+        for root in range(12):
+            for is_major, third in ((True, 4), (False, 3)):
+                chroma = np.full(12, 0.05)
+                chroma[[root, (root + third) % 12, (root + 7) % 12]] = (1.0, 0.8, 0.9)
+                key, major = librosa_cli.estimate_key(chroma)
+                self.assertEqual(key, librosa_cli.NOTES[root] + ("maj" if is_major else "min"))
+                self.assertEqual(major, is_major)
+
+        self.assertEqual(librosa_cli.estimate_key(np.zeros(12)), ("Unknown", False))
+
+    def test_single_pass_features(self):
+        t = np.arange(int(SR * 4.0)) / SR
+        # A major chord with the root doubled in the bass (A2, A3, C#4, E4) plus a 120 BPM click.
+        partials = ((110.0, 1.0), (220.0, 0.6), (277.18, 0.4), (329.63, 0.5))
+        y = sum(a * np.sin(2 * np.pi * f * t) for f, a in partials).astype(np.float32) * 0.2
+        y[::SR // 2] += 0.5
+        timings = {}
+        result = librosa_cli._analyze_signal(y, SR, timings=timings)
+
+        self.assertEqual(set(timings), {"stft", "beat", "chroma", "key", "timbre", "loudness"})
+        self.assertEqual(result["key_technical"], "Amaj")
+        self.assertEqual(result["key_camelot"], "11B")
+        self.assertEqual(len(result["chroma"]), 12)
+        self.assertGreater(result["spectral_centroid"], 0)
+        self.assertGreater(result["rms_energy"], 0)
+        self.assertLess(result["loudness_db"], 0)
+        self.assertLess(result["loudness_lufs"], 0)
+
+    def test_integrated_loudness_matches_bs1770_reference(self):
+        t = np.arange(SR * 5) / SR
+        sine = np.sin(2 * np.pi * 1000 * t)
+        # A full-scale 1 kHz sine on one channel reads -3.01 LUFS; half amplitude on two reads -6.02.
+        self.assertAlmostEqual(integrated_loudness(sine, SR, channels=1), -3.01, delta=0.1)
+        self.assertAlmostEqual(integrated_loudness(0.5 * sine, SR), -6.02, delta=0.1)
+        # Silence between two loud passages is gated out.
+        gapped = np.concatenate((0.5 * sine, np.zeros(SR * 5), 0.5 * sine))
+        self.assertAlmostEqual(integrated_loudness(gapped, SR), -6.02, delta=0.1)
+        self.assertEqual(integrated_loudness(np.zeros(SR), SR), float("-inf"))
+
+
+class AudioDecodeTests(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.root = Path(self.tempdir.name)
+        # 60 s stereo 44.1 kHz ramp, so each sample encodes its own position.
+        native_sr = 44100
+        ramp = np.linspace(-0.5, 0.5, native_sr * 60, dtype=np.float32)
+        self.stereo = np.stack([ramp, ramp], axis=1)
+        self.paths = {}
+        for ext in ("wav", "flac"):
+            self.paths[ext] = str(self.root / f"ramp.{ext}")
+            sf.write(self.paths[ext], self.stereo, native_sr)
+
+    def test_duration_from_header(self):
+        for path in self.paths.values():
+            self.assertAlmostEqual(audio_decode.probe_duration(path), 60.0, places=3)
+        self.assertIsNone(audio_decode.probe_duration(str(self.root / "missing.wav")))
+
+    def test_backends_seek_to_centred_excerpt(self):
+        for ext, path in self.paths.items():
+            for backend in ("miniaudio", "soundfile", "librosa"):
+                with self.subTest(ext=ext, backend=backend):
+                    y, sr = audio_decode.decode_excerpt(path, duration=10.0, backend=backend)
+                    self.assertEqual(sr, audio_decode.ANALYSIS_SR)
+                    self.assertEqual(y.dtype, np.float32)
+                    self.assertEqual(y.ndim, 1)
+                    self.assertLessEqual(abs(y.size - 10 * sr), 2)
+                    # Excerpt starts at 25 s of 60 s: ramp value -0.5 + 25/60.
+                    self.assertAlmostEqual(float(np.median(y[100:200])), -0.5 + 25.0 / 60.0, places=2)
+
+    def test_short_file_is_decoded_whole(self):
+        y, sr = audio_decode.decode_excerpt(self.paths["wav"], duration=120.0)
+        self.assertLessEqual(abs(y.size - 60 * sr), 2)
+
+    def test_undecodable_file_raises(self):
+        bogus = self.root / "bogus.mp3"
+        bogus.write_bytes(b"not audio")
+        with self.assertRaises(RuntimeError):
+            audio_decode.decode_excerpt(str(bogus))
+
+
+def _add_clicks(y: np.ndarray, bpm: float, sr: int) -> np.ndarray:
+    n = int(sr * 0.0125)
+    click = np.exp(-np.arange(n) / (n / 8)) * np.sin(2 * np.pi * 1500 * np.arange(n) / sr) * 0.5
+    for start in range(0, len(y) - n, int(sr * 60.0 / bpm)):
+        y[start:start + n] += click
+    return (np.stack([y, y], axis=1) * 32767).astype(np.int16).reshape(-1)
+
+
+def _live_pcm(bpm: float, seconds: float = 16.0, sr: int = 48000, minor: bool = False) -> np.ndarray:
+    """Interleaved stereo int16: A major (or minor) chord, root in the bass, plus a click on every beat."""
+    t = np.arange(int(sr * seconds)) / sr
+    third = 261.63 if minor else 277.18
+    y = sum(a * np.sin(2 * np.pi * f * t) for f, a in ((110.0, 1.0), (220.0, 0.6), (third, 0.4), (329.63, 0.5)))
+    y *= 0.05
+    return _add_clicks(y, bpm, sr)
+
+
+def _progression_pcm(key: str, bpm: float, seconds: float = 12.0, sr: int = 48000) -> np.ndarray:
+    """I-IV-V-I (i-iv-v-i) in `key`, one chord per bar, notes with three harmonics, bass root loudest."""
+    tonic = librosa_cli.NOTES.index(key[:-3])
+    third = 3 if key.endswith("min") else 4
+    bar = int(round(4 * 60.0 / bpm * sr))
+    t = np.arange(bar) / sr
+    envelope = np.minimum(1.0, t / 0.02) * np.exp(-t * bpm / 240.0)
+    bars = []
+    for degree in (0, 5, 7, 0):
+        root = 48 + (tonic + degree) % 12
+        notes = ((root - 12, 1.0), (root, 0.7), (root + third, 0.5), (root + 7, 0.5))
+        freqs = [(440.0 * 2 ** ((m - 69) / 12.0), w) for m, w in notes]
+        bars.append(envelope * sum(w * np.sin(2 * np.pi * f * k * t) / k for f, w in freqs for k in (1, 2, 3)))
+    y = np.resize(np.concatenate(bars), int(sr * seconds))
+    y *= 0.25 / np.max(np.abs(y))
+    return _add_clicks(y, bpm, sr)
+
+
+class LiveMoodEstimatorTests(unittest.TestCase):
+    BLOCK = 960 * 2  # 20 ms of interleaved stereo at 48 kHz
+
+    def _feed(self, estimator, pcm):
+        for start in range(0, pcm.size, self.BLOCK):
+            estimator.push_pcm(pcm[start:start + self.BLOCK].tobytes())
+
+    def test_tempo_and_key_from_20ms_blocks(self):
+        for bpm in (90, 120, 140):
+            with self.subTest(bpm=bpm):
+                estimator = LiveMoodEstimator(48000, 2)
+                self._feed(estimator, _live_pcm(bpm))
+                estimate = estimator.latest()
+                self.assertLessEqual(abs(estimate["bpm"] - bpm), 2)
+                self.assertEqual(estimate["key_technical"], "Amaj")
+                self.assertEqual(estimate["key_camelot"], "11B")
+                self.assertEqual(estimate["energy_trend"], "steady")
+
+    def test_minor_keys(self):
+        estimator = LiveMoodEstimator(48000, 2)
+        self._feed(estimator, _live_pcm(120, minor=True))
+        self.assertEqual(estimator.latest()["key_technical"], "Amin")
+        self.assertEqual(estimator.latest()["valence"], "Negative (Minor)")
+        for key, bpm in (("Amin", 100), ("Emin", 120), ("F#min", 135), ("Dmin", 150), ("Cmaj", 90), ("A#maj", 140)):
+            with self.subTest(key=key):
+                estimator = LiveMoodEstimator(48000, 2)
+                self._feed(estimator, _progression_pcm(key, bpm))
+                self.assertEqual(estimator.latest()["key_technical"], key)
+
+    def test_publishes_on_schedule(self):
+        published = []
+        estimator = LiveMoodEstimator(48000, 2, publish_seconds=2.0, warmup_seconds=4.0, on_estimate=published.append)
+        self._feed(estimator, _live_pcm(120, seconds=3.9))
+        self.assertEqual(published, [])
+        self.assertIsNone(estimator.latest())
+
+        self._feed(estimator, _live_pcm(120, seconds=4.2))
+        self.assertEqual([round(e["seconds"]) for e in published], [4, 6, 8])
+
+    def test_silence_and_level_changes(self):
+        estimator = LiveMoodEstimator(48000, 2, publish_seconds=1.0, warmup_seconds=1.0)
+        self._feed(estimator, np.zeros(48000 * 2 * 3, dtype=np.int16))
+        silent = estimator.latest()
+        self.assertEqual((silent["bpm"], silent["key_technical"]), (0, "Unknown"))
+
+        self._feed(estimator, _live_pcm(120, seconds=4.0))
+        self.assertEqual(estimator.latest()["energy_trend"], "rising")
+
+
+class FeatureStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.store = FeatureStore(analyzer_version="test")
+        self.store.upsert_many([
+            ("/m/a.mp3", {"bpm": 100, "key_technical": "Amin", "key_camelot": "8A", "mood_detailed": "Calm", "loudness_db": -9.5}),
+            ("/m/b.mp3", {"bpm": 118, "key_technical": "Emin", "key_camelot": "9A", "mood_detailed": "Calm"}),
+            ("/m/c.mp3", {"bpm": 124, "key_technical": "Cmaj", "key_camelot": "8B", "mood_detailed": "Happy"}),
+            ("/m/d.mp3", {"bpm": 95, "key_technical": "Gmaj", "key_camelot": "9B"}),
+            ("/m/e.mp3", {"bpm": 92, "key_technical": "C#min", "key_camelot": "12A"}),
+            ("/m/f.mp3", {"bpm": 110, "key_technical": "G#min", "key_camelot": "1A"}),
+            ("/m/broken.mp3", {"error": "decode failed"}),
+        ])
+
+    def _names(self, rows):
+        return sorted(Path(p).stem for p in self.store.paths(rows))
+
+    def test_range_and_camelot_queries(self):
+        self.assertEqual(self._names(self.store.query(bpm=(90, 120), camelot="8A", camelot_tolerance=1)), ["a", "b"])
+        self.assertEqual(self._names(self.store.query(camelot="12A", camelot_tolerance=1)), ["e", "f"])
+        self.assertEqual(
+            self._names(self.store.query(camelot="8A", camelot_tolerance=1, include_relative=True)),
+            ["a", "b", "c", "d"],
+        )
+        self.assertEqual(self._names(self.store.query(major=True, bpm=(None, 100))), ["d"])
+        self.assertEqual(self._names(self.store.query(mood="Calm")), ["a", "b"])
+        self.assertEqual(len(self.store.query(mood="Unknown mood")), 0)
+        self.assertEqual(len(self.store.query(camelot="13Z")), 0)
+
+    def test_upsert_replaces_and_round_trips(self):
+        self.assertEqual(len(self.store), 6)
+        self.store.upsert("/m/a.mp3", {"bpm": 150, "key_technical": "Amin", "key_camelot": "8A"})
+        self.assertEqual(len(self.store), 6)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            self.store.save(Path(tmp))
+            loaded = FeatureStore.load(Path(tmp))
+            self.assertEqual(len(FeatureStore.load(Path(tmp) / "missing")), 0)
+
+        record = loaded.record(loaded.row_for_path("/m/a.mp3"))
+        self.assertEqual(record["bpm"], 150.0)
+        self.assertEqual(record["key_camelot"], "8A")
+        self.assertNotIn("mood_detailed", record)
+        self.assertEqual(loaded.analyzer_version, "test")
+        self.assertEqual(self._names(loaded.query(bpm=(140, 160))), ["a"])
+        self.assertIsNone(loaded.row_for_path("/m/broken.mp3"))
+
+
+class PlaylistTaggerTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.store_dir = self.tmp / "store"
+        self.output = self.tmp / "mood_playlists_organized.json"
+        store = FeatureStore()
+        store.upsert_many([
+            ("/m/party.mp3", {"bpm": 132, "key_technical": "Cmaj", "loudness_db": -9.0, "spectral_centroid": 2600}),
+            ("/m/angry.mp3", {"bpm": 150, "key_technical": "Emin", "loudness_db": -8.0, "spectral_centroid": 3000}),
+            ("/m/slow_minor.mp3", {"bpm": 70, "key_technical": "Dmin", "loudness_db": -20.0, "spectral_centroid": 1300}),
+        ])
+        store.save(self.store_dir)
+
+    def _run(self, *extra):
+        with redirect_stdout(io.StringIO()):
+            code = playlist_tagger.main(["--store", str(self.store_dir), "-o", str(self.output), *extra])
+        self.assertEqual(code, 0)
+        return json.loads(self.output.read_text(encoding="utf-8"))
+
+    def test_full_retag_buckets_every_track(self):
+        playlists = self._run()
+        self.assertEqual(set(playlists), set(playlist_tagger.MOOD_BUCKETS))
+        self.assertEqual(playlists["😊 positive"], ["/m/party.mp3"])
+        self.assertEqual(playlists["😠 tense"], ["/m/angry.mp3"])
+        self.assertEqual(playlists["😢 sad"], ["/m/slow_minor.mp3"])
+        # Atomic writes leave no temp files behind.
+        self.assertEqual(sorted(p.name for p in self.tmp.iterdir() if p.is_file()),
+                         [self.output.name, self.output.name + playlist_tagger.STATE_SUFFIX])
+
+    def test_incremental_keeps_unchanged_tracks_and_hand_edits(self):
+        playlists = self._run()
+        # A manual move of an unchanged track and a hand-added entry both survive.
+        playlists["😊 positive"].remove("/m/party.mp3")
+        playlists["💡 creative"] += ["/m/party.mp3", "./mood_music_collection/extra.mp3"]
+        self.output.write_text(json.dumps(playlists), encoding="utf-8")
+
+        store = FeatureStore.load(self.store_dir)
+        store.upsert("/m/slow_minor.mp3", {"bpm": 150, "key_technical": "Dmin", "loudness_db": -8.0, "spectral_centroid": 3000})
+        store.upsert("/m/new.mp3", {"bpm": 128, "key_technical": "Gmaj", "loudness_db": -9.0, "spectral_centroid": 2500})
+        store.save(self.store_dir)
+
+        playlists = self._run("--incremental")
+        self.assertEqual(playlists["💡 creative"], ["./mood_music_collection/extra.mp3", "/m/party.mp3"])
+        self.assertEqual(playlists["😠 tense"], ["/m/angry.mp3", "/m/slow_minor.mp3"])
+        self.assertEqual(playlists["😢 sad"], [])
+        self.assertIn("/m/new.mp3", playlists["😊 positive"])
+
+
+class AnalysisCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.root = Path(self.tempdir.name)
+        self.track = str(_write_click_track(self.root / "track.wav", seconds=4.0))
+        self.cache = AnalysisCache(librosa_cli.ANALYZER_VERSION, self.root / "cache.sqlite3")
+        self.addCleanup(self.cache.close)
+
+    def _run(self, paths, cache=None):
+        return {i: r for i, _, r in librosa_cli.iter_analysis_results(paths, cache=cache or self.cache)}
+
+    def test_unchanged_file_is_not_reanalyzed(self):
+        first = self._run([self.track])[0]
+        with patch.object(librosa_cli, "_analyze_path", side_effect=AssertionError("re-analyzed")):
+            second = self._run([self.track])[0]
+
+        self.assertEqual(second["bpm"], first["bpm"])
+        self.assertEqual(second["key_camelot"], first["key_camelot"])
+        self.assertEqual(len(second["chroma"]), 12)
+        self.assertEqual(second["loudness_db"], first["loudness_db"])
+
+    def test_changed_moved_and_version_bumped_files(self):
+        self._run([self.track])
+        calls = []
+        real = librosa_cli._analyze_path
+
+        def counting(path):
+            calls.append(Path(path).name)
+            return real(path)
+
+        with patch.object(librosa_cli, "_analyze_path", side_effect=counting):
+            moved = str(self.root / "renamed.wav")
+            shutil.copy(self.track, moved)
+            self._run([moved])
+            self.assertEqual(calls, [])
+
+            _write_click_track(Path(self.track), bpm=90.0, seconds=4.0)
+            os.utime(self.track, ns=(1, 1))
+            self._run([self.track])
+            self.assertEqual(calls, ["track.wav"])
+
+            bumped = AnalysisCache("bumped", self.root / "cache.sqlite3")
+            self.addCleanup(bumped.close)
+            self._run([moved], cache=bumped)
+            self.assertEqual(calls, ["track.wav", "renamed.wav"])
+
+
+
+class WaveformOverviewTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        t = np.arange(44100 * 10) / 44100
+        self.track = self.tmp / "ramp.wav"
+        sf.write(str(self.track), (np.sin(2 * np.pi * 220 * t) * np.linspace(0, 0.8, t.size)).astype(np.float32), 44100)
+
+    def test_levels_halve_and_keep_peaks(self):
+        overview = waveform_overview.compute_overview(str(self.track))
+        counts = [level.shape[0] for level in overview.levels]
+        self.assertEqual(counts[0], -(-10 * waveform_overview.OVERVIEW_SR // waveform_overview.BASE_BUCKET))
+        self.assertTrue(all(b == a // 2 for a, b in zip(counts, counts[1:])))
+        self.assertGreaterEqual(counts[-1], waveform_overview.MIN_BUCKETS)
+        for level in overview.levels:
+            self.assertAlmostEqual(float(level[:, 1].max()), 0.8, delta=0.02)
+            self.assertTrue(np.all(level[:, 0] <= level[:, 2]) and np.all(level[:, 2] <= level[:, 1]))
+        self.assertEqual(overview.level_for(200).shape[0], counts[1])  # coarsest level with >= 200 buckets
+        lows, highs, _ = overview.columns(300)
+        self.assertEqual(highs.shape, (300,))
+        self.assertLess(highs[0], highs[-1])
+
+    def test_store_computes_once_and_reuses_disk_copy(self):
+        store = waveform_overview.WaveformOverviewStore(self.tmp / "waveforms")
+        first = store.request(str(self.track), lambda path, overview: None).result(timeout=30)
+        self.assertEqual(len(list((self.tmp / "waveforms").glob("*.npz"))), 1)
+
+        fresh = waveform_overview.WaveformOverviewStore(self.tmp / "waveforms")
+        with patch.object(waveform_overview, "compute_overview", side_effect=AssertionError("recomputed")):
+            loaded = fresh.load_or_compute(str(self.track))
+        self.assertEqual([level.shape for level in loaded.levels], [level.shape for level in first.levels])
+        self.assertAlmostEqual(loaded.duration_seconds, 10.0, places=2)
+        store.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,11 @@
 import json
 import os
 import tempfile
+import threading
+import time
 import unittest
 from pathlib import Path
+from unittest.mock import MagicMock, patch
 
 from architects.helpers.managed_mem import ManagedMem
 from architects.song import Song
@@ -80,5 +83,54 @@ class SongManagedMemTests(unittest.TestCase):
         self.assertEqual(result, expected_value)
 
 
+class SongAnalysisTests(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self._original_file = ManagedMem._file
+        ManagedMem._file = os.path.join(self.tempdir.name, "managed_mem.json")
+        ManagedMem._instance = None
+        self.addCleanup(self._restore_managed_mem_class)
+        self.path = Path(self.tempdir.name) / "track.wav"
+        self.path.write_bytes(b"RIFF")
+        self.cache = MagicMock()
+
+    def _restore_managed_mem_class(self):
+        ManagedMem._instance = None
+        ManagedMem._file = self._original_file
+
+    def test_cached_analysis_is_looked_up_once(self):
+        self.cache.get.return_value = {"bpm": 124, "key_camelot": "8A"}
+        with patch("mood_readers.librosa_cli.default_analysis_cache", return_value=self.cache), \
+                patch("mood_readers.librosa_cli.analyze_file_cached") as mock_analyze:
+            song = Song(self.path)
+
+        self.assertEqual((song.tempo, song.camelot_tags), (124, ["8A"]))
+        self.assertEqual(self.cache.get.call_count, 1)
+        mock_analyze.assert_not_called()
+
+    def test_cache_miss_is_analyzed_in_the_background(self):
+        self.cache.get.return_value = None
+        release = threading.Event()
+
+        def analyze(path):
+            release.wait(5)
+            return {"bpm": 98, "key_camelot": "5B"}
+
+        with patch("mood_readers.librosa_cli.default_analysis_cache", return_value=self.cache), \
+                patch("mood_readers.librosa_cli.analyze_file_cached", side_effect=analyze):
+            song = Song(self.path)
+            # Song() returned before the analysis finished.
+            self.assertIsNone(song.tempo)
+            release.set()
+            deadline = time.monotonic() + 5
+            while song.tempo is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        self.assertEqual((song.tempo, song.camelot_tags), (98, ["5B"]))
+        self.assertEqual(self.cache.get.call_count, 1)
+        self.assertIs(ManagedMem().gettr(str(self.path)), song)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput and accuracy of the librosa_cli analysis pipeline on a synthetic golden corpus.
+
+    python benchmarks/analysis_bench.py                        # corpus, stage timings, 1..cpu workers
+    python benchmarks/analysis_bench.py --jobs 1 2 4 --json analysis.json
+    python benchmarks/analysis_bench.py --compare analysis.json
+
+The corpus is click tracks over chord progressions with a known tempo and key. Each
+run reports:
+
+- per-stage time per file: decode and resample (the soundfile backend path, measured
+  separately), then stft, beat, chroma, key, timbre and loudness (from `_analyze_signal`)
+- files/sec of `iter_analysis_results` (no cache) at each worker count, pool start included
+- BPM accuracy (within BPM_TOLERANCE, and also allowing half/double tempo) and key accuracy
+  (exact, and also allowing a neighbouring Camelot code)
+- peak RSS of this process and of the worker processes
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import librosa
+import soundfile as sf
+
+try:
+    import resource
+except ModuleNotFoundError:  # pragma: no cover - Windows
+    resource = None  # type: ignore
+
+from mood_readers import librosa_cli
+from mood_readers.audio_decode import ANALYSIS_SR, EXCERPT_SECONDS, FAST_RES_TYPE, excerpt_offset
+from mood_readers.feature_store import parse_camelot
+
+NOTES = librosa_cli.NOTES
+BPM_TOLERANCE = 2.0
+CORPUS_SR = 44100
+# (bpm, key) ground truth; tempi span the prior's range, keys cover both modes and several wheel positions.
+GOLDEN_CORPUS = (
+    (90, "Cmaj"),
+    (100, "Amin"),
+    (110, "Gmaj"),
+    (120, "Emin"),
+    (128, "Dmaj"),
+    (135, "F#min"),
+    (140, "A#maj"),
+    (150, "Dmin"),
+)
+# Scale degrees (semitones above the tonic) of the progression roots: I-IV-V-I / i-iv-v-i.
+PROGRESSION = (0, 5, 7, 0)
+STAGES = ("decode", "resample", "stft", "beat", "chroma", "key", "timbre", "loudness")
+
+
+def _tone(freq: float, t: np.ndarray) -> np.ndarray:
+    """A note with three decaying harmonics."""
+    return sum(np.sin(2 * np.pi * freq * k * t) / k for k in (1, 2, 3))
+
+
+def synthesize_track(bpm: float, key: str, seconds: float, sr: int = CORPUS_SR) -> np.ndarray:
+    """Stereo float32 track: a chord every bar (four beats) plus a noise click on every beat."""
+    tonic = NOTES.index(key[:-3])
+    minor = key.endswith("min")
+    third = 3 if minor else 4
+    beat = 60.0 / bpm
+    bar = int(round(4 * beat * sr))
+    t = np.arange(bar) / sr
+    envelope = np.minimum(1.0, t / 0.02) * np.exp(-t / (4 * beat))
+    bars = []
+    for degree in PROGRESSION:
+        root = 48 + (tonic + degree) % 12  # MIDI, octave 3
+        notes = [root - 12, root, root + third, root + 7]
+        weights = [1.0, 0.7, 0.5, 0.5]  # bass root carries the most energy
+        bars.append(envelope * sum(w * _tone(librosa.midi_to_hz(n), t) for n, w in zip(notes, weights)))
+    music = np.tile(np.concatenate(bars), int(np.ceil(seconds * sr / (bar * len(bars)))))[: int(seconds * sr)]
+
+    rng = np.random.default_rng(int(bpm))
+    click_len = int(0.02 * sr)
+    click = rng.standard_normal(click_len) * np.exp(-np.linspace(0, 6, click_len))
+    for start in np.arange(0, music.size - click_len, beat * sr).astype(int):
+        music[start:start + click_len] += 0.8 * click
+    music *= 0.25 / np.max(np.abs(music))
+    return np.stack([music, np.roll(music, 32)], axis=1).astype(np.float32)
+
+
+def write_golden_corpus(directory: Path, seconds: float = 30.0, fmt: str = "wav") -> list:
+    """Writes GOLDEN_CORPUS tracks; returns [{"path", "bpm", "key"}]."""
+    corpus = []
+    for bpm, key in GOLDEN_CORPUS:
+        path = Path(directory) / f"golden_{bpm}bpm_{key.replace('#', 's')}.{fmt}"
+        sf.write(str(path), synthesize_track(bpm, key, seconds), CORPUS_SR, format=fmt.upper())
+        corpus.append({"path": str(path), "bpm": bpm, "key": key})
+    return corpus
+
+
+def _camelot_steps(a: str, b: str) -> int:
+    (na, ma), (nb, mb) = parse_camelot(a), parse_camelot(b)
+    if ma is None or mb is None:
+        return 99
+    diff = abs(na - nb) % 12
+    return min(diff, 12 - diff) + (ma != mb)
+
+
+def score(expected: dict, result: dict) -> dict:
+    bpm = float(result.get("bpm") or 0)
+    key = str(result.get("key_technical", ""))
+    folded = [bpm * f for f in (0.5, 1.0, 2.0)]
+    return {
+        "file": Path(expected["path"]).name,
+        "bpm_expected": expected["bpm"],
+        "bpm": bpm,
+        "bpm_ok": abs(bpm - expected["bpm"]) <= BPM_TOLERANCE,
+        "bpm_octave_ok": any(abs(b - expected["bpm"]) <= BPM_TOLERANCE for b in folded),
+        "key_expected": expected["key"],
+        "key": key,
+        "key_ok": key == expected["key"],
+        "key_neighbour_ok": _camelot_steps(
+            librosa_cli.get_camelot_code(key), librosa_cli.get_camelot_code(expected["key"])
+        ) <= 1,
+    }
+
+
+def time_stages(path: str) -> dict:
+    """Seconds per stage for one file (decode/resample as in audio_decode's soundfile backend)."""
+    timings = {}
+    started = time.perf_counter()
+    with sf.SoundFile(path) as handle:
+        native_sr = handle.samplerate
+        handle.seek(int(excerpt_offset(handle.frames / float(native_sr)) * native_sr))
+        data = handle.read(int(EXCERPT_SECONDS * native_sr), dtype="float32", always_2d=True)
+    y = data.mean(axis=1)
+    started = librosa_cli._lap(timings, "decode", started)
+    y = librosa.resample(y, orig_sr=native_sr, target_sr=ANALYSIS_SR, res_type=FAST_RES_TYPE)
+    librosa_cli._lap(timings, "resample", started)
+    result = librosa_cli._analyze_signal(y, ANALYSIS_SR, timings=timings)
+    return {"timings": timings, "result": result}
+
+
+def measure_throughput(paths: list, jobs: int) -> dict:
+    started = time.perf_counter()
+    errors = sum(1 for _, _, r in librosa_cli.iter_analysis_results(paths, jobs=jobs) if "error" in r)
+    elapsed = time.perf_counter() - started
+    return {
+        "jobs": jobs,
+        "seconds": round(elapsed, 3),
+        "files_per_sec": round(len(paths) / elapsed, 3),
+        "errors": errors,
+    }
+
+
+def peak_rss_mb() -> dict:
+    if resource is None:
+        return {}
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "workers": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+
+def run(corpus: list, jobs_list: list, repeat: int) -> dict:
+    # Warm-up: librosa lazy imports and numba JIT.
+    librosa_cli._warm_up_worker()
+
+    stage_samples = {stage: [] for stage in STAGES}
+    scores = []
+    for item in corpus:
+        for _ in range(max(1, repeat)):
+            measured = time_stages(item["path"])
+            for stage in STAGES:
+                stage_samples[stage].append(measured["timings"].get(stage, 0.0))
+        scores.append(score(item, measured["result"]))
+
+    paths = [item["path"] for item in corpus]
+    throughput = [measure_throughput(paths, jobs) for jobs in jobs_list]
+    count = max(1, len(scores))
+    return {
+        "files": len(corpus),
+        "stage_ms": {stage: round(statistics.median(v) * 1000, 2) for stage, v in stage_samples.items() if v},
+        "throughput": throughput,
+        "accuracy": {
+            name: round(sum(s[name] for s in scores) / count, 3)
+            for name in ("bpm_ok", "bpm_octave_ok", "key_ok", "key_neighbour_ok")
+        },
+        "per_file": scores,
+        "peak_rss_mb": peak_rss_mb(),
+        "analyzer_version": librosa_cli.ANALYZER_VERSION,
+    }
+
+
+def _metrics(report: dict) -> dict:
+    flat = {f"stage_ms.{k}": v for k, v in report.get("stage_ms", {}).items()}
+    flat.update({f"accuracy.{k}": v for k, v in report.get("accuracy", {}).items()})
+    flat.update({f"files_per_sec@{t['jobs']}": t["files_per_sec"] for t in report.get("throughput", [])})
+    flat.update({f"peak_rss_mb.{k}": v for k, v in report.get("peak_rss_mb", {}).items()})
+    return flat
+
+
+def print_report(report: dict, baseline: dict = None) -> None:
+    old = _metrics(baseline) if baseline else {}
+    print(f"{'metric':<28} {'value':>10}" + (f" {'baseline':>10} {'change':>8}" if baseline else ""))
+    for name, value in _metrics(report).items():
+        line = f"{name:<28} {value:>10}"
+        if baseline and name in old:
+            before = old[name]
+            change = f"{(value - before) / before * 100:+.1f}%" if before else "n/a"
+            line += f" {before:>10} {change:>8}"
+        print(line)
+    misses = [s for s in report["per_file"] if not (s["bpm_ok"] and s["key_ok"])]
+    for s in misses:
+        print(f"  miss {s['file']}: bpm {s['bpm']:g} (want {s['bpm_expected']}), key {s['key']} (want {s['key_expected']})")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark librosa_cli speed and accuracy on a golden corpus.")
+    parser.add_argument("--jobs", type=int, nargs="+", help="Worker counts to measure (default: 1..cpu count)")
+    parser.add_argument("--repeat", type=int, default=1, help="Stage-timing runs per file")
+    parser.add_argument("--seconds", type=float, default=30.0, help="Length of generated tracks")
+    parser.add_argument("--format", default="wav", choices=("wav", "flac", "mp3"), help="Corpus file format")
+    parser.add_argument("--json", dest="json_path", help="Write the report as JSON")
+    parser.add_argument("--compare", help="Previous JSON report to print changes against")
+    args = parser.parse_args(argv)
+    jobs_list = args.jobs or list(range(1, (os.cpu_count() or 1) + 1))
+
+    with tempfile.TemporaryDirectory(prefix="analysis_bench_") as tmp:
+        corpus = write_golden_corpus(Path(tmp), seconds=args.seconds, fmt=args.format)
+        report = run(corpus, jobs_list, args.repeat)
+
+    baseline = json.loads(Path(args.compare).read_text(encoding="utf-8")) if args.compare else None
+    print_report(report, baseline)
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
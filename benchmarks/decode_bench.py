@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Per-file decode time of the analysis excerpt, per format and decoder.
+
+    python benchmarks/decode_bench.py                  # synthetic 4 min WAV/FLAC/MP3 tracks
+    python benchmarks/decode_bench.py --repeat 5 music/*.mp3
+    python benchmarks/decode_bench.py --json decode.json
+
+"baseline" is the previous path (librosa.get_duration + librosa.load with the
+default high-quality resampler); the other rows are `audio_decode` backends.
+"""
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import librosa
+import soundfile as sf
+
+from mood_readers.audio_decode import ANALYSIS_SR, EXCERPT_SECONDS, decode_excerpt, excerpt_offset
+
+BACKENDS = ("baseline", "miniaudio", "soundfile", "librosa")
+SYNTHETIC_FORMATS = (("wav", "WAV"), ("flac", "FLAC"), ("mp3", "MP3"))
+
+
+def _baseline(path: str):
+    total = librosa.get_duration(path=path)
+    return librosa.load(path, sr=ANALYSIS_SR, mono=True, offset=excerpt_offset(total), duration=EXCERPT_SECONDS)
+
+
+def write_synthetic_tracks(directory: Path, seconds: float = 240.0, sr: int = 44100) -> list:
+    """Stereo 44.1 kHz chord-plus-click tracks in every format libsndfile can write here."""
+    t = np.arange(int(seconds * sr)) / sr
+    y = sum(np.sin(2 * np.pi * f * t) for f in (110.0, 220.0, 277.18, 329.63)) * 0.1
+    y[:: sr // 2] += 0.5
+    stereo = np.stack([y, np.roll(y, 64)], axis=1).astype(np.float32)
+    paths = []
+    for ext, fmt in SYNTHETIC_FORMATS:
+        path = directory / f"synthetic.{ext}"
+        try:
+            sf.write(str(path), stereo, sr, format=fmt)
+        except Exception as exc:  # e.g. libsndfile built without MP3 support
+            print(f"Skipping synthetic {ext}: {exc}", file=sys.stderr)
+            continue
+        paths.append(str(path))
+    return paths
+
+
+def time_decode(path: str, backend: str, repeat: int) -> dict:
+    timings = []
+    samples = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            if backend == "baseline":
+                y, _ = _baseline(path)
+            else:
+                y, _ = decode_excerpt(path, backend=backend)
+        except Exception as exc:  # noqa: BLE001 - unsupported format for this backend
+            return {"file": Path(path).name, "backend": backend, "error": str(exc)}
+        timings.append(time.perf_counter() - start)
+        samples = int(y.size)
+    return {
+        "file": Path(path).name,
+        "backend": backend,
+        "median_ms": round(statistics.median(timings) * 1000, 1),
+        "min_ms": round(min(timings) * 1000, 1),
+        "samples": samples,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark analysis excerpt decoding.")
+    parser.add_argument("paths", nargs="*", help="Audio files (default: generated WAV/FLAC/MP3)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per file and backend")
+    parser.add_argument("--seconds", type=float, default=240.0, help="Length of generated tracks")
+    parser.add_argument("--json", dest="json_path", help="Also write results as JSON")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="decode_bench_") as tmp:
+        paths = args.paths or write_synthetic_tracks(Path(tmp), seconds=args.seconds)
+        # Warm-up: librosa lazy imports and resampler initialization.
+        _baseline(paths[0])
+
+        results = [time_decode(path, backend, max(1, args.repeat)) for path in paths for backend in BACKENDS]
+
+    print(f"{'file':<28} {'backend':<10} {'median ms':>10} {'min ms':>8}")
+    for row in results:
+        if "error" in row:
+            print(f"{row['file']:<28} {row['backend']:<10} {'n/a':>10} {'':>8}  {row['error'][:60]}")
+        else:
+            print(f"{row['file']:<28} {row['backend']:<10} {row['median_ms']:>10} {row['min_ms']:>8}")
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
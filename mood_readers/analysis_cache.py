@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent, content-addressed cache of per-track analysis results (SQLite).
+
+A row is reused when the file at `path` still has the same size and mtime, or when
+a file with the same size and partial content hash was analyzed before (moved or
+copied tracks). Rows written by another analyzer version are ignored.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+ANALYSIS_CACHE_FILE = "analysis_cache.sqlite3"
+# Bytes hashed from the start, middle and end of a file for the partial content hash.
+PARTIAL_HASH_BLOCK = 64 * 1024
+
+# Result columns in table order; new features are appended (older databases are migrated in place).
+_RESULT_COLUMNS = (
+    ("bpm", "INTEGER"),
+    ("key_technical", "TEXT"),
+    ("key_camelot", "TEXT"),
+    ("valence", "TEXT"),
+    ("mood_detailed", "TEXT"),
+    ("spectral_centroid", "REAL"),
+    ("rms_energy", "REAL"),
+    ("loudness_db", "REAL"),
+    ("loudness_lufs", "REAL"),
+)
+_RESULT_FIELDS = tuple(name for name, _ in _RESULT_COLUMNS)
+_SELECT_COLUMNS = ", ".join(_RESULT_FIELDS + ("chroma",))
+
+
+def default_cache_path() -> Path:
+    try:
+        from ui_ux_team.blue_ui.config.runtime_paths import user_config_dir
+    except ModuleNotFoundError:
+        return Path(__file__).resolve().parent / "data" / ANALYSIS_CACHE_FILE
+    return user_config_dir() / ANALYSIS_CACHE_FILE
+
+
+def partial_content_hash(path: str, size: Optional[int] = None) -> str:
+    """sha256 over the file size plus three fixed-size blocks (head, middle, tail)."""
+    size = os.path.getsize(path) if size is None else size
+    digest = hashlib.sha256(str(size).encode("ascii"))
+    with open(path, "rb") as handle:
+        for offset in (0, max(0, size // 2 - PARTIAL_HASH_BLOCK // 2), max(0, size - PARTIAL_HASH_BLOCK)):
+            handle.seek(offset)
+            digest.update(handle.read(PARTIAL_HASH_BLOCK))
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """SQLite store of analysis results keyed by (path, size, mtime, partial hash, analyzer version)."""
+
+    def __init__(self, analyzer_version: str, path: Optional[Path] = None):
+        self.analyzer_version = str(analyzer_version)
+        self.path = Path(path) if path else default_cache_path()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+                "partial_hash TEXT NOT NULL, analyzer_version TEXT NOT NULL, "
+                "chroma BLOB, updated_at REAL NOT NULL, "
+                + ", ".join(f"{name} {kind}" for name, kind in _RESULT_COLUMNS)
+                + ")"
+            )
+            existing = {row[1] for row in self._conn.execute("PRAGMA table_info(analyses)")}
+            for name, kind in _RESULT_COLUMNS:
+                if name not in existing:
+                    self._conn.execute(f"ALTER TABLE analyses ADD COLUMN {name} {kind}")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS analyses_content ON analyses (size, partial_hash, analyzer_version)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def _stat(path: str) -> Tuple[int, int]:
+        st = os.stat(path)
+        return int(st.st_size), int(st.st_mtime_ns)
+
+    @staticmethod
+    def _row_to_result(row: tuple, path: str) -> Dict:
+        *values, chroma = row
+        result = {name: value for name, value in zip(_RESULT_FIELDS, values) if value is not None}
+        result["file_name"] = Path(path).name
+        if chroma:
+            result["chroma"] = np.frombuffer(chroma, dtype=np.float32).tolist()
+        return result
+
+    def get(self, path: str) -> Optional[Dict]:
+        """Cached result for `path`, or None if the file is new, changed or unreadable."""
+        path = str(path)
+        try:
+            size, mtime_ns = self._stat(path)
+        except OSError:
+            return None
+        columns = _SELECT_COLUMNS
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                f"SELECT {columns} FROM analyses WHERE path = ? AND size = ? AND mtime_ns = ? AND analyzer_version = ?",
+                (path, size, mtime_ns, self.analyzer_version),
+            ).fetchone()
+            if row is not None:
+                return self._row_to_result(row, path)
+
+            # Same content under another path (moved/copied, or touched without changes).
+            try:
+                content_hash = partial_content_hash(path, size)
+            except OSError:
+                return None
+            row = conn.execute(
+                f"SELECT {columns} FROM analyses WHERE size = ? AND partial_hash = ? AND analyzer_version = ? LIMIT 1",
+                (size, content_hash, self.analyzer_version),
+            ).fetchone()
+            if row is None:
+                return None
+            self._upsert_locked(conn, path, size, mtime_ns, content_hash, row)
+            return self._row_to_result(row, path)
+
+    def put(self, path: str, result: Dict) -> None:
+        """Stores a successful analysis result; error results are never cached."""
+        if not result or "error" in result:
+            return
+        path = str(path)
+        try:
+            size, mtime_ns = self._stat(path)
+            content_hash = partial_content_hash(path, size)
+        except OSError:
+            return
+        chroma = result.get("chroma")
+        chroma_blob = np.asarray(chroma, dtype=np.float32).tobytes() if chroma is not None else None
+        values = tuple(result.get(name) for name in _RESULT_FIELDS) + (chroma_blob,)
+        with self._lock:
+            self._upsert_locked(self._connection(), path, size, mtime_ns, content_hash, values)
+
+    def _upsert_locked(self, conn, path, size, mtime_ns, content_hash, values) -> None:
+        """`values` are the result fields followed by the chroma blob (same order as `_SELECT_COLUMNS`)."""
+        columns = ("path", "size", "mtime_ns", "partial_hash", "analyzer_version", "updated_at") + _RESULT_FIELDS + ("chroma",)
+        conn.execute(
+            f"INSERT OR REPLACE INTO analyses ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            (path, size, mtime_ns, content_hash, self.analyzer_version, time.time(), *values),
+        )
+        conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Excerpt decoding for analysis.
+
+Duration comes from the container header, the decoder seeks straight to the
+excerpt start and decodes to mono float32 at the analysis rate:
+
+- miniaudio (mp3/flac/wav/ogg): header info, seek and linear resampling in C.
+- soundfile (wav/flac/ogg/mp3 with libsndfile >= 1.1): frame-accurate seek, soxr "lq" resample.
+- librosa.load (anything audioread/ffmpeg can open, e.g. m4a/aac).
+
+miniaudio is tried first for WAV/FLAC and soundfile for OGG. MP3 is not faster
+with any of them: miniaudio's MP3 seek decodes from the start (about twice the
+baseline time), and soundfile only matches the previous librosa.load path, within
+noise (see benchmarks/decode_bench.py). So MP3 keeps that path first.
+"""
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Optional dependency: miniaudio (also used by MiniaudioPlayer)
+try:
+    import miniaudio
+except ModuleNotFoundError:  # pragma: no cover - optional dependency
+    miniaudio = None  # type: ignore
+
+try:
+    import soundfile as sf
+except ModuleNotFoundError:  # pragma: no cover - optional dependency
+    sf = None  # type: ignore
+
+ANALYSIS_SR = 22050
+EXCERPT_SECONDS = 45.0
+# Resampler used when the decoder cannot resample itself (soundfile path).
+FAST_RES_TYPE = "soxr_lq"
+_MINIAUDIO_EXTS = {".mp3", ".flac", ".wav", ".ogg"}
+_MINIAUDIO_FIRST_EXTS = {".flac", ".wav"}
+_LIBROSA_FIRST_EXTS = {".mp3"}
+_READ_BLOCK_SECONDS = 5
+
+
+def probe_duration(path: str) -> Optional[float]:
+    """Track length in seconds from the file header, or None if no reader understands it."""
+    if miniaudio is not None and _suffix(path) in _MINIAUDIO_EXTS:
+        try:
+            info = miniaudio.get_file_info(path)
+            if info.sample_rate > 0 and info.num_frames > 0:
+                return info.num_frames / float(info.sample_rate)
+        except Exception:
+            pass
+    if sf is not None:
+        try:
+            info = sf.info(path)
+            if info.samplerate > 0 and info.frames > 0:
+                return info.frames / float(info.samplerate)
+        except Exception:
+            pass
+    return None
+
+
+def excerpt_offset(total_seconds: Optional[float], duration: float = EXCERPT_SECONDS) -> float:
+    """Start of a `duration`-long window centred in the track (0 when the length is unknown)."""
+    if not total_seconds:
+        return 0.0
+    return max(0.0, (float(total_seconds) - duration) / 2.0)
+
+
+def decode_excerpt(
+    path: str,
+    duration: float = EXCERPT_SECONDS,
+    sr: int = ANALYSIS_SR,
+    backend: Optional[str] = None,
+) -> Tuple[np.ndarray, int]:
+    """
+    Decodes the centred `duration`-second excerpt of `path` as mono float32 at `sr`.
+    `backend` forces one of "miniaudio", "soundfile" or "librosa" (benchmarks); by
+    default the fastest decoder for the format is tried first.
+    """
+    backends = (backend,) if backend else _backend_order(path)
+    errors = []
+    for name in backends:
+        try:
+            y = _DECODERS[name](path, duration, sr)
+        except Exception as exc:  # noqa: BLE001 - fall through to the next decoder
+            errors.append(f"{name}: {exc}")
+            continue
+        if y is not None and y.size:
+            return y, sr
+        errors.append(f"{name}: no audio decoded")
+    raise RuntimeError(f"Could not decode {path} ({'; '.join(errors)})")
+
+
+def _backend_order(path: str) -> Tuple[str, ...]:
+    suffix = _suffix(path)
+    if suffix in _MINIAUDIO_FIRST_EXTS:
+        return ("miniaudio", "soundfile", "librosa")
+    if suffix in _LIBROSA_FIRST_EXTS:
+        return ("librosa", "soundfile", "miniaudio")
+    return ("soundfile", "miniaudio", "librosa")
+
+
+def _suffix(path: str) -> str:
+    dot = str(path).rfind(".")
+    return str(path)[dot:].lower() if dot >= 0 else ""
+
+
+def _decode_miniaudio(path: str, duration: float, sr: int) -> Optional[np.ndarray]:
+    if miniaudio is None or _suffix(path) not in _MINIAUDIO_EXTS:
+        return None
+    info = miniaudio.get_file_info(path)
+    total = info.num_frames / float(info.sample_rate) if info.sample_rate else 0.0
+    wanted = int(round(min(duration, total or duration) * sr))
+    # The decoder resamples, so seek positions are in output (sr) frames.
+    stream = miniaudio.stream_file(
+        path,
+        output_format=miniaudio.SampleFormat.FLOAT32,
+        nchannels=1,
+        sample_rate=sr,
+        frames_to_read=sr * _READ_BLOCK_SECONDS,
+        seek_frame=int(excerpt_offset(total, duration) * sr),
+    )
+    out = np.empty(wanted, dtype=np.float32)
+    filled = 0
+    try:
+        for block in stream:
+            chunk = np.frombuffer(block, dtype=np.float32)
+            take = min(chunk.size, wanted - filled)
+            out[filled:filled + take] = chunk[:take]
+            filled += take
+            if filled >= wanted:
+                break
+    finally:
+        stream.close()
+    return out[:filled]
+
+
+def _decode_soundfile(path: str, duration: float, sr: int) -> Optional[np.ndarray]:
+    if sf is None:
+        return None
+    with sf.SoundFile(path) as handle:
+        native_sr = handle.samplerate
+        total = handle.frames / float(native_sr) if native_sr else 0.0
+        if handle.seekable():
+            handle.seek(int(excerpt_offset(total, duration) * native_sr))
+        data = handle.read(int(duration * native_sr), dtype="float32", always_2d=True)
+    y = data.mean(axis=1) if data.shape[1] > 1 else data[:, 0]
+    if native_sr != sr:
+        import librosa
+
+        y = librosa.resample(y, orig_sr=native_sr, target_sr=sr, res_type=FAST_RES_TYPE)
+    return np.ascontiguousarray(y, dtype=np.float32)
+
+
+def _decode_librosa(path: str, duration: float, sr: int) -> Optional[np.ndarray]:
+    import librosa
+
+    try:
+        total = librosa.get_duration(path=path)
+    except Exception:
+        total = None
+    y, _ = librosa.load(
+        path, sr=sr, mono=True, offset=excerpt_offset(total, duration), duration=duration, res_type=FAST_RES_TYPE
+    )
+    return y
+
+
+_DECODERS = {
+    "miniaudio": _decode_miniaudio,
+    "soundfile": _decode_soundfile,
+    "librosa": _decode_librosa,
+}
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar per-track feature store.
+
+Numeric features are saved as one structured NumPy array (`features.npy`); strings
+(paths, mood labels) live once in a string table (`strings.json`) and rows refer to
+them by index. Queries run vectorized boolean masks over contiguous per-column copies:
+
+    store = FeatureStore.load(default_store_dir())
+    rows = store.query(bpm=(90, 120), camelot="8A", camelot_tolerance=1)
+    store.paths(rows)
+"""
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FEATURES_FILE = "features.npy"
+STRINGS_FILE = "strings.json"
+NOTES = ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")
+
+FEATURE_DTYPE = np.dtype([
+    ("path_id", np.int32),         # index into strings["paths"]
+    ("bpm", np.float32),
+    ("key_index", np.int8),        # 0-11 major on C..B, 12-23 minor on C..B, -1 unknown
+    ("camelot_number", np.int8),   # 1-12, 0 unknown
+    ("camelot_minor", np.bool_),   # True for "A" codes
+    ("mood_id", np.int16),         # index into strings["moods"], -1 unknown
+    ("spectral_centroid", np.float32),
+    ("rms_energy", np.float32),
+    ("loudness_db", np.float32),
+    ("chroma", np.float32, (12,)),
+])
+
+
+def default_store_dir() -> Path:
+    try:
+        from ui_ux_team.blue_ui.config.runtime_paths import user_config_dir
+    except ModuleNotFoundError:
+        return Path(__file__).resolve().parent / "data" / "feature_store"
+    return user_config_dir() / "feature_store"
+
+
+def parse_camelot(code: str) -> Tuple[int, Optional[bool]]:
+    """'8A' -> (8, True); unparseable codes -> (0, None)."""
+    code = str(code or "").strip().upper()
+    if len(code) < 2 or code[-1] not in "AB" or not code[:-1].isdigit():
+        return 0, None
+    number = int(code[:-1])
+    if not 1 <= number <= 12:
+        return 0, None
+    return number, code[-1] == "A"
+
+
+def key_index(key_technical: str) -> int:
+    """'C#maj' -> 1, 'Amin' -> 21; unknown keys -> -1 (same layout as librosa_cli key templates)."""
+    key = str(key_technical or "")
+    for suffix, base in (("maj", 0), ("min", 12)):
+        if key.endswith(suffix) and key[:-3] in NOTES:
+            return base + NOTES.index(key[:-3])
+    return -1
+
+
+def _number(value, default=np.nan) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class FeatureStore:
+    """Typed feature rows for a music library with vectorized queries."""
+
+    def __init__(self, rows: Optional[np.ndarray] = None, paths: Sequence[str] = (), moods: Sequence[str] = (),
+                 analyzer_version: str = ""):
+        self.rows = rows if rows is not None else np.zeros(0, dtype=FEATURE_DTYPE)
+        self._paths: List[str] = list(paths)
+        self._moods: List[str] = list(moods)
+        self._path_ids: Dict[str, int] = {p: i for i, p in enumerate(self._paths)}
+        self._mood_ids: Dict[str, int] = {m: i for i, m in enumerate(self._moods)}
+        self.analyzer_version = str(analyzer_version)
+        self._row_of_path: Optional[np.ndarray] = None
+        self._columns: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return int(self.rows.shape[0])
+
+    # --- persistence ---
+
+    @classmethod
+    def load(cls, directory: Path) -> "FeatureStore":
+        """Loads a saved store; a missing directory yields an empty store."""
+        directory = Path(directory)
+        features, strings = directory / FEATURES_FILE, directory / STRINGS_FILE
+        if not (features.exists() and strings.exists()):
+            return cls()
+        table = json.loads(strings.read_text(encoding="utf-8"))
+        rows = np.load(features)
+        return cls(rows, table.get("paths", []), table.get("moods", []), table.get("analyzer_version", ""))
+
+    def save(self, directory: Path) -> None:
+        """Writes both files atomically (temp file + rename)."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        table = {"analyzer_version": self.analyzer_version, "paths": self._paths, "moods": self._moods}
+        self._atomic_write(directory / FEATURES_FILE, lambda handle: np.save(handle, np.ascontiguousarray(self.rows)))
+        self._atomic_write(
+            directory / STRINGS_FILE,
+            lambda handle: handle.write(json.dumps(table, ensure_ascii=False).encode("utf-8")),
+        )
+
+    @staticmethod
+    def _atomic_write(path: Path, write) -> None:
+        fd, tmp = tempfile.mkstemp(prefix=path.name, dir=str(path.parent))
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                write(handle)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    # --- updates ---
+
+    def upsert_many(self, items: Iterable[Tuple[str, Dict]]) -> int:
+        """Adds or replaces rows for successful analysis results; returns the number stored."""
+        pending: Dict[int, np.void] = {}  # path_id -> row; a later result for the same path wins
+        for path, result in items:
+            if result and "error" not in result:
+                row = self._row(str(path), result)
+                pending[int(row["path_id"])] = row
+        if not pending:
+            return 0
+        existing = {int(pid): i for i, pid in enumerate(self.rows["path_id"])}
+        rows = self.rows.copy()
+        fresh = []
+        for path_id, row in pending.items():
+            if path_id in existing:
+                rows[existing[path_id]] = row
+            else:
+                fresh.append(row)
+        if fresh:
+            rows = np.concatenate((rows, np.array(fresh, dtype=FEATURE_DTYPE)))
+        self.rows = rows
+        self._row_of_path = None
+        self._columns = {}
+        return len(pending)
+
+    def upsert(self, path: str, result: Dict) -> bool:
+        return self.upsert_many([(path, result)]) == 1
+
+    def _row(self, path: str, result: Dict) -> np.void:
+        row = np.zeros((), dtype=FEATURE_DTYPE)
+        row["path_id"] = self._intern(self._paths, self._path_ids, path)
+        row["bpm"] = _number(result.get("bpm"))
+        row["key_index"] = key_index(result.get("key_technical", ""))
+        number, minor = parse_camelot(result.get("key_camelot", ""))
+        row["camelot_number"] = number
+        row["camelot_minor"] = bool(minor)
+        mood = result.get("mood_detailed")
+        row["mood_id"] = self._intern(self._moods, self._mood_ids, str(mood)) if mood else -1
+        for name in ("spectral_centroid", "rms_energy", "loudness_db"):
+            row[name] = _number(result.get(name))
+        chroma = result.get("chroma")
+        row["chroma"] = np.asarray(chroma, dtype=np.float32) if chroma is not None and len(chroma) == 12 else np.nan
+        return row
+
+    @staticmethod
+    def _intern(table: List[str], ids: Dict[str, int], value: str) -> int:
+        index = ids.get(value)
+        if index is None:
+            index = ids[value] = len(table)
+            table.append(value)
+        return index
+
+    # --- queries ---
+
+    def column(self, name: str) -> np.ndarray:
+        """Contiguous copy of one field (structured rows are strided; masks run much faster on columns)."""
+        col = self._columns.get(name)
+        if col is None:
+            col = self._columns[name] = np.ascontiguousarray(self.rows[name])
+        return col
+
+    def query(
+        self,
+        *,
+        bpm: Optional[Tuple[float, float]] = None,
+        camelot: Optional[str] = None,
+        camelot_tolerance: int = 0,
+        include_relative: bool = False,
+        major: Optional[bool] = None,
+        mood: Optional[str] = None,
+        loudness_db: Optional[Tuple[float, float]] = None,
+        energy: Optional[Tuple[float, float]] = None,
+        paths: Optional[Iterable[str]] = None,
+    ) -> np.ndarray:
+        """
+        Row indices matching every given filter. Ranges are inclusive; `camelot` with
+        `camelot_tolerance` N matches codes within N wheel steps in the same letter
+        (plus the other letter at the same numbers when `include_relative`).
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if bpm is not None:
+            mask &= self._in_range(self.column("bpm"), bpm)
+        if loudness_db is not None:
+            mask &= self._in_range(self.column("loudness_db"), loudness_db)
+        if energy is not None:
+            mask &= self._in_range(self.column("rms_energy"), energy)
+        if camelot is not None:
+            number, minor = parse_camelot(camelot)
+            if minor is None:
+                return np.zeros(0, dtype=np.int64)
+            mask &= self.camelot_distance(number) <= int(camelot_tolerance)
+            if not include_relative:
+                mask &= self.column("camelot_minor") == minor
+        if major is not None:
+            key = self.column("key_index")
+            mask &= (key >= 0) & ((key < 12) == bool(major))
+        if mood is not None:
+            mood_id = self._mood_ids.get(mood)
+            if mood_id is None:
+                return np.zeros(0, dtype=np.int64)
+            mask &= self.column("mood_id") == mood_id
+        if paths is not None:
+            wanted = [self._path_ids[p] for p in paths if p in self._path_ids]
+            mask &= np.isin(self.column("path_id"), wanted)
+        return np.flatnonzero(mask)
+
+    def camelot_distance(self, number: int) -> np.ndarray:
+        """Steps around the 12-position wheel from `number` for every row (99 for unknown keys)."""
+        numbers = self.column("camelot_number").astype(np.int16)
+        diff = np.abs(numbers - int(number)) % 12
+        return np.where(numbers > 0, np.minimum(diff, 12 - diff), 99)
+
+    @staticmethod
+    def _in_range(column: np.ndarray, bounds: Tuple[float, float]) -> np.ndarray:
+        low, high = bounds
+        low = -np.inf if low is None else low
+        high = np.inf if high is None else high
+        return (column >= low) & (column <= high)
+
+    def paths(self, indices: Optional[Iterable[int]] = None) -> List[str]:
+        ids = self.rows["path_id"] if indices is None else self.rows["path_id"][np.asarray(list(indices), dtype=np.int64)]
+        return [self._paths[int(i)] for i in ids]
+
+    def row_for_path(self, path: str) -> Optional[int]:
+        path_id = self._path_ids.get(str(path))
+        if path_id is None:
+            return None
+        if self._row_of_path is None:
+            lookup = np.full(len(self._paths), -1, dtype=np.int64)
+            lookup[self.rows["path_id"]] = np.arange(len(self.rows))
+            self._row_of_path = lookup
+        row = int(self._row_of_path[path_id])
+        return row if row >= 0 else None
+
+    def record(self, index: int) -> Dict:
+        """One row as a result-style dict (mood label resolved, NaNs dropped)."""
+        row = self.rows[int(index)]
+        out = {"file_path": self._paths[int(row["path_id"])]}
+        if not np.isnan(row["bpm"]):
+            out["bpm"] = float(row["bpm"])
+        key = int(row["key_index"])
+        if key >= 0:
+            out["key_technical"] = NOTES[key % 12] + ("maj" if key < 12 else "min")
+        if row["camelot_number"] > 0:
+            out["key_camelot"] = f"{int(row['camelot_number'])}{'A' if row['camelot_minor'] else 'B'}"
+        if row["mood_id"] >= 0:
+            out["mood_detailed"] = self._moods[int(row["mood_id"])]
+        for name in ("spectral_centroid", "rms_energy", "loudness_db"):
+            if not np.isnan(row[name]):
+                out[name] = float(row[name])
+        if not np.isnan(row["chroma"]).any():
+            out["chroma"] = row["chroma"].tolist()
+        return out
@@ -2,14 +2,28 @@
 """Batch audio analyser using librosa without any GUI dependencies."""
 import argparse
 import csv
+import multiprocessing
+import os
 import sys
 import io
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
-from typing import Iterable, List, Optional, Tuple
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
 
 import numpy as np
 
+if __package__ in (None, ""):
+    # Running as a script: make the repository root importable for `mood_readers.*`.
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from mood_readers.analysis_cache import AnalysisCache
+from mood_readers.audio_decode import ANALYSIS_SR, EXCERPT_SECONDS, decode_excerpt
+from mood_readers.feature_store import FeatureStore, default_store_dir
+from mood_readers.loudness import integrated_loudness
+
 # Usage: python3 mood_readers/librosa_cli.py -o results.csv "track1.wav" "track2.mp3"
+#        python3 mood_readers/librosa_cli.py --jobs 8 -o results.csv music/*.mp3
 
 # --- LIBROSA DEPENDENCIES ---
 # Ensure everything is installed from requirements.txt
@@ -25,6 +39,9 @@ except ImportError:
 # 1. LIBROSA ANALYSIS LOGIC
 # ----------------------------------------------------
 
+# Bump whenever _analyze_signal output changes so cached analyses are recomputed.
+ANALYZER_VERSION = "4"
+
 # Camelot translation table
 CAMELOT_WHEEL = {
     'C': ('8B', '5A'), 'G': ('9B', '6A'), 'D': ('10B', '7A'), 'A': ('11B', '8A'),
@@ -74,11 +91,67 @@ def get_detailed_mood(bpm: int, is_major: bool) -> str:
             return "Sad / Dark (Low Arousal)"
 
 
-def _analyze_signal(y: np.ndarray, sr: int) -> dict:
-    """Internal logic to extract features from loaded audio signal."""
-    # 1. BPM DETECTION
+# Krumhansl-style key profiles; rows 0-11 are major keys on C..B, rows 12-23 minor keys on C..B.
+C_MAJOR_TEMPLATE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+A_MINOR_TEMPLATE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 4.20])
+
+
+def _zscore_rows(matrix: np.ndarray) -> np.ndarray:
+    centered = matrix - matrix.mean(axis=-1, keepdims=True)
+    std = centered.std(axis=-1, keepdims=True)
+    std[std == 0] = 1.0
+    return centered / std
+
+
+# Z-scored so that one matrix product yields Pearson correlations for all 24 keys.
+_KEY_TEMPLATES = _zscore_rows(np.vstack(
+    [np.roll(C_MAJOR_TEMPLATE, i) for i in range(12)] + [np.roll(A_MINOR_TEMPLATE, i) for i in range(12)]
+))
+
+STFT_N_FFT = 2048
+STFT_HOP = 512
+TUNING_FRAME_STRIDE = 8
+CQT_BINS_PER_OCTAVE = 12
+CQT_OCTAVES = 7
+
+
+def estimate_key(chroma_vector: np.ndarray) -> Tuple[str, bool]:
+    """Best of 24 key templates via a single (24 x 12) @ (12,) correlation product."""
+    chroma_vector = np.asarray(chroma_vector, dtype=float)
+    if not np.all(np.isfinite(chroma_vector)) or np.ptp(chroma_vector) == 0:
+        return "Unknown", False
+    correlations = _KEY_TEMPLATES @ _zscore_rows(chroma_vector) / 12.0
+    if not np.all(np.isfinite(correlations)):
+        return "Unknown", False
+    best = int(np.argmax(correlations))
+    is_major = best < 12
+    return NOTES[best % 12] + ("maj" if is_major else "min"), is_major
+
+
+def _lap(timings: Optional[dict], stage: str, started: float) -> float:
+    """Adds the time since `started` to `timings[stage]` (when collecting); returns now."""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + (now - started)
+    return now
+
+
+def _analyze_signal(y: np.ndarray, sr: int, timings: Optional[dict] = None) -> dict:
+    """
+    Internal logic to extract features from loaded audio signal.
+    `timings`, if given, receives seconds per stage (stft, beat, chroma, key, timbre, loudness).
+    """
+    started = time.perf_counter()
+    # One STFT (onset/tempo, tuning, timbre, energy) and one CQT (chroma) per track.
+    S = np.abs(librosa.stft(y, n_fft=STFT_N_FFT, hop_length=STFT_HOP))
+    power = S ** 2
+    started = _lap(timings, "stft", started)
+
+    # 1. BPM DETECTION (onset envelope from the shared spectrogram)
     try:
-        tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
+        mel_db = librosa.power_to_db(librosa.feature.melspectrogram(S=power, sr=sr))
+        onset_env = librosa.onset.onset_strength(S=mel_db, sr=sr, aggregate=np.median)
+        tempo, _ = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr, hop_length=STFT_HOP)
         # Handle different librosa versions where tempo might be scalar or array
         if np.ndim(tempo) > 0:
              bpm = int(tempo[0])
@@ -86,30 +159,38 @@ def _analyze_signal(y: np.ndarray, sr: int) -> dict:
              bpm = int(tempo)
     except Exception:
         bpm = 0
+    started = _lap(timings, "beat", started)
 
     # 2. KEY DETECTION
-    chroma = librosa.feature.chroma_cens(y=y, sr=sr)
+    # Tuning from the shared STFT (piptrack dominates its cost, so every 8th frame is used);
+    # chroma needs CQT resolution for bass notes, so it comes from one CQT at that tuning.
+    tuning = librosa.estimate_tuning(S=S[:, ::TUNING_FRAME_STRIDE], sr=sr, n_fft=STFT_N_FFT)
+    C = np.abs(librosa.cqt(
+        y=y, sr=sr, hop_length=STFT_HOP, tuning=tuning,
+        bins_per_octave=CQT_BINS_PER_OCTAVE, n_bins=CQT_BINS_PER_OCTAVE * CQT_OCTAVES,
+    ))
+    chroma = librosa.feature.chroma_cens(
+        C=C, sr=sr, hop_length=STFT_HOP, bins_per_octave=CQT_BINS_PER_OCTAVE, n_octaves=CQT_OCTAVES
+    )
     chroma_vector = np.mean(chroma, axis=1)
-
-    C_major_template = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
-    A_minor_template = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 4.20])
-
-    best_key = "Unknown"
-    best_correlation = -1
-    is_major = False
-
-    for i in range(12):
-        corr_maj = np.corrcoef(chroma_vector, np.roll(C_major_template, i))[0, 1]
-        corr_min = np.corrcoef(chroma_vector, np.roll(A_minor_template, i))[0, 1]
-
-        if corr_maj > best_correlation or corr_min > best_correlation:
-            is_major = corr_maj > corr_min
-            best_correlation = max(corr_maj, corr_min)
-            best_key = NOTES[i]
-            best_key += "maj" if is_major else "min"
+    started = _lap(timings, "chroma", started)
+    best_key, is_major = estimate_key(chroma_vector)
 
     camelot_code = get_camelot_code(best_key)
     valence_simple = "Positive (Major)" if is_major else "Negative (Minor)"
+    started = _lap(timings, "key", started)
+
+    # 3. TIMBRE / ENERGY
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=STFT_N_FFT)
+    centroid = float(np.mean((freqs @ S) / np.maximum(S.sum(axis=0), 1e-10)))
+    rms = librosa.feature.rms(S=S, frame_length=STFT_N_FFT)
+    rms_energy = float(np.mean(rms))
+    loudness_db = float(20.0 * np.log10(max(rms_energy, 1e-10)))
+    started = _lap(timings, "timbre", started)
+
+    # 4. INTEGRATED LOUDNESS (EBU R128), used for loudness-normalized playback
+    loudness_lufs = integrated_loudness(y, sr)
+    _lap(timings, "loudness", started)
 
     # --- MODIFICATION: Call the new detailed mood function ---
     mood_detailed = get_detailed_mood(bpm, is_major)
@@ -119,7 +200,12 @@ def _analyze_signal(y: np.ndarray, sr: int) -> dict:
         "key_technical": best_key,
         "key_camelot": camelot_code,
         "valence": valence_simple,
-        "mood_detailed": mood_detailed
+        "mood_detailed": mood_detailed,
+        "spectral_centroid": round(centroid, 2),
+        "rms_energy": round(rms_energy, 6),
+        "loudness_db": round(loudness_db, 2),
+        "loudness_lufs": round(loudness_lufs, 2) if np.isfinite(loudness_lufs) else None,
+        "chroma": [float(v) for v in chroma_vector],
     }
 
 
@@ -147,24 +233,9 @@ def analyze_audio_bytes_logic(audio_bytes: bytes) -> dict:
 def analyze_audio_file_logic(file_path: str) -> dict:
     """Function that runs Librosa calculations and returns a dictionary of results."""
 
-    # OPTIMIZATION: Analyze a representative chunk (e.g., 45s from middle)
-    # and use a lower sample rate (22050 Hz is standard for feature extraction).
-    target_sr = 22050
-    analyze_duration = 45.0
-    
-    try:
-        # Quickly get duration to find the middle
-        # Note: librosa.get_duration(path=...) works in newer librosa versions.
-        # If it fails, we fall back to loading from start.
-        total_duration = librosa.get_duration(path=file_path)
-        offset = max(0, (total_duration - analyze_duration) / 2)
-    except Exception:
-        # Fallback: Just load the first 45 seconds if duration check fails
-        offset = 0.0
-
-    # Load only the specific segment
-    y, sr = librosa.load(file_path, sr=target_sr, mono=True, offset=offset, duration=analyze_duration)
-
+    # OPTIMIZATION: Analyze a representative chunk (45s from the middle) at 22050 Hz mono.
+    # The excerpt is located from the file header and decoded directly (see audio_decode).
+    y, sr = decode_excerpt(file_path, duration=EXCERPT_SECONDS, sr=ANALYSIS_SR)
     return _analyze_signal(y, sr)
 
 
@@ -176,6 +247,36 @@ def _validate_file(path: Path) -> Tuple[str, str]:
     return str(path), ""
 
 
+def _analyze_path(validated_path: str) -> dict:
+    try:
+        analysis = analyze_audio_file_logic(validated_path)
+        analysis["file_name"] = Path(validated_path).name
+        return analysis
+    except Exception as exc:  # noqa: BLE001 - surface full exception for CLI
+        return {"error": str(exc)}
+
+
+_default_cache: Optional[AnalysisCache] = None
+
+
+def default_analysis_cache() -> AnalysisCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = AnalysisCache(ANALYZER_VERSION)
+    return _default_cache
+
+
+def analyze_file_cached(file_path: str, cache: Optional[AnalysisCache] = None) -> dict:
+    """Returns the cached analysis for an unchanged file, analyzing (and caching) it otherwise."""
+    cache = cache or default_analysis_cache()
+    cached = cache.get(file_path)
+    if cached is not None:
+        return cached
+    result = _analyze_path(str(file_path))
+    cache.put(file_path, result)
+    return result
+
+
 def analyze_audio_files(file_paths: Iterable[str]) -> List[Tuple[str, dict]]:
     """Processes a list of audio files and returns the results."""
     results: List[Tuple[str, dict]] = []
@@ -185,16 +286,110 @@ def analyze_audio_files(file_paths: Iterable[str]) -> List[Tuple[str, dict]]:
         if error:
             results.append((validated_path, {"error": error}))
             continue
-
-        try:
-            analysis = analyze_audio_file_logic(validated_path)
-            analysis["file_name"] = Path(validated_path).name
-            results.append((validated_path, analysis))
-        except Exception as exc:  # noqa: BLE001 - surface full exception for CLI
-            results.append((validated_path, {"error": str(exc)}))
+        results.append((validated_path, _analyze_path(validated_path)))
     return results
 
 
+# ----------------------------------------------------
+# 2. PARALLEL BATCH MODE (--jobs N)
+# ----------------------------------------------------
+
+def _warm_up_worker() -> None:
+    """Pool initializer: pays librosa's lazy submodule imports and numba JIT once per process."""
+    try:
+        y = np.random.default_rng(0).standard_normal(22050).astype(np.float32) * 0.01
+        _analyze_signal(y, 22050)
+    except Exception:
+        pass
+
+
+def _analyze_work_unit(items: Sequence[Tuple[int, str]]) -> List[Tuple[int, str, dict]]:
+    """Worker entry point: analyzes one chunk of (index, path) pairs."""
+    return [(index, path, _analyze_path(path)) for index, path in items]
+
+
+def _default_chunk_size(total: int, jobs: int) -> int:
+    # ~4 work units per worker keeps cores busy without per-file IPC overhead.
+    return max(1, min(8, total // max(1, jobs * 4)))
+
+
+def iter_analysis_results(
+    file_paths: Sequence[str],
+    jobs: int = 1,
+    chunk_size: Optional[int] = None,
+    cache: Optional[AnalysisCache] = None,
+) -> Iterator[Tuple[int, str, dict]]:
+    """
+    Yields (original index, path, result) as analyses complete.
+    With a `cache`, unchanged files are answered from it and only new/changed files are analyzed.
+    `jobs > 1` spreads chunked work units over a spawn-context process pool.
+    """
+    pending: List[Tuple[int, str]] = []
+    for index, file_path in enumerate(file_paths):
+        validated_path, error = _validate_file(Path(file_path))
+        if error:
+            yield index, validated_path, {"error": error}
+            continue
+        cached = cache.get(validated_path) if cache is not None else None
+        if cached is not None:
+            yield index, validated_path, cached
+        else:
+            pending.append((index, validated_path))
+
+    for index, validated_path, result in _analyze_pending(pending, jobs, chunk_size):
+        # Only this (parent) process writes to the cache.
+        if cache is not None:
+            cache.put(validated_path, result)
+        yield index, validated_path, result
+
+
+def _analyze_pending(
+    pending: List[Tuple[int, str]], jobs: int, chunk_size: Optional[int]
+) -> Iterator[Tuple[int, str, dict]]:
+    if jobs <= 1 or len(pending) <= 1:
+        for index, validated_path in pending:
+            yield index, validated_path, _analyze_path(validated_path)
+        return
+
+    jobs = min(jobs, len(pending))
+    size = chunk_size or _default_chunk_size(len(pending), jobs)
+    units = [pending[i:i + size] for i in range(0, len(pending), size)]
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=ctx, initializer=_warm_up_worker) as pool:
+        futures = {pool.submit(_analyze_work_unit, unit): unit for unit in units}
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                unit = futures.pop(future)
+                try:
+                    rows = future.result()
+                except Exception as exc:  # noqa: BLE001 - e.g. a worker process died
+                    rows = [(index, path, {"error": str(exc)}) for index, path in unit]
+                yield from rows
+
+
+class _ProgressReporter:
+    """Prints `[done/total] rate ETA` lines to stderr."""
+
+    def __init__(self, total: int, stream=None):
+        self.total = total
+        self.done = 0
+        self.stream = stream or sys.stderr
+        self._started = time.monotonic()
+
+    def step(self, path: str) -> None:
+        self.done += 1
+        elapsed = max(1e-6, time.monotonic() - self._started)
+        rate = self.done / elapsed
+        remaining = (self.total - self.done) / rate if rate > 0 else 0.0
+        eta = time.strftime("%H:%M:%S", time.gmtime(remaining))
+        print(
+            f"[{self.done}/{self.total}] {rate:.2f} files/s ETA {eta}  {Path(path).name}",
+            file=self.stream,
+            flush=True,
+        )
+
+
 def _format_result(result: dict) -> str:
     if "error" in result:
         return f"!!! ERROR: {result['error']}"
@@ -224,67 +419,140 @@ def _build_parser() -> argparse.ArgumentParser:
         "--output",
         help="Write results to a specified CSV file.",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes for analysis (0 = all CPU cores). Default: 1.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Re-analyze every file instead of reusing cached results for unchanged files.",
+    )
+    parser.add_argument(
+        "--cache-path",
+        help="SQLite analysis cache location (default: analysis_cache.sqlite3 in the user config dir).",
+    )
+    parser.add_argument(
+        "--store",
+        nargs="?",
+        const=str(default_store_dir()),
+        help="Add results to the columnar feature store in this directory (default: feature_store in the user config dir).",
+    )
     return parser
 
 
+CSV_FIELDNAMES = [
+    "index",
+    "file_path",
+    "file_name",
+    "bpm",
+    "key_technical",
+    "key_camelot",
+    "valence",
+    "mood_detailed",
+    "spectral_centroid",
+    "rms_energy",
+    "loudness_db",
+    "loudness_lufs",
+    "error",
+]
+
+
+def _result_row(index: int, file_path: str, result: dict) -> dict:
+    return {
+        "index": index,
+        "file_path": file_path,
+        "file_name": result.get("file_name", ""),
+        "bpm": result.get("bpm", ""),
+        "key_technical": result.get("key_technical", ""),
+        "key_camelot": result.get("key_camelot", ""),
+        "valence": result.get("valence", ""),
+        "mood_detailed": result.get("mood_detailed", ""),
+        "spectral_centroid": result.get("spectral_centroid", ""),
+        "rms_energy": result.get("rms_energy", ""),
+        "loudness_db": result.get("loudness_db", ""),
+        "loudness_lufs": result.get("loudness_lufs", ""),
+        "error": result.get("error", ""),
+    }
+
+
 def _write_results_csv(destination: Path, analysis_results: List[Tuple[str, dict]]) -> None:
     destination.parent.mkdir(parents=True, exist_ok=True)
 
-    fieldnames = [
-        "file_path",
-        "file_name",
-        "bpm",
-        "key_technical",
-        "key_camelot",
-        "valence",
-        "mood_detailed",
-        "error",
-    ]
-
     with destination.open("w", newline="", encoding="utf-8") as csv_file:
-        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+        writer = csv.DictWriter(csv_file, fieldnames=CSV_FIELDNAMES)
         writer.writeheader()
-        for file_path, result in analysis_results:
-            row = {
-                "file_path": file_path,
-                "file_name": result.get("file_name", ""),
-                "bpm": result.get("bpm", ""),
-                "key_technical": result.get("key_technical", ""),
-                "key_camelot": result.get("key_camelot", ""),
-                "valence": result.get("valence", ""),
-                "mood_detailed": result.get("mood_detailed", ""),
-                "error": result.get("error", ""),
-            }
-            writer.writerow(row)
+        for index, (file_path, result) in enumerate(analysis_results):
+            writer.writerow(_result_row(index, file_path, result))
 
 
 def main(argv: Optional[Iterable[str]] = None) -> int:
     parser = _build_parser()
     args = parser.parse_args(list(argv) if argv is not None else None)
-
-    analysis_results = analyze_audio_files(args.paths)
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
 
     successes = 0
     failures = 0
+    write_failed = False
+    indexed_results: List[Tuple[int, str, dict]] = []
 
-    for _, result in analysis_results:
-        print(_format_result(result))
-        if "error" in result:
-            failures += 1
-        else:
-            successes += 1
+    csv_file = None
+    writer = None
+    output_path = Path(args.output) if args.output else None
+    if output_path:
+        try:
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            csv_file = output_path.open("w", newline="", encoding="utf-8")
+            writer = csv.DictWriter(csv_file, fieldnames=CSV_FIELDNAMES)
+            writer.writeheader()
+        except OSError as exc:
+            print(f"\n!!! Could not save results: {exc}", file=sys.stderr)
+            write_failed = True
 
-    write_failed = False
-    if args.output:
-        output_path = Path(args.output)
+    cache = None if args.no_cache else AnalysisCache(ANALYZER_VERSION, Path(args.cache_path) if args.cache_path else None)
+    progress = _ProgressReporter(len(args.paths))
+    try:
+        # Rows are streamed in completion order; the `index` column keeps the input order.
+        for index, file_path, result in iter_analysis_results(args.paths, jobs=jobs, cache=cache):
+            indexed_results.append((index, file_path, result))
+            progress.step(file_path)
+            print(_format_result(result))
+            if "error" in result:
+                failures += 1
+            else:
+                successes += 1
+            if writer is not None:
+                writer.writerow(_result_row(index, file_path, result))
+                csv_file.flush()
+    finally:
+        if csv_file is not None:
+            csv_file.close()
+        if cache is not None:
+            cache.close()
+
+    indexed_results.sort(key=lambda item: item[0])
+    if output_path and not write_failed:
         try:
-            _write_results_csv(output_path, analysis_results)
-            save_analysis_to_json(output_path, analysis_results[0][1], output_path.with_suffix('.json'))
+            save_analysis_to_json(
+                [(file_path, result) for _, file_path, result in indexed_results],
+                output_path.with_suffix('.json'),
+            )
             print(f"\nResults have been saved to: {output_path}")
         except OSError as exc:
             print(f"\n!!! Could not save results: {exc}", file=sys.stderr)
             write_failed = True
 
+    if args.store:
+        try:
+            stored = update_feature_store(Path(args.store), [(p, r) for _, p, r in indexed_results])
+            print(f"Feature store updated ({stored} tracks): {args.store}")
+        except OSError as exc:
+            print(f"\n!!! Could not update feature store: {exc}", file=sys.stderr)
+            write_failed = True
+
     print("\n===== PROCESSING COMPLETE =====")
     print(f"Files successfully processed: {successes}")
     print(f"Failed files: {failures}")
@@ -293,29 +561,30 @@ def main(argv: Optional[Iterable[str]] = None) -> int:
         return 1
     return 0
 
-#function that saves camelot and bpm to a json file
-def save_analysis_to_json(file_path: str, analysis: dict, json_path: str) -> None:
-    """Saves the analysis to a JSON file."""
+def save_analysis_to_json(analysis_results: List[Tuple[str, dict]], json_path) -> None:
+    """Saves every result (input order) to a JSON list; error results keep their `error` field."""
     import json
 
-    data_to_save = {
-        "file_name": analysis.get("file_name", ""),
-        "bpm": analysis.get("bpm", ""),
-        "key_camelot": analysis.get("key_camelot", ""),
-        "mood_detailed": analysis.get("mood_detailed", "")
-    }
+    data_to_save = []
+    for index, (file_path, result) in enumerate(analysis_results):
+        row = _result_row(index, file_path, result)
+        data_to_save.append({key: value for key, value in row.items() if value != ""})
 
     with open(json_path, 'w', encoding='utf-8') as json_file:
         json.dump(data_to_save, json_file, ensure_ascii=False, indent=4)
 
 
-if __name__ == "__main__":
-    sys.exit(main())
-
-
-
-
-
-
+def update_feature_store(directory: Path, analysis_results: List[Tuple[str, dict]]) -> int:
+    """Upserts successful results (keyed by absolute path) into the feature store at `directory`."""
+    store = FeatureStore.load(directory)
+    if store.analyzer_version and store.analyzer_version != ANALYZER_VERSION:
+        # Features from another analyzer version are not comparable; start over.
+        store = FeatureStore()
+    store.analyzer_version = ANALYZER_VERSION
+    stored = store.upsert_many((os.path.abspath(path), result) for path, result in analysis_results)
+    store.save(directory)
+    return stored
 
 
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Online tempo/key/energy estimator for live (meeting) audio.
+
+Fed with small interleaved int16 PCM blocks (the 20 ms LiveMixer blocks), it keeps
+only running state, so each block costs O(block length):
+
+- tempo: mel spectral-flux onset strength per short frame, folded into an exponentially
+  decaying autocorrelation; candidate tempi (60-200 BPM) are scored over several beat
+  periods with a log-normal prior around 120 BPM
+- key: pitch-class profile of long frames, exponentially smoothed, scored against
+  the 24 key templates of `librosa_cli`. Only spectral peaks count (window leakage
+  around a loud bass note would otherwise land on its neighbouring semitones), and
+  their magnitudes are log-compressed so the bass root and its overtones do not drown
+  out the third that tells minor from major
+- energy: short- and long-term mean-square level (loudness and its trend)
+
+An estimate is published every `publish_seconds` of audio.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Callable, Dict, Optional
+
+import librosa
+import numpy as np
+
+from mood_readers.librosa_cli import estimate_key, get_camelot_code, get_detailed_mood
+
+MIN_BPM = 60.0
+MAX_BPM = 200.0
+# Tempo prior: log-normal around 120 BPM with a one-octave deviation (as librosa.beat).
+PRIOR_BPM = 120.0
+# Candidate tempi are scored by the autocorrelation at 1..TEMPO_HARMONICS beat periods (weighted 1/k).
+TEMPO_HARMONICS = 4
+BPM_STEP = 0.5
+CHROMA_MIN_HZ = 80.0
+CHROMA_MAX_HZ = 4000.0
+# Peak magnitudes are mapped to log1p(CHROMA_COMPRESSION * magnitude / frame maximum).
+CHROMA_COMPRESSION = 100.0
+SILENCE_RMS = 1e-4
+ONSET_MELS = 64
+ENERGY_TREND_DB = 3.0
+
+
+class LiveMoodEstimator:
+    """Incremental mood estimate over a stream of interleaved int16 PCM blocks."""
+
+    def __init__(
+        self,
+        sample_rate: int = 48000,
+        channels: int = 2,
+        *,
+        publish_seconds: float = 4.0,
+        warmup_seconds: float = 4.0,
+        tempo_memory_seconds: float = 8.0,
+        key_memory_seconds: float = 10.0,
+        on_estimate: Optional[Callable[[Dict], None]] = None,
+    ):
+        self.sample_rate = int(sample_rate)
+        self.channels = max(1, int(channels))
+        self.publish_seconds = float(publish_seconds)
+        self.warmup_seconds = float(warmup_seconds)
+        self._on_estimate = on_estimate
+        self._lock = threading.Lock()
+        self._latest: Optional[Dict] = None
+
+        # Onset frames (~43 ms window, ~11 ms hop) and chroma frames (~4x longer window for bass resolution).
+        self._onset_fft = 1 << int(np.ceil(np.log2(self.sample_rate * 0.04)))
+        self._onset_hop = self._onset_fft // 4
+        self._chroma_fft = self._onset_fft * 4
+        self._chroma_hop = self._onset_fft
+        self._onset_window = np.hanning(self._onset_fft).astype(np.float32)
+        self._mel = librosa.filters.mel(sr=self.sample_rate, n_fft=self._onset_fft, n_mels=ONSET_MELS)
+        self._chroma_window = np.hanning(self._chroma_fft).astype(np.float32)
+        self.frame_rate = self.sample_rate / self._onset_hop
+
+        self._bpm_grid = np.arange(MIN_BPM, MAX_BPM + BPM_STEP / 2, BPM_STEP)
+        self._tempo_prior = np.exp(-0.5 * np.log2(self._bpm_grid / PRIOR_BPM) ** 2)
+        beat_lags = 60.0 * self.frame_rate / self._bpm_grid
+        multiples = np.arange(1, TEMPO_HARMONICS + 1)[:, None]
+        self._nearest_lags = np.rint(beat_lags[None, :] * multiples).astype(int)
+        self._harmonic_weights = 1.0 / np.arange(1, TEMPO_HARMONICS + 1)
+        self._max_lag = int(self._nearest_lags.max()) + 1
+        self._onset_decay = float(np.exp(-1.0 / (tempo_memory_seconds * self.frame_rate)))
+        self._chroma_decay = float(np.exp(-self._chroma_hop / (key_memory_seconds * self.sample_rate)))
+        self._pitch_classes = self._pitch_class_matrix()
+
+        self.reset()
+
+    def reset(self) -> None:
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._buffer_start = 0  # absolute sample index of _buffer[0]
+        self._samples_seen = 0
+        self._onset_pos = 0
+        self._chroma_pos = 0
+        self._prev_mel_db: Optional[np.ndarray] = None
+        self._onset_mean = 0.0
+        self._onset_history = np.zeros(self._max_lag, dtype=np.float64)
+        self._acf = np.zeros(self._max_lag + 1, dtype=np.float64)
+        self._chroma = np.zeros(12, dtype=np.float64)
+        self._power_short = 0.0
+        self._power_long = 0.0
+        self._next_publish = int(max(self.warmup_seconds, self.publish_seconds) * self.sample_rate)
+        with self._lock:
+            self._latest = None
+
+    def latest(self) -> Optional[Dict]:
+        """Most recently published estimate (None until enough audio has been seen)."""
+        with self._lock:
+            return dict(self._latest) if self._latest else None
+
+    # --- streaming ---
+
+    def push_pcm(self, block) -> Optional[Dict]:
+        """
+        Consumes one block of interleaved int16 PCM (bytes or ndarray).
+        Returns the estimate if this block triggered a publish, else None.
+        """
+        samples = np.frombuffer(block, dtype=np.int16) if isinstance(block, (bytes, bytearray, memoryview)) else np.asarray(block)
+        if samples.size == 0:
+            return None
+        frames = samples.reshape(-1, self.channels) if samples.ndim == 1 else samples
+        mono = frames.astype(np.float32).mean(axis=1) / 32768.0
+
+        self._update_energy(mono)
+        self._buffer = np.concatenate((self._buffer, mono))
+        self._samples_seen += mono.size
+        self._process_onset_frames()
+        self._process_chroma_frames()
+        self._trim_buffer()
+
+        if self._samples_seen < self._next_publish:
+            return None
+        self._next_publish = self._samples_seen + int(self.publish_seconds * self.sample_rate)
+        estimate = self.estimate()
+        with self._lock:
+            self._latest = estimate
+        if self._on_estimate is not None:
+            try:
+                self._on_estimate(dict(estimate))
+            except Exception as exc:  # noqa: BLE001
+                print(f"[LiveMoodEstimator] estimate callback failed: {exc}")
+        return estimate
+
+    def estimate(self) -> Dict:
+        """Current tempo/key/energy estimate from the running state."""
+        rms = float(np.sqrt(self._power_short))
+        silent = rms < SILENCE_RMS
+        bpm = 0 if silent else self._tempo()
+        key, is_major = ("Unknown", False) if silent else estimate_key(self._chroma)
+        trend_db = 10.0 * np.log10(max(self._power_short, 1e-12) / max(self._power_long, 1e-12))
+        if trend_db > ENERGY_TREND_DB:
+            trend = "rising"
+        elif trend_db < -ENERGY_TREND_DB:
+            trend = "falling"
+        else:
+            trend = "steady"
+        return {
+            "bpm": bpm,
+            "key_technical": key,
+            "key_camelot": get_camelot_code(key),
+            "valence": "Positive (Major)" if is_major else "Negative (Minor)",
+            "mood_detailed": get_detailed_mood(bpm, is_major),
+            "rms_energy": round(rms, 6),
+            "loudness_db": round(float(10.0 * np.log10(max(self._power_short, 1e-12))), 2),
+            "energy_trend": trend,
+            "seconds": round(self._samples_seen / self.sample_rate, 2),
+        }
+
+    # --- internals ---
+
+    def _pitch_class_matrix(self) -> np.ndarray:
+        freqs = np.fft.rfftfreq(self._chroma_fft, 1.0 / self.sample_rate)
+        matrix = np.zeros((12, freqs.size), dtype=np.float32)
+        band = (freqs >= CHROMA_MIN_HZ) & (freqs <= CHROMA_MAX_HZ)
+        # MIDI pitch class (C = 0) of every bin in the band.
+        pcs = np.mod(np.round(12.0 * np.log2(freqs[band] / 440.0) + 69.0), 12).astype(int)
+        matrix[pcs, np.flatnonzero(band)] = 1.0
+        return matrix
+
+    def _frames(self, pos: int, n_fft: int, hop: int, window: np.ndarray):
+        """Windowed frames starting at absolute sample `pos`; returns (frames, next_pos)."""
+        offset = pos - self._buffer_start
+        available = self._buffer.size - offset
+        if available < n_fft:
+            return None, pos
+        count = (available - n_fft) // hop + 1
+        view = np.lib.stride_tricks.sliding_window_view(self._buffer[offset:], n_fft)[::hop][:count]
+        return view * window, pos + count * hop
+
+    def _process_onset_frames(self) -> None:
+        frames, self._onset_pos = self._frames(self._onset_pos, self._onset_fft, self._onset_hop, self._onset_window)
+        if frames is None:
+            return
+        mel_db = 10.0 * np.log10(np.abs(np.fft.rfft(frames, axis=1)) ** 2 @ self._mel.T + 1e-10)
+        previous = mel_db[:1] if self._prev_mel_db is None else self._prev_mel_db[None, :]
+        flux = np.maximum(0.0, np.diff(np.vstack((previous, mel_db)), axis=0)).mean(axis=1)
+        self._prev_mel_db = mel_db[-1]
+
+        # Remove the slowly varying onset level so the autocorrelation sees periodicity only.
+        onsets = np.empty_like(flux)
+        for i, value in enumerate(flux):
+            self._onset_mean += 0.01 * (value - self._onset_mean)
+            onsets[i] = value - self._onset_mean
+
+        history = np.concatenate((self._onset_history, onsets))
+        n = onsets.size
+        # windows[i, lag] = onset value `lag` frames before new onset i.
+        windows = np.lib.stride_tricks.sliding_window_view(history, self._max_lag + 1)[-n:, ::-1]
+        weights = self._onset_decay ** np.arange(n - 1, -1, -1)
+        self._acf = self._acf * self._onset_decay ** n + (weights * onsets) @ windows
+        self._onset_history = history[-self._max_lag:]
+
+    def _process_chroma_frames(self) -> None:
+        frames, self._chroma_pos = self._frames(self._chroma_pos, self._chroma_fft, self._chroma_hop, self._chroma_window)
+        if frames is None:
+            return
+        magnitude = np.abs(np.fft.rfft(frames, axis=1))
+        peaks = np.zeros_like(magnitude)
+        is_peak = (magnitude[:, 1:-1] >= magnitude[:, :-2]) & (magnitude[:, 1:-1] > magnitude[:, 2:])
+        peaks[:, 1:-1] = np.where(is_peak, magnitude[:, 1:-1], 0.0)
+        top = peaks.max(axis=1, keepdims=True)
+        peaks = np.log1p(CHROMA_COMPRESSION * np.divide(peaks, top, out=np.zeros_like(peaks), where=top > 0))
+        chroma = peaks @ self._pitch_classes.T
+        peaks = chroma.max(axis=1, keepdims=True)
+        chroma = np.divide(chroma, peaks, out=np.zeros_like(chroma), where=peaks > 0)
+        n = chroma.shape[0]
+        weights = (1.0 - self._chroma_decay) * self._chroma_decay ** np.arange(n - 1, -1, -1)
+        self._chroma = self._chroma * self._chroma_decay ** n + weights @ chroma
+
+    def _update_energy(self, mono: np.ndarray) -> None:
+        power = float(np.mean(mono.astype(np.float64) ** 2))
+        for attr, tau in (("_power_short", 1.5), ("_power_long", 15.0)):
+            decay = np.exp(-mono.size / (tau * self.sample_rate))
+            setattr(self, attr, getattr(self, attr) * decay + power * (1.0 - decay))
+
+    def _trim_buffer(self) -> None:
+        keep_from = min(self._onset_pos, self._chroma_pos) - self._buffer_start
+        if keep_from > 0:
+            self._buffer = self._buffer[keep_from:]
+            self._buffer_start += keep_from
+
+    def _tempo(self) -> int:
+        # Beat periods are fractional lags whose peak spreads over neighbouring frames, so the
+        # autocorrelation is summed over a 3-lag window around the nearest lag.
+        smoothed = np.convolve(self._acf, np.ones(3), mode="same")
+        comb = self._harmonic_weights @ smoothed[self._nearest_lags]
+        scores = comb * self._tempo_prior
+        best = int(np.argmax(scores))
+        if scores[best] <= 0:
+            return 0
+        return int(round(self._bpm_grid[best]))
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Regenerates the mood playlist map (`mood_playlists_organized.json`) from the feature store.
+
+Every stored track is placed in the nearest of the app's mood buckets in one vectorized
+pass over (valence, arousal, energy, brightness) derived from key mode, BPM, loudness
+and spectral centroid. The map is written atomically next to a small state file holding
+one feature fingerprint per track, so `--incremental` only re-buckets new or changed tracks.
+
+    python3 mood_readers/librosa_cli.py --store music/*.mp3
+    python3 mood_readers/playlist_tagger.py                 # full re-tag into the user config dir
+    python3 mood_readers/playlist_tagger.py --incremental -o mood_playlists_organized.json
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from mood_readers.feature_store import FeatureStore, default_store_dir
+
+PLAYLIST_FILE = "mood_playlists_organized.json"
+BUNDLED_PLAYLIST_PATH = Path(__file__).resolve().parent / "data" / PLAYLIST_FILE
+STATE_SUFFIX = ".state.json"
+
+# Bucket key (as used by MainUI) -> prototype (valence, arousal, energy, brightness), each in [-1, 1].
+MOOD_PROTOTYPES = {
+    "😊 positive": (1.0, 0.5, 0.4, 0.3),
+    "😐 neutral": (0.3, 0.0, 0.0, 0.0),
+    "😠 tense": (-1.0, 0.8, 0.8, 0.5),
+    "😴 unfocused": (0.2, -0.8, -0.6, -0.3),
+    "🤝 collaborative": (0.6, 0.2, 0.0, -0.2),
+    "💡 creative": (0.6, -0.3, -0.3, 0.5),
+    "📉 unproductive": (-0.3, -0.6, -0.8, -0.6),
+    "😢 melancholic": (-1.0, 0.1, -0.2, -0.2),
+    "😢 nostalgic": (-0.4, -0.3, -0.3, 0.0),
+    "😢 sad": (-1.0, -0.8, -0.5, -0.4),
+}
+MOOD_BUCKETS = tuple(MOOD_PROTOTYPES)
+_PROTOTYPES = np.array([MOOD_PROTOTYPES[m] for m in MOOD_BUCKETS], dtype=np.float32)
+
+# Feature scaling: value -> clip((value - centre) / spread, -1, 1).
+AROUSAL_BPM = (110.0, 40.0)
+ENERGY_DB = (-16.0, 8.0)
+BRIGHTNESS_HZ = (2000.0, 1500.0)
+
+
+def default_playlist_path() -> Path:
+    """Writable location of the regenerated map (user config dir)."""
+    try:
+        from ui_ux_team.blue_ui.config.runtime_paths import user_config_dir
+    except ModuleNotFoundError:
+        return BUNDLED_PLAYLIST_PATH
+    return user_config_dir() / PLAYLIST_FILE
+
+
+def active_playlist_path(bundled: Optional[Path] = None) -> Path:
+    """The regenerated map when one exists, else the bundled (hand-maintained) one."""
+    generated = default_playlist_path()
+    if generated.exists():
+        return generated
+    return Path(bundled) if bundled is not None else BUNDLED_PLAYLIST_PATH
+
+
+def _scaled(column: np.ndarray, centre_spread) -> np.ndarray:
+    centre, spread = centre_spread
+    values = np.clip((column.astype(np.float32) - centre) / spread, -1.0, 1.0)
+    return np.nan_to_num(values, nan=0.0)  # unknown feature -> neutral
+
+
+def mood_coordinates(store: FeatureStore, rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """(len(rows), 4) valence/arousal/energy/brightness coordinates for store rows."""
+    rows = np.arange(len(store)) if rows is None else np.asarray(rows, dtype=np.int64)
+    key = store.column("key_index")[rows]
+    valence = np.where(key < 0, 0.0, np.where(key < 12, 1.0, -1.0)).astype(np.float32)
+    bpm = store.column("bpm")[rows].astype(np.float32)
+    bpm = np.where(bpm > 0, bpm, np.nan)
+    return np.column_stack((
+        valence,
+        _scaled(bpm, AROUSAL_BPM),
+        _scaled(store.column("loudness_db")[rows], ENERGY_DB),
+        _scaled(store.column("spectral_centroid")[rows], BRIGHTNESS_HZ),
+    ))
+
+
+def classify_rows(store: FeatureStore, rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """Index into MOOD_BUCKETS of the nearest prototype for each row."""
+    coords = mood_coordinates(store, rows)
+    if coords.shape[0] == 0:
+        return np.zeros(0, dtype=np.int64)
+    distances = ((coords[:, None, :] - _PROTOTYPES[None, :, :]) ** 2).sum(axis=2)
+    return np.argmin(distances, axis=1)
+
+
+def feature_fingerprints(store: FeatureStore) -> Dict[str, str]:
+    """Path -> short hash of the features that drive classification."""
+    names = ("key_index", "bpm", "loudness_db", "spectral_centroid")
+    columns = [np.ascontiguousarray(store.column(name)) for name in names]
+    prints = {}
+    for row, path in enumerate(store.paths()):
+        digest = hashlib.blake2b(digest_size=8)
+        for column in columns:
+            digest.update(column[row].tobytes())
+        prints[path] = digest.hexdigest()
+    return prints
+
+
+def build_playlist_map(
+    store: FeatureStore,
+    previous: Optional[Dict[str, List[str]]] = None,
+    previous_prints: Optional[Dict[str, str]] = None,
+):
+    """
+    Returns (playlist map, fingerprints, re-bucketed count).
+    With `previous` and `previous_prints`, tracks whose fingerprint is unchanged keep their
+    bucket, only new/changed tracks are classified, and entries for tracks that are no
+    longer in the store but were generated before are dropped; other (hand-added) entries stay.
+    """
+    prints = feature_fingerprints(store)
+    paths = store.paths()
+    playlists: Dict[str, List[str]] = {mood: [] for mood in MOOD_BUCKETS}
+
+    incremental = previous is not None and previous_prints is not None
+    if incremental:
+        for mood, entries in previous.items():
+            kept = playlists.setdefault(mood, [])
+            for entry in entries if isinstance(entries, list) else []:
+                if entry in prints:
+                    if previous_prints.get(entry) == prints[entry]:
+                        kept.append(entry)
+                elif entry not in previous_prints:
+                    kept.append(entry)
+        placed = {entry for entries in playlists.values() for entry in entries}
+        stale = np.array([i for i, p in enumerate(paths) if p not in placed], dtype=np.int64)
+    else:
+        stale = np.arange(len(paths), dtype=np.int64)
+
+    for row, bucket in zip(stale, classify_rows(store, stale)):
+        playlists[MOOD_BUCKETS[int(bucket)]].append(paths[int(row)])
+    for entries in playlists.values():
+        entries.sort(key=lambda p: (Path(p).name.lower(), p))
+    return playlists, prints, int(stale.size)
+
+
+def _state_path(output: Path) -> Path:
+    return output.with_name(output.name + STATE_SUFFIX)
+
+
+def _read_json(path: Path) -> Optional[dict]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def write_json_atomic(path: Path, data) -> None:
+    """Writes JSON via a temp file in the same directory and os.replace (never half-written)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=path.name, dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump(data, handle, ensure_ascii=False, indent=4)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def retag(store_dir: Path, output: Path, incremental: bool = False) -> Dict:
+    """Regenerates `output` from the store at `store_dir`; returns a small summary."""
+    store = FeatureStore.load(store_dir)
+    previous = previous_prints = None
+    if incremental:
+        previous = _read_json(output)
+        state = _read_json(_state_path(output))
+        previous_prints = (state or {}).get("fingerprints")
+        if previous is None or not isinstance(previous_prints, dict):
+            previous = previous_prints = None  # nothing to build on: full pass
+    playlists, prints, rebucketed = build_playlist_map(store, previous, previous_prints)
+    write_json_atomic(output, playlists)
+    write_json_atomic(_state_path(output), {"fingerprints": prints})
+    return {
+        "tracks": len(store),
+        "rebucketed": rebucketed,
+        "buckets": {mood: len(entries) for mood, entries in playlists.items()},
+    }
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Regenerate mood_playlists_organized.json from the analysis feature store."
+    )
+    parser.add_argument(
+        "--store",
+        default=str(default_store_dir()),
+        help="Feature store directory written by librosa_cli --store (default: user config dir).",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=str(default_playlist_path()),
+        help="Playlist map to write (default: mood_playlists_organized.json in the user config dir).",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Keep buckets of unchanged tracks and only classify new or changed ones.",
+    )
+    return parser
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    args = _build_parser().parse_args(list(argv) if argv is not None else None)
+    try:
+        summary = retag(Path(args.store), Path(args.output), incremental=args.incremental)
+    except OSError as exc:
+        print(f"!!! Could not write playlist map: {exc}", file=sys.stderr)
+        return 1
+    if summary["tracks"] == 0:
+        print(f"No analysed tracks in feature store: {args.store}", file=sys.stderr)
+    for mood, count in summary["buckets"].items():
+        print(f"  {mood}: {count}")
+    print(f"Re-bucketed {summary['rebucketed']} of {summary['tracks']} tracks -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Multi-resolution waveform overviews (min/max/RMS per bucket) for the playback timeline.
+
+A track is decoded once to mono at OVERVIEW_SR. Level 0 holds one (min, max, rms) row per
+BASE_BUCKET samples, and each further level halves the bucket count (min of mins, max of
+maxes, RMS of the pair) until MIN_BUCKETS is reached. Overviews are stored as .npz files
+next to the analysis cache, named by the file's partial content hash, so moved tracks
+reuse them. `WaveformOverviewStore.request` loads or computes one on a background worker.
+Drawing only picks the coarsest level that still has a bucket per pixel (`level_for`).
+"""
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import miniaudio
+import numpy as np
+
+from mood_readers.analysis_cache import default_cache_path, partial_content_hash
+
+OVERVIEW_VERSION = "1"
+OVERVIEW_SR = 11025
+BASE_BUCKET = 256  # samples per level-0 bucket (~23 ms)
+MIN_BUCKETS = 64
+MEMORY_ENTRIES = 16
+
+
+def default_overview_dir() -> Path:
+    return default_cache_path().parent / "waveforms"
+
+
+class WaveformOverview:
+    """Mipmapped (min, max, rms) levels in -1..1; `levels[0]` is the finest."""
+
+    def __init__(self, levels: List[np.ndarray], duration_seconds: float):
+        self.levels = levels
+        self.duration_seconds = float(duration_seconds)
+
+    def level_for(self, width: int) -> np.ndarray:
+        """Coarsest level with at least `width` buckets (the finest one if none has enough)."""
+        for level in reversed(self.levels):
+            if level.shape[0] >= width:
+                return level
+        return self.levels[0]
+
+    def columns(self, width: int):
+        """(min, max, rms) arrays with exactly `width` entries, reduced from `level_for(width)`."""
+        level = self.level_for(width).astype(np.float32)
+        width = max(1, int(width))
+        starts = (np.arange(width) * level.shape[0]) // width
+        lows = np.minimum.reduceat(level[:, 0], starts)
+        highs = np.maximum.reduceat(level[:, 1], starts)
+        rms = np.maximum.reduceat(level[:, 2], starts)
+        return lows, highs, rms
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as handle:
+            np.savez(
+                handle,
+                version=np.array(OVERVIEW_VERSION),
+                duration=np.array(self.duration_seconds),
+                **{f"level_{i}": level for i, level in enumerate(self.levels)},
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["WaveformOverview"]:
+        try:
+            with np.load(str(path)) as data:
+                if str(data["version"]) != OVERVIEW_VERSION:
+                    return None
+                count = sum(1 for name in data.files if name.startswith("level_"))
+                levels = [data[f"level_{i}"] for i in range(count)]
+                return cls(levels, float(data["duration"]))
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def build_levels(samples: np.ndarray) -> List[np.ndarray]:
+    """Mip levels for mono float samples in -1..1."""
+    buckets = max(1, -(-samples.size // BASE_BUCKET))
+    padded = np.zeros(buckets * BASE_BUCKET, dtype=np.float32)
+    padded[: samples.size] = samples
+    blocks = padded.reshape(buckets, BASE_BUCKET)
+    level = np.stack(
+        (blocks.min(axis=1), blocks.max(axis=1), np.sqrt(np.mean(np.square(blocks), axis=1))), axis=1
+    )
+    levels = [level]
+    while level.shape[0] >= 2 * MIN_BUCKETS:
+        even = level[: level.shape[0] // 2 * 2].reshape(-1, 2, 3)
+        level = np.stack(
+            (
+                even[:, :, 0].min(axis=1),
+                even[:, :, 1].max(axis=1),
+                np.sqrt(np.mean(np.square(even[:, :, 2]), axis=1)),
+            ),
+            axis=1,
+        )
+        levels.append(level)
+    return [lvl.astype(np.float16) for lvl in levels]
+
+
+def compute_overview(path: str) -> WaveformOverview:
+    decoded = miniaudio.decode_file(
+        str(path), output_format=miniaudio.SampleFormat.SIGNED16, nchannels=1, sample_rate=OVERVIEW_SR
+    )
+    samples = np.frombuffer(decoded.samples, dtype=np.int16).astype(np.float32) / 32768.0
+    return WaveformOverview(build_levels(samples), samples.size / float(OVERVIEW_SR))
+
+
+class WaveformOverviewStore:
+    """Disk + small in-memory cache of overviews; computation runs on one background thread."""
+
+    def __init__(self, directory: Optional[Path] = None):
+        self.directory = Path(directory) if directory else default_overview_dir()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[tuple, WaveformOverview]" = OrderedDict()
+
+    def _file_for(self, path: str) -> Path:
+        return self.directory / f"{partial_content_hash(path)[:32]}.npz"
+
+    def load_or_compute(self, path: str) -> Optional[WaveformOverview]:
+        path = os.path.abspath(str(path))
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = (path, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        try:
+            target = self._file_for(path)
+            overview = WaveformOverview.load(target) if target.exists() else None
+            if overview is None:
+                overview = compute_overview(path)
+                overview.save(target)
+        except Exception as exc:
+            print(f"WaveformOverviewStore: failed for {path}: {exc}")
+            return None
+        with self._lock:
+            self._memory[key] = overview
+            while len(self._memory) > MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+        return overview
+
+    def request(self, path: str, callback: Callable[[str, WaveformOverview], None]) -> Future:
+        """Loads or computes in the background, then calls `callback(path, overview)` on that thread."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="WaveformOverview")
+            executor = self._executor
+
+        def job():
+            overview = self.load_or_compute(path)
+            if overview is not None:
+                callback(str(path), overview)
+            return overview
+
+        return executor.submit(job)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -13,9 +13,13 @@ _STATE_DAY_BUCKET_KEY = "api_usage_state_day_bucket"
 _STATE_DAY_COUNT_KEY = "api_usage_state_day_count"
 _STATE_MONTH_BUCKET_KEY = "api_usage_state_month_bucket"
 _STATE_MONTH_SPEND_USD_KEY = "api_usage_state_month_spend_usd"
+_STATE_MONTH_CACHED_INPUT_TOKENS_KEY = "api_usage_state_month_cached_input_tokens"
+_STATE_MONTH_FRESH_INPUT_TOKENS_KEY = "api_usage_state_month_fresh_input_tokens"
 
 _DEFAULT_INPUT_PRICE_PER_1M = 0.35
 _DEFAULT_OUTPUT_PRICE_PER_1M = 1.05
+# Cached-content input tokens are billed at a fraction of the regular input price.
+_CACHED_INPUT_PRICE_RATIO = 0.25
 
 _MODEL_PRICES_USD_PER_1M: dict[str, tuple[float, float]] = {
     "gemini-2.5-flash-lite": (0.10, 0.40),
@@ -78,6 +82,8 @@ def _normalized_state(now: datetime) -> dict[str, Any]:
         "day_count": _as_int(get_setting(_STATE_DAY_COUNT_KEY, 0), 0),
         "month_bucket": str(get_setting(_STATE_MONTH_BUCKET_KEY, month_key) or ""),
         "month_spend_usd": round(_as_float(get_setting(_STATE_MONTH_SPEND_USD_KEY, 0.0), 0.0), 6),
+        "month_cached_input_tokens": _as_int(get_setting(_STATE_MONTH_CACHED_INPUT_TOKENS_KEY, 0), 0),
+        "month_fresh_input_tokens": _as_int(get_setting(_STATE_MONTH_FRESH_INPUT_TOKENS_KEY, 0), 0),
     }
 
     if state["minute_bucket"] != minute_key:
@@ -89,6 +95,8 @@ def _normalized_state(now: datetime) -> dict[str, Any]:
     if state["month_bucket"] != month_key:
         state["month_bucket"] = month_key
         state["month_spend_usd"] = 0.0
+        state["month_cached_input_tokens"] = 0
+        state["month_fresh_input_tokens"] = 0
     return state
 
 
@@ -99,36 +107,50 @@ def _persist_state(state: Mapping[str, Any]) -> None:
     set_setting(_STATE_DAY_COUNT_KEY, int(state["day_count"]))
     set_setting(_STATE_MONTH_BUCKET_KEY, str(state["month_bucket"]))
     set_setting(_STATE_MONTH_SPEND_USD_KEY, float(state["month_spend_usd"]))
+    set_setting(_STATE_MONTH_CACHED_INPUT_TOKENS_KEY, int(state.get("month_cached_input_tokens", 0)))
+    set_setting(_STATE_MONTH_FRESH_INPUT_TOKENS_KEY, int(state.get("month_fresh_input_tokens", 0)))
+
+
+def _pick_usage_count(usage: Any, names: list[str]) -> int:
+    for name in names:
+        raw = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+        if raw is None:
+            continue
+        try:
+            return max(0, int(raw))
+        except Exception:
+            continue
+    return 0
 
 
 def _extract_usage_counts(usage: Any) -> tuple[int, int]:
     if usage is None:
         return (0, 0)
 
-    def _pick(names: list[str]) -> int:
-        for name in names:
-            raw = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
-            if raw is None:
-                continue
-            try:
-                return max(0, int(raw))
-            except Exception:
-                continue
-        return 0
-
-    input_tokens = _pick(["input_token_count", "prompt_token_count", "prompt_tokens"])
-    output_tokens = _pick(["output_token_count", "candidates_token_count", "candidates_tokens"])
+    input_tokens = _pick_usage_count(usage, ["input_token_count", "prompt_token_count", "prompt_tokens"])
+    output_tokens = _pick_usage_count(usage, ["output_token_count", "candidates_token_count", "candidates_tokens"])
 
     if input_tokens == 0 and output_tokens == 0:
-        total = _pick(["total_token_count", "total_tokens"])
+        total = _pick_usage_count(usage, ["total_token_count", "total_tokens"])
         input_tokens = total
     return (input_tokens, output_tokens)
 
 
+def _extract_cached_input_tokens(usage: Any, input_tokens: int) -> int:
+    """Cached-content tokens are reported as a subset of the prompt token count."""
+    if usage is None:
+        return 0
+    cached = _pick_usage_count(usage, ["cached_content_token_count", "cached_tokens"])
+    return min(cached, input_tokens)
+
+
 def _usage_cost_usd(*, usage: Any = None, model_name: str = "") -> float:
     input_tokens, output_tokens = _extract_usage_counts(usage)
+    cached_tokens = _extract_cached_input_tokens(usage, input_tokens)
+    fresh_tokens = input_tokens - cached_tokens
     in_price, out_price = _model_prices(model_name)
-    cost = (float(input_tokens) / 1_000_000.0) * in_price
+    cost = (float(fresh_tokens) / 1_000_000.0) * in_price
+    cost += (float(cached_tokens) / 1_000_000.0) * in_price * _CACHED_INPUT_PRICE_RATIO
     cost += (float(output_tokens) / 1_000_000.0) * out_price
     return max(0.0, cost)
 
@@ -175,11 +197,19 @@ def record_usage(
     applied_cost = _usage_cost_usd(usage=usage, model_name=model_name)
     if applied_cost <= 0.0:
         applied_cost = max(0.0, float(fallback_cost_usd))
+    input_tokens, _ = _extract_usage_counts(usage)
+    cached_tokens = _extract_cached_input_tokens(usage, input_tokens)
 
     with _LOCK:
         state = _normalized_state(now)
         state["month_spend_usd"] = round(max(0.0, float(state["month_spend_usd"])) + applied_cost, 6)
+        state["month_cached_input_tokens"] += cached_tokens
+        state["month_fresh_input_tokens"] += input_tokens - cached_tokens
         _persist_state(state)
+    if cached_tokens:
+        print(
+            f"[APIUsageGuard] {scope}: {cached_tokens} cached + {input_tokens - cached_tokens} fresh input tokens"
+        )
     return applied_cost
 
 
@@ -194,4 +224,6 @@ def current_usage_state() -> dict[str, float | int | str]:
         "day_count": int(state["day_count"]),
         "month_bucket": str(state["month_bucket"]),
         "month_spend_usd": round(float(state["month_spend_usd"]), 6),
+        "month_cached_input_tokens": int(state["month_cached_input_tokens"]),
+        "month_fresh_input_tokens": int(state["month_fresh_input_tokens"]),
     }
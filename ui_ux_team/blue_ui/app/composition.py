@@ -1,10 +1,10 @@
 import json
-from pathlib import Path
 
 from architects.helpers.gemini_chatbot import GeminiChatbot
 from architects.helpers.managed_mem import ManagedMem
 from architects.helpers.resource_path import resource_path
 from architects.helpers.transcription_manager import TranscriptionManager
+from mood_readers.playlist_tagger import active_playlist_path
 from ui_ux_team.blue_ui import settings as app_settings
 from ui_ux_team.blue_ui.app.secure_api_key import (
     RUNTIME_SOURCE_DOTENV,
@@ -64,7 +64,7 @@ class AppComposer:
                 api_key = dotenv_key
         transcription = TranscriptionManager(api_key, chunk_seconds=30) if api_key else None
 
-        mood_data_path = Path(resource_path("mood_readers/data/mood_playlists_organized.json"))
+        mood_data_path = active_playlist_path(resource_path("mood_readers/data/mood_playlists_organized.json"))
         if mood_data_path.exists():
             with open(mood_data_path, "r", encoding="utf-8") as f:
                 mood_repository = json.load(f)
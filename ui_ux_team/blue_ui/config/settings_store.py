@@ -67,6 +67,13 @@ def default_config() -> dict[str, Any]:
         "api_usage_monthly_budget_usd": 5.0,
         "chatbot_model": "models/gemini-2.5-pro",
         "transcription_model": "models/gemini-2.5-flash-lite",
+        "library_auto_analyze": True,
+        "playback_crossfade_seconds": 4.0,
+        "playback_beat_align": True,
+        "playback_pcm_cache_mb": 256,
+        "playback_latency_profile": "balanced",
+        "playback_loudness_normalization": True,
+        "playback_target_lufs": -14.0,
         # Persistent usage state metrics
         "api_usage_state_minute_bucket": "",
         "api_usage_state_minute_count": 0,
@@ -74,6 +81,8 @@ def default_config() -> dict[str, Any]:
         "api_usage_state_day_count": 0,
         "api_usage_state_month_bucket": "",
         "api_usage_state_month_spend_usd": 0.0,
+        "api_usage_state_month_cached_input_tokens": 0,
+        "api_usage_state_month_fresh_input_tokens": 0,
     }
 
 
@@ -114,6 +123,34 @@ def _normalized_config(raw: dict[str, Any] | None) -> dict[str, Any]:
         if isinstance(val, str) and val.strip():
             out[key] = val.strip()
 
+    auto_analyze = raw.get("library_auto_analyze")
+    if isinstance(auto_analyze, bool):
+        out["library_auto_analyze"] = auto_analyze
+
+    crossfade = raw.get("playback_crossfade_seconds")
+    if isinstance(crossfade, (int, float)) and not isinstance(crossfade, bool):
+        out["playback_crossfade_seconds"] = max(0.0, min(float(crossfade), 12.0))
+
+    beat_align = raw.get("playback_beat_align")
+    if isinstance(beat_align, bool):
+        out["playback_beat_align"] = beat_align
+
+    pcm_cache_mb = raw.get("playback_pcm_cache_mb")
+    if isinstance(pcm_cache_mb, int) and not isinstance(pcm_cache_mb, bool):
+        out["playback_pcm_cache_mb"] = max(0, min(pcm_cache_mb, 4096))
+
+    latency_profile = raw.get("playback_latency_profile")
+    if latency_profile in ("low_latency", "balanced", "power_saving"):
+        out["playback_latency_profile"] = latency_profile
+
+    loudness_normalization = raw.get("playback_loudness_normalization")
+    if isinstance(loudness_normalization, bool):
+        out["playback_loudness_normalization"] = loudness_normalization
+
+    target_lufs = raw.get("playback_target_lufs")
+    if isinstance(target_lufs, (int, float)) and not isinstance(target_lufs, bool):
+        out["playback_target_lufs"] = max(-30.0, min(float(target_lufs), -5.0))
+
     # State metrics normalization
     for key in [
         "api_usage_state_minute_bucket",
@@ -124,7 +161,12 @@ def _normalized_config(raw: dict[str, Any] | None) -> dict[str, Any]:
         if isinstance(val, str):
             out[key] = val
 
-    for key in ["api_usage_state_minute_count", "api_usage_state_day_count"]:
+    for key in [
+        "api_usage_state_minute_count",
+        "api_usage_state_day_count",
+        "api_usage_state_month_cached_input_tokens",
+        "api_usage_state_month_fresh_input_tokens",
+    ]:
         val = raw.get(key)
         if isinstance(val, (int, float)):
             out[key] = int(val)
@@ -146,6 +146,75 @@ def set_transcription_model(model_name: str) -> None:
     set_setting("transcription_model", model_name)
 
 
+def library_auto_analyze() -> bool:
+    return bool(get_setting("library_auto_analyze", True))
+
+
+def set_library_auto_analyze(enabled: bool) -> None:
+    set_setting("library_auto_analyze", bool(enabled))
+
+
+def playback_crossfade_seconds() -> float:
+    try:
+        return max(0.0, min(float(get_setting("playback_crossfade_seconds", 4.0)), 12.0))
+    except (TypeError, ValueError):
+        return 4.0
+
+
+def set_playback_crossfade_seconds(seconds: float) -> None:
+    set_setting("playback_crossfade_seconds", max(0.0, min(float(seconds), 12.0)))
+
+
+def playback_beat_align() -> bool:
+    return bool(get_setting("playback_beat_align", True))
+
+
+def set_playback_beat_align(enabled: bool) -> None:
+    set_setting("playback_beat_align", bool(enabled))
+
+
+def playback_pcm_cache_mb() -> int:
+    try:
+        return max(0, min(int(get_setting("playback_pcm_cache_mb", 256)), 4096))
+    except (TypeError, ValueError):
+        return 256
+
+
+def set_playback_pcm_cache_mb(megabytes: int) -> None:
+    set_setting("playback_pcm_cache_mb", max(0, min(int(megabytes), 4096)))
+
+
+LATENCY_PROFILES = ("low_latency", "balanced", "power_saving")
+
+
+def playback_latency_profile() -> str:
+    profile = str(get_setting("playback_latency_profile", "balanced"))
+    return profile if profile in LATENCY_PROFILES else "balanced"
+
+
+def set_playback_latency_profile(profile: str) -> None:
+    set_setting("playback_latency_profile", profile if profile in LATENCY_PROFILES else "balanced")
+
+
+def playback_loudness_normalization() -> bool:
+    return bool(get_setting("playback_loudness_normalization", True))
+
+
+def set_playback_loudness_normalization(enabled: bool) -> None:
+    set_setting("playback_loudness_normalization", bool(enabled))
+
+
+def playback_target_lufs() -> float:
+    try:
+        return max(-30.0, min(float(get_setting("playback_target_lufs", -14.0)), -5.0))
+    except (TypeError, ValueError):
+        return -14.0
+
+
+def set_playback_target_lufs(lufs: float) -> None:
+    set_setting("playback_target_lufs", max(-30.0, min(float(lufs), -5.0)))
+
+
 def dotenv_path() -> Path:
     return runtime_base_dir() / ".env"
 
@@ -1,5 +1,7 @@
 import os
 import tempfile
+import threading
+import time
 import unittest
 from pathlib import Path
 from unittest.mock import patch
@@ -85,6 +87,12 @@ class TestBlueUIButtonClicks(unittest.TestCase):
         self._tmp_music_dir = tempfile.TemporaryDirectory()
         Path(self._tmp_music_dir.name, "test_track.wav").touch()
         self.window._music_folder = Path(self._tmp_music_dir.name)
+        # Land the background scan of the swapped folder before clicking; a late
+        # carousel resync would otherwise replace the track between clicks.
+        self.window._library().wait_ready(5)
+        self.app.processEvents()
+        self.window._library_sync_timer.stop()
+        self.window._sync_carousel_song_items()
         self.window.show()
 
     def tearDown(self):
@@ -170,6 +178,54 @@ class TestBlueUIButtonClicks(unittest.TestCase):
         self.assertEqual(manager.stop_calls, 1)
         self.assertTrue(self.window._transcript_win.recording_status.isHidden())
 
+    def test_live_mood_estimate_shown_while_recording(self):
+        transcript = self.window._transcript_win
+        transcript.set_recording_active(True)
+        self.window.live_mood_ready.emit(
+            {"bpm": 120, "key_technical": "Amin", "key_camelot": "8A", "energy_trend": "rising"}
+        )
+        self.assertIn("120 BPM · Amin (8A) · rising", transcript.recording_status.text())
+
+        transcript.set_recording_active(False)
+        transcript.set_recording_active(True)
+        self.assertNotIn("BPM", transcript.recording_status.text())
+
+    def test_recommender_builds_off_the_ui_thread(self):
+        built_on = []
+
+        class _FakeRecommender:
+            def __init__(self, name):
+                self.name = name
+
+            def note_played(self, _path):
+                pass
+
+            def next_track(self, _mood, after=None):
+                return self.name
+
+        def load_or_build(*_args, **_kwargs):
+            built_on.append(threading.current_thread().name)
+            return _FakeRecommender(f"pick{len(built_on)}")
+
+        patcher = patch("ui_ux_team.blue_ui.views.main_window.NextTrackRecommender.load_or_build", load_or_build)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.window._currently_playing = str(Path(self._tmp_music_dir.name, "test_track.wav"))
+
+        # Nothing built yet: the caller falls back to a random pick instead of waiting.
+        self.assertIsNone(self.window._recommend_next_track("😊 positive"))
+        deadline = time.monotonic() + 10
+        while self.window._track_recommender is None and time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.01)
+        self.assertEqual(built_on, ["RecommenderBuild"])
+        self.assertEqual(self.window._recommend_next_track("😊 positive"), "pick1")
+
+        # A tag update within the rebuild interval keeps serving the previous recommender.
+        self.window._library_index._revision += 1
+        self.assertEqual(self.window._recommend_next_track("😊 positive"), "pick1")
+        self.assertEqual(len(built_on), 1)
+
 
 if __name__ == "__main__":
     unittest.main()
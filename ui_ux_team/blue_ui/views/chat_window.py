@@ -13,6 +13,7 @@ from ui_ux_team.blue_ui.widgets.loading import LoadingCircle
 
 
 class ChatWorker(QThread):
+    chunk_received = Signal(str)
     response_received = Signal(dict)
 
     def __init__(self, chatbot, message):
@@ -22,7 +23,10 @@ class ChatWorker(QThread):
 
     def run(self):
         if self.chatbot:
-            response = self.chatbot.send_message(self.message)
+            if hasattr(self.chatbot, "send_message_stream"):
+                response = self.chatbot.send_message_stream(self.message, self.chunk_received.emit)
+            else:
+                response = self.chatbot.send_message(self.message)
             self.response_received.emit(response)
         else:
             self.response_received.emit({"error": "Chatbot not initialized"})
@@ -152,14 +156,26 @@ class BlueBirdChatView(QWidget):
         if self.chatbot:
             self.loader.start()
             self.worker = ChatWorker(self.chatbot, text)
+            self.worker.chunk_received.connect(self.handle_ai_chunk)
             self.worker.response_received.connect(self.handle_ai_response)
             self.worker.start()
         else:
             self.text_box.append_message("system", "**System:** API Key missing or Chatbot not initialized.")
 
+    def handle_ai_chunk(self, text: str):
+        if not self.text_box.is_streaming():
+            self.loader.stop()
+            self.text_box.begin_stream("model")
+        self.text_box.append_stream_chunk(text)
+
     def handle_ai_response(self, response):
         self.loader.stop()
-        if "error" in response:
+        if self.text_box.is_streaming():
+            # Re-render the streamed message once as markdown.
+            self.text_box.end_stream(None if "error" in response else response.get("text", ""))
+            if "error" in response:
+                self.text_box.append_message("system", f"**Error:** {response['error']}")
+        elif "error" in response:
             self.text_box.append_message("system", f"**Error:** {response['error']}")
         else:
             self.text_box.append_message("model", response.get("text", ""))
@@ -2,7 +2,9 @@ import json
 import os
 import random
 import sys
+import threading
 import time
+from collections import deque
 from pathlib import Path
 
 from PySide6.QtCore import QEvent, Qt, Signal, QTimer
@@ -23,11 +25,17 @@ from PySide6.QtWidgets import (
     QWidget,
 )
 
+from architects.helpers.library_index import AUDIO_EXTS, LibraryIndex
 from architects.helpers.managed_mem import ManagedMem
 from architects.helpers.miniaudio_player import MiniaudioPlayer
+from architects.helpers.output_devices import OutputDeviceManager
+from architects.helpers.playback_engine import close_shared_engine, shared_engine
 from architects.helpers.resource_path import resource_path
 from architects.helpers.tabs_audio import get_display_names
+from architects.helpers.track_recommender import RECENCY_WINDOW, NextTrackRecommender, default_graph_dir
 from architects.helpers.transcription_manager import TranscriptionManager
+from mood_readers.playlist_tagger import active_playlist_path
+from mood_readers.waveform_overview import WaveformOverviewStore
 from ui_ux_team.blue_ui import settings as app_settings
 from ui_ux_team.blue_ui.app.secure_api_key import (
     RUNTIME_SOURCE_DOTENV,
@@ -67,6 +75,9 @@ def get_project_root() -> Path:
 
 BASE = resource_path("ui_ux_team/assets")
 T_CHUNK = 30
+# Background analysis bumps the library revision on every tag update, so the recommender
+# (FeatureStore + kNN graph) is rebuilt at most this often.
+RECOMMENDER_REBUILD_SECONDS = 30.0
 
 
 def _icon_relative_candidates() -> list[str]:
@@ -151,7 +162,12 @@ def _is_light_color(value: str, fallback: str = "#1E1E1E") -> bool:
 
 class MainUI(QWidget):
     transcript_ready = Signal(dict)
-    _AUDIO_EXTS = {".wav", ".mp3", ".flac", ".ogg", ".m4a", ".aac"}
+    live_mood_ready = Signal(dict)
+    library_changed = Signal()
+    playback_position_changed = Signal()
+    waveform_ready = Signal(str, object)
+    recommender_ready = Signal(object, int)
+    _AUDIO_EXTS = AUDIO_EXTS
 
     def __init__(self):
         super().__init__()
@@ -164,6 +180,7 @@ class MainUI(QWidget):
 
         self._play_btn = None
         self._player = None
+        self._player_path = None  # resolved file of self._player (BPM lookup for transitions)
         self._paused = False
         self._currently_playing = "deep_purple_smoke_on_the_water.wav"
         self._current_volume = 0.8
@@ -189,14 +206,36 @@ class MainUI(QWidget):
         self._timeline_dummy_duration = 240.0
         self._timeline_dummy_position = 0.0
         self._timeline_seek_lock_until = 0.0
-        self._timeline_timer = QTimer(self)
-        self._timeline_timer.setInterval(120)
-        self._timeline_timer.timeout.connect(self._sync_timeline_from_player)
-        self._timeline_timer.start()
+        # Players notify from the audio thread; the queued signal hops onto the UI thread.
+        self.playback_position_changed.connect(self._sync_timeline_from_player)
+        QTimer.singleShot(0, self._sync_timeline_from_player)
+        self._waveforms = WaveformOverviewStore()
+        self.waveform_ready.connect(self._on_waveform_ready)
 
         self.transcription_manager = None
         self.transcript_line = 0
         self._music_folder = self._load_music_folder_setting()
+        self._library_sync_timer = QTimer(self)
+        self._library_sync_timer.setSingleShot(True)
+        self._library_sync_timer.setInterval(250)
+        self._library_sync_timer.timeout.connect(self._sync_carousel_song_items)
+        # Emitted from scanner/watcher threads; the queued signal hops onto the UI thread.
+        self.library_changed.connect(self._library_sync_timer.start)
+        self._library_index = LibraryIndex(
+            self._music_folder,
+            auto_analyze=app_settings.library_auto_analyze(),
+            on_changed=self.library_changed.emit,
+        ).start()
+        self._track_recommender = None
+        self._track_recommender_revision = None
+        self._recommender_building = False
+        self._recommender_build_started = float("-inf")
+        self.recommender_ready.connect(self._on_recommender_ready)
+        self._play_history = deque(maxlen=RECENCY_WINDOW)
+        shared_engine().pcm_cache.set_budget_mb(app_settings.playback_pcm_cache_mb())
+        self._output_devices = OutputDeviceManager(shared_engine())
+        self._output_devices.set_profile(app_settings.playback_latency_profile())
+        self._output_devices.start()
         self._music_path_edit = None
         self._music_empty_popup = None
         self._startup_preflight_shown = False
@@ -212,7 +251,8 @@ class MainUI(QWidget):
         self.man_mem = ManagedMem()
         self._music_folder.mkdir(parents=True, exist_ok=True)
 
-        mood_data_path = resource_path("mood_readers/data/mood_playlists_organized.json")
+        # A map regenerated by mood_readers/playlist_tagger.py takes precedence over the bundled one.
+        mood_data_path = active_playlist_path(resource_path("mood_readers/data/mood_playlists_organized.json"))
         with open(mood_data_path, "r", encoding="utf-8") as f:
             self.mood_map = json.load(f)
 
@@ -228,6 +268,7 @@ class MainUI(QWidget):
         self._current_session = f"SESSION [{self.man_mem.timestamp_helper()}]"
 
         self.transcript_ready.connect(self.handle_transcript_data)
+        self.live_mood_ready.connect(self._transcript_win.set_live_mood)
 
         self._refresh_transcription_manager(initial=True)
         QTimer.singleShot(600, self._show_start_cycle_popup_once)
@@ -249,6 +290,8 @@ class MainUI(QWidget):
         try:
             self.transcription_manager = TranscriptionManager(api_key, chunk_seconds=T_CHUNK)
             self.transcription_manager.set_callback(self.transcript_ready.emit)
+            # Published from the audio thread every few seconds; the signal hops to the UI thread.
+            self.transcription_manager.set_mood_callback(self.live_mood_ready.emit)
         except Exception as exc:
             self.transcription_manager = None
             print(f"Failed to initialize TranscriptionManager: {exc}")
@@ -291,7 +334,7 @@ class MainUI(QWidget):
             self._onboarding_arrow_guide.handle_transcript_clicked()
         self.open_transcript()
 
-    def basic_music_play(self, music_path):
+    def basic_music_play(self, music_path, transition: bool = False):
         real_path = self._resolve_music_path(music_path)
         if real_path is None:
             print(f"Music file not found for input: {music_path}")
@@ -303,9 +346,81 @@ class MainUI(QWidget):
             return
 
         self._currently_playing = music_path
-        started = self._start_player(real_path)
+        started = self._start_player(real_path, transition=transition)
         self._play_btn.set_image("assets/pause.png" if started else "assets/play.png")
         self._set_equalizer_playing(bool(started))
+        if started:
+            self._note_played(real_path)
+
+    def _note_played(self, real_path: Path) -> None:
+        path = os.path.abspath(str(real_path))
+        self._play_history.append(path)
+        if self._track_recommender is not None:
+            self._track_recommender.note_played(path)
+
+    def _recommender(self) -> NextTrackRecommender | None:
+        # Never built on the UI thread: when library membership or tags changed, a rebuild
+        # (or reload from disk) starts on a worker, at most every RECOMMENDER_REBUILD_SECONDS,
+        # and the previous recommender keeps serving until it lands. None before the first one.
+        library = self._library()
+        revision = library.revision
+        now = time.monotonic()
+        if (
+            self._track_recommender_revision != revision
+            and not self._recommender_building
+            and now - self._recommender_build_started >= RECOMMENDER_REBUILD_SECONDS
+        ):
+            self._recommender_building = True
+            self._recommender_build_started = now
+            threading.Thread(
+                target=self._build_recommender,
+                args=(library, revision, dict(self.mood_map or {})),
+                name="RecommenderBuild",
+                daemon=True,
+            ).start()
+        return self._track_recommender
+
+    def _build_recommender(self, library: LibraryIndex, revision: int, mood_map: dict) -> None:
+        from mood_readers.feature_store import FeatureStore
+
+        recommender = None
+        try:
+            tracks = library.tracks(timeout=None)  # worker thread: the full scan, however long it takes
+            store = FeatureStore()
+            store.upsert_many((str(p), library.tags(p)) for p in tracks)
+            by_name = {}
+            for p in sorted(tracks, key=lambda p: len(p.parts), reverse=True):
+                by_name[p.name] = str(p)  # shallowest wins, as in LibraryIndex.find_by_name
+            buckets = {}
+            for mood, entries in mood_map.items():
+                names = (Path(str(entry or "")).name for entry in (entries if isinstance(entries, list) else []))
+                buckets[mood] = [by_name[name] for name in names if name in by_name]
+            recommender = NextTrackRecommender.load_or_build(store, buckets, default_graph_dir())
+        except Exception as exc:  # noqa: BLE001 - keep serving the previous recommender
+            print(f"[MainUI] Track recommender build failed: {exc}")
+        self.recommender_ready.emit(recommender, revision)
+
+    def _on_recommender_ready(self, recommender, revision: int) -> None:
+        self._recommender_building = False
+        if recommender is None:
+            return
+        for path in self._play_history:
+            recommender.note_played(path)
+        self._track_recommender = recommender
+        self._track_recommender_revision = revision
+
+    def _recommend_next_track(self, mood_key: str) -> str | None:
+        current = self._resolve_music_path(self._currently_playing) if self._currently_playing else None
+        if current is None:
+            return None
+        recommender = self._recommender()
+        if recommender is None:
+            return None  # still building: random bucket pick
+        try:
+            return recommender.next_track(mood_key, after=os.path.abspath(str(current)))
+        except Exception as exc:  # noqa: BLE001 - fall back to a random bucket pick
+            print(f"[MainUI] Track recommendation failed: {exc}")
+            return None
 
     def _default_music_folder(self) -> Path:
         return default_music_folder()
@@ -322,8 +437,15 @@ class MainUI(QWidget):
     def _save_music_folder_setting(self, folder: Path) -> None:
         set_setting("music_folder", str(folder.resolve()))
 
-    @staticmethod
-    def _has_audio_files(folder: Path) -> bool:
+    def _library(self) -> LibraryIndex:
+        # Follows the configured folder, however it was changed.
+        if self._library_index.root != self._music_folder.expanduser().resolve():
+            self._library_index.set_root(self._music_folder)
+        return self._library_index
+
+    def _has_audio_files(self, folder: Path) -> bool:
+        if Path(folder).expanduser().resolve() == self._music_folder.expanduser().resolve():
+            return self._library().has_tracks()
         try:
             for p in folder.iterdir():
                 if p.is_file() and p.suffix.lower() in MainUI._AUDIO_EXTS:
@@ -333,6 +455,8 @@ class MainUI(QWidget):
         return False
 
     def _first_audio_file(self, folder: Path) -> Path | None:
+        if Path(folder).expanduser().resolve() == self._music_folder.expanduser().resolve():
+            return self._library().first_track()
         try:
             files = sorted(
                 [p for p in folder.iterdir() if p.is_file() and p.suffix.lower() in self._AUDIO_EXTS],
@@ -361,23 +485,10 @@ class MainUI(QWidget):
         return required
 
     def _music_collection_filenames(self) -> set[str]:
-        names: set[str] = set()
-        try:
-            for p in self._music_folder.iterdir():
-                if p.is_file() and p.suffix.lower() in self._AUDIO_EXTS:
-                    names.add(p.name)
-        except Exception:
-            return set()
-        return names
+        return self._library().filenames()
 
     def _music_tracks(self) -> list[Path]:
-        try:
-            return sorted(
-                [p for p in self._music_folder.iterdir() if p.is_file() and p.suffix.lower() in self._AUDIO_EXTS],
-                key=lambda p: p.name.lower(),
-            )
-        except Exception:
-            return []
+        return self._library().tracks()
 
     def _missing_playlist_files(self) -> list[str]:
         required = self._required_playlist_filenames()
@@ -636,33 +747,60 @@ class MainUI(QWidget):
             Path(resource_path(os.path.join("ui_ux_team/assets", clean))),
             self._music_folder / rel.name,
             self._music_folder / rel,
+            self._library().find_by_name(rel.name),
             Path.cwd() / rel,
             get_project_root() / rel,
         ]
         for p in probes:
-            if p.exists():
+            if p is not None and p.exists():
                 return p
         # If requested track is missing, fall back to first available track in configured folder.
         return self._first_audio_file(self._music_folder)
 
-    def _start_player(self, real_path: Path) -> bool:
-        if self._player:
+    def _start_player(self, real_path: Path, transition: bool = False) -> bool:
+        previous, self._player = self._player, None
+
+        options = {}
+        if transition and previous is not None and previous.is_playing():
+            # Mood-driven switch: pre-decode the next track and crossfade into it, on the
+            # outgoing track's beat when its BPM is cached.
+            options["crossfade_seconds"] = app_settings.playback_crossfade_seconds()
+            if app_settings.playback_beat_align() and self._player_path is not None:
+                options["transition_bpm"] = self._library().tags(self._player_path).get("bpm")
+        if app_settings.playback_loudness_normalization():
+            # Integrated loudness comes from the cached analysis (absent until analyzed).
+            options["loudness_lufs"] = self._library().tags(real_path).get("loudness_lufs")
+            options["target_lufs"] = app_settings.playback_target_lufs()
+        player = MiniaudioPlayer(str(real_path), **options)
+        player.set_volume(self._current_volume)
+        if hasattr(player, "add_position_listener"):
+            player.add_position_listener(self.playback_position_changed.emit)
+        started = player.start()
+        # The new player has taken over the shared output device, so stopping the previous
+        # one afterwards only drops its state (no gap, no device reopen).
+        if previous is not None:
             try:
-                self._player.stop()
+                previous.stop()
             except Exception:
                 pass
-            self._player = None
-
-        player = MiniaudioPlayer(str(real_path))
-        player.set_volume(self._current_volume)
-        started = player.start()
         # Support both explicit bool-return players and legacy implementations.
         ok = (started is not False) and bool(player.is_playing())
         if not ok:
             return False
         self._player = player
+        self._player_path = real_path
+        if self._timeline is not None:
+            # Overview is computed once per track in the background (cached on disk).
+            self._timeline.set_waveform(None)
+            self._waveforms.request(str(real_path), self.waveform_ready.emit)
         return True
 
+    def _on_waveform_ready(self, path: str, overview) -> None:
+        if self._timeline is None or self._player_path is None:
+            return
+        if os.path.abspath(str(self._player_path)) == os.path.abspath(path):
+            self._timeline.set_waveform(overview)
+
     def handle_transcript_data(self, data: dict):
         if data.get("error"):
             message = str(data.get("error") or "Unknown transcription error")
@@ -719,15 +857,18 @@ class MainUI(QWidget):
         self._last_mood = mood
         music_path = None
         if mood in mood_mapper_key:
+            # Harmonically compatible neighbour of the current track; random pick when the
+            # library has no analysed neighbour in this mood yet.
+            music_path = self._recommend_next_track(mood_mapper_key[mood])
             music_data = self.mood_map.get(mood_mapper_key[mood])
-            if music_data:
+            if not music_path and music_data:
                 music_path = random.choice(music_data)
 
         if not music_path and (self._player is None or not self._player.is_playing()):
             music_path = "ui_ux_team/assets/deep_purple_smoke_on_the_water.wav"
 
         if music_path:
-            self.basic_music_play(music_path)
+            self.basic_music_play(music_path, transition=True)
 
     def _save_transcript_progressive(self, data: dict):
         transcript_text = data.get("text")
@@ -1169,6 +1310,7 @@ class MainUI(QWidget):
             except Exception:
                 pass
             self._player = None
+            self._sync_timeline_from_player()
 
         self._currently_playing = selected
         if was_playing:
@@ -1347,12 +1489,14 @@ class MainUI(QWidget):
             if seek_ok is False:
                 self._play_btn.set_image("assets/play.png")
                 self._player = None
+                self._sync_timeline_from_player()
                 return
             if was_playing and hasattr(self._player, "is_playing") and not self._player.is_playing():
                 resumed = self._player.start()
                 if resumed is False or not self._player.is_playing():
                     self._play_btn.set_image("assets/play.png")
                     self._player = None
+                    self._sync_timeline_from_player()
                     return
         if self._timeline is not None:
             position = self._player.position_seconds() if hasattr(self._player, "position_seconds") else target_seconds
@@ -1500,6 +1644,7 @@ class MainUI(QWidget):
 
         self._equalizer = EqualizerWidget()
         self._equalizer.setFixedHeight(26)
+        self._equalizer.set_level_source(shared_engine().spectrum)
         self._equalizer.set_playing(False)
         layout.addWidget(self._equalizer, 0, Qt.AlignHCenter)
 
@@ -1559,6 +1704,10 @@ class MainUI(QWidget):
         return container
 
     def closeEvent(self, event):
+        self._library_index.stop()
+        self._waveforms.shutdown()
+        self._output_devices.stop()
+        close_shared_engine()
         app = QApplication.instance()
         if app is not None:
             app.quit()
@@ -61,6 +61,17 @@ class TranscriptWindowView(QWidget):
         else:
             self._recording_status_timer.stop()
             self.recording_status.hide()
+            self.set_live_mood(None)
+
+    def set_live_mood(self, estimate: dict | None):
+        """Shows the live tempo/key/energy estimate of the recorded audio next to the status."""
+        self._recording_status_base = "is recording"
+        if estimate and estimate.get("bpm"):
+            self._recording_status_base += (
+                f" · {estimate['bpm']} BPM · {estimate.get('key_technical', '?')}"
+                f" ({estimate.get('key_camelot', '?')}) · {estimate.get('energy_trend', 'steady')}"
+            )
+        self.recording_status.setText(self._recording_status_text())
 
     def _recording_status_text(self) -> str:
         return f"{self._recording_status_base}{'.' * self._recording_status_dots}"
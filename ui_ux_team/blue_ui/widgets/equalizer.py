@@ -1,13 +1,22 @@
 from __future__ import annotations
 
-import math
-
-from PySide6.QtCore import QEvent, Qt, QTimer
+import numpy as np
+from PySide6.QtCore import QEvent, QLineF, Qt, QTimer
 from PySide6.QtGui import QColor, QPainter, QPen
 from PySide6.QtWidgets import QWidget
 
+# Per-tick smoothing of band levels: bars jump up quickly and fall back slowly.
+ATTACK = 0.6
+RELEASE = 0.18
+
 
 class EqualizerWidget(QWidget):
+    """
+    Audio-reactive bars. With a level source (an object exposing a float32 `levels` array in
+    0..1, e.g. `PlaybackEngine.spectrum`) bass sits in the middle and higher bands spread to
+    both edges; without one a synthetic waveform is drawn. All per-point math is numpy.
+    """
+
     def __init__(
         self,
         parent: QWidget | None = None,
@@ -29,7 +38,14 @@ class EqualizerWidget(QWidget):
         self._edge_fade_power = max(0.1, float(edge_fade_power))
         self._wave_color = QColor("#FFFFFF")
         self._phase = 0.0
-        self._samples = [0.0 for _ in range(self._points)]
+        self._samples = np.zeros(self._points, dtype=np.float32)
+        self._level_source = None
+        x = np.linspace(0.0, 1.0, self._points)
+        self._x_tau = x * (2.0 * np.pi)
+        # Small at edges, fuller in the middle, like a classic waveform.
+        self._edge_env = 0.25 + 0.75 * np.sin(np.pi * x) ** self._edge_fade_power
+        self._band_pos = np.abs(2.0 * x - 1.0)  # 0 (lowest band) at the centre, 1 at both edges
+        self._level_pos = None
 
         self._timer = QTimer(self)
         self._timer.timeout.connect(self._on_tick)
@@ -41,18 +57,32 @@ class EqualizerWidget(QWidget):
     def is_playing(self) -> bool:
         return bool(self._playing)
 
+    def set_level_source(self, source) -> None:
+        """Source with a `levels` array (and optional start()/stop(), run only while playing)."""
+        if self._level_source is not None and self._playing and hasattr(self._level_source, "stop"):
+            self._level_source.stop()
+        self._level_source = source
+        self._level_pos = None
+        if source is not None and self._playing and hasattr(source, "start"):
+            source.start()
+
     def set_playing(self, playing: bool) -> None:
         playing = bool(playing)
         if playing == self._playing:
             return
         self._playing = playing
+        source = self._level_source
         if self._playing:
+            if source is not None and hasattr(source, "start"):
+                source.start()
             self._timer.start()
         else:
+            if source is not None and hasattr(source, "stop"):
+                source.stop()
             self._timer.stop()
             self._tick = 0
             self._phase = 0.0
-            self._samples = [0.0 for _ in range(self._points)]
+            self._samples.fill(0.0)
             self.update()
 
     def refresh_theme(self) -> None:
@@ -63,24 +93,25 @@ class EqualizerWidget(QWidget):
     def _on_tick(self) -> None:
         self._tick += 1
         self._phase += 0.18
-
-        # Deterministic waveform (no RNG): sum of a few sines with a gentle envelope.
-        # Samples are in [-1, 1] and will be scaled in paintEvent.
-        samples: list[float] = []
-        t = self._phase
-        for i in range(self._points):
-            x = float(i) / float(self._points - 1)
-            # Small at edges, fuller in the middle, like a classic waveform.
-            edge = max(0.0, math.sin(math.pi * x))
-            edge = edge**self._edge_fade_power
-            env = (0.55 + 0.45 * math.sin((x * math.tau) + (t * 0.35))) * (0.25 + 0.75 * edge)
+        source = self._level_source
+        if source is not None:
+            levels = source.levels
+            if self._level_pos is None or self._level_pos.size != levels.size:
+                self._level_pos = np.linspace(0.0, 1.0, levels.size)
+            target = np.interp(self._band_pos, self._level_pos, levels) * self._edge_env
+            rate = np.where(target > self._samples, ATTACK, RELEASE)
+            self._samples += (rate * (target - self._samples)).astype(np.float32)
+        else:
+            # Deterministic waveform (no RNG): sum of a few sines with a gentle envelope.
+            # Samples are in [-1, 1] and will be scaled in paintEvent.
+            x, t = self._x_tau, self._phase
+            env = (0.55 + 0.45 * np.sin(x + t * 0.35)) * self._edge_env
             y = (
-                0.60 * math.sin((x * math.tau * 1.25) + (t * 1.00))
-                + 0.28 * math.sin((x * math.tau * 2.60) + (t * 1.45) + 1.3)
-                + 0.12 * math.sin((x * math.tau * 5.10) + (t * 0.70) + 0.4)
+                0.60 * np.sin(x * 1.25 + t * 1.00)
+                + 0.28 * np.sin(x * 2.60 + t * 1.45 + 1.3)
+                + 0.12 * np.sin(x * 5.10 + t * 0.70 + 0.4)
             )
-            samples.append(max(-1.0, min(1.0, y * env)))
-        self._samples = samples
+            np.clip(y * env, -1.0, 1.0, out=self._samples, casting="unsafe")
         self.update()
 
     def changeEvent(self, event: QEvent) -> None:
@@ -115,15 +146,15 @@ class EqualizerWidget(QWidget):
         available_w = float(x2 - x1)
         if available_w <= 1.0:
             return
+        count = len(self._samples)
         target_count = max(8, int(available_w // float(self._stick_gap_px)))
-        step = max(1, int(round(float(len(self._samples)) / float(target_count))))
-        indices = list(range(0, len(self._samples), step))
-        if indices[-1] != (len(self._samples) - 1):
-            indices.append(len(self._samples) - 1)
-
-        denom = float(len(self._samples) - 1)
-        for i in indices:
-            s = self._samples[i]
-            x = x1 + (x2 - x1) * (float(i) / denom)
-            half = abs(float(s)) * amp
-            painter.drawLine(float(x), float(y_mid - half), float(x), float(y_mid + half))
+        step = max(1, int(round(float(count) / float(target_count))))
+        indices = np.arange(0, count, step)
+        if indices[-1] != count - 1:
+            indices = np.append(indices, count - 1)
+
+        xs = x1 + (x2 - x1) * (indices / float(count - 1))
+        halves = np.abs(self._samples[indices]) * amp
+        painter.drawLines(
+            [QLineF(x, y_mid - half, x, y_mid + half) for x, half in zip(xs.tolist(), halves.tolist())]
+        )
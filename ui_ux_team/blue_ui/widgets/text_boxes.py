@@ -1,6 +1,6 @@
 import markdown
 from PySide6.QtCore import Qt, Signal
-from PySide6.QtGui import QFont
+from PySide6.QtGui import QFont, QTextCursor
 from PySide6.QtWidgets import QTextBrowser, QTextEdit, QPlainTextEdit
 
 from ui_ux_team.blue_ui.theme.styles import textbox_ai_style, input_style, textbox_style
@@ -12,15 +12,67 @@ class TextBoxAI(QTextBrowser):
         super().__init__()
         self.setObjectName("TextBox")
         self.setOpenExternalLinks(True)
+        self._stream_start = None
+        self._stream_chunks = []
         self.refresh_theme()
 
     def refresh_theme(self):
         self.setStyleSheet(textbox_ai_style())
 
     def append_message(self, role: str, text: str):
-        processed_text = text.replace("\n*", "\n\n*").replace("\n-", "\n\n-")
-        html_content = markdown.markdown(processed_text, extensions=["extra", "sane_lists"])
+        html_block = f"""
+        {self._header_html(role)}
+        {self._body_html(text)}
+        <hr style=\"background-color: #2A3550; height: 1px; border: none; margin: 10px 0;\">
+        """
+
+        self.append("")
+        self.insertHtml(html_block)
+        self.verticalScrollBar().setValue(self.verticalScrollBar().maximum())
+
+    # --- Streaming: plain-text appends while tokens arrive, one markdown render at the end ---
+
+    def begin_stream(self, role: str = "model"):
+        self.append("")
+        self.insertHtml(self._header_html(role))
+        self.append("")
+        self._stream_start = self._end_cursor().position()
+        self._stream_chunks = []
+
+    def append_stream_chunk(self, text: str):
+        if self._stream_start is None or not text:
+            return
+        self._stream_chunks.append(text)
+        self._end_cursor().insertText(text)
+        self.verticalScrollBar().setValue(self.verticalScrollBar().maximum())
 
+    def end_stream(self, final_text: str = None):
+        if self._stream_start is None:
+            return
+        text = final_text if final_text is not None else "".join(self._stream_chunks)
+        cursor = self._end_cursor()
+        cursor.setPosition(self._stream_start, QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+        cursor.insertHtml(
+            f"""
+            {self._body_html(text)}
+            <hr style=\"background-color: #2A3550; height: 1px; border: none; margin: 10px 0;\">
+            """
+        )
+        self._stream_start = None
+        self._stream_chunks = []
+        self.verticalScrollBar().setValue(self.verticalScrollBar().maximum())
+
+    def is_streaming(self) -> bool:
+        return self._stream_start is not None
+
+    def _end_cursor(self) -> QTextCursor:
+        cursor = QTextCursor(self.document())
+        cursor.movePosition(QTextCursor.End)
+        return cursor
+
+    @staticmethod
+    def _header_html(role: str) -> str:
         if role == "user":
             sender = "You"
             color = tokens.PRIMARY
@@ -30,18 +82,17 @@ class TextBoxAI(QTextBrowser):
         else:
             sender = "System"
             color = tokens.TEXT_MUTED
-
-        html_block = f"""
+        return f"""
         <div style=\"margin-top: 10px; margin-bottom: 5px;\">
             <span style=\"color: {color}; font-weight: bold; font-size: 16px;\">{sender}</span>
         </div>
-        <div style=\"color: {tokens.TEXT_PRIMARY}; margin-bottom: 10px;\">{html_content}</div>
-        <hr style=\"background-color: #2A3550; height: 1px; border: none; margin: 10px 0;\">
         """
 
-        self.append("")
-        self.insertHtml(html_block)
-        self.verticalScrollBar().setValue(self.verticalScrollBar().maximum())
+    @staticmethod
+    def _body_html(text: str) -> str:
+        processed_text = text.replace("\n*", "\n\n*").replace("\n-", "\n\n-")
+        html_content = markdown.markdown(processed_text, extensions=["extra", "sane_lists"])
+        return f"""<div style=\"color: {tokens.TEXT_PRIMARY}; margin-bottom: 10px;\">{html_content}</div>"""
 
 
 class InputBlueBird(QTextEdit):
@@ -1,6 +1,8 @@
 import re
 
+import numpy as np
 from PySide6.QtCore import Qt, Signal
+from PySide6.QtGui import QColor, QImage, QPainter, QPixmap
 from PySide6.QtWidgets import QHBoxLayout, QLabel, QSlider, QStyle, QStyleOptionSlider, QVBoxLayout, QWidget
 
 from ui_ux_team.blue_ui.theme import tokens
@@ -86,6 +88,65 @@ class PreciseSeekSlider(QSlider):
         super().leaveEvent(event)
 
 
+class _WaveformLayer(QWidget):
+    """
+    Paints a track overview (see mood_readers.waveform_overview) from one cached QPixmap.
+    The pixmap is rebuilt only when the overview, size or colour changes, and rebuilding
+    just reduces the matching mip level to one column per pixel.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents, True)
+        self._overview = None
+        self._color = QColor("#FFFFFF")
+        self._pixmap = None
+
+    def set_overview(self, overview) -> None:
+        self._overview = overview
+        self._pixmap = None
+        self.update()
+
+    def set_color(self, color: str) -> None:
+        match = re.match(r"rgba?\(([^)]+)\)", (color or "").strip())
+        if match:
+            parts = [p.strip() for p in match.group(1).split(",")]
+            alpha = float(parts[3]) if len(parts) > 3 else 1.0
+            self._color = QColor(int(parts[0]), int(parts[1]), int(parts[2]), int(round(alpha * 255)))
+        else:
+            self._color = QColor(color)
+        self._pixmap = None
+        self.update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._pixmap = None
+
+    def _render(self):
+        w, h = self.width(), self.height()
+        if self._overview is None or w <= 0 or h <= 0:
+            return None
+        lows, highs, _ = self._overview.columns(w)
+        peak = max(float(np.max(np.abs(highs))), float(np.max(np.abs(lows))), 1e-6)
+        mid = (h - 1) / 2.0
+        top = np.floor(mid - highs / peak * mid).astype(np.int32)
+        bottom = np.ceil(mid - lows / peak * mid).astype(np.int32)
+        rows = np.arange(h, dtype=np.int32)[:, None]
+        mask = (rows >= top[None, :]) & (rows <= bottom[None, :])
+        rgba = np.zeros((h, w, 4), dtype=np.uint8)
+        rgba[mask] = (self._color.red(), self._color.green(), self._color.blue(), self._color.alpha())
+        image = QImage(rgba.data, w, h, w * 4, QImage.Format_RGBA8888)
+        return QPixmap.fromImage(image.copy())
+
+    def paintEvent(self, event):
+        if self._overview is None:
+            return
+        if self._pixmap is None:
+            self._pixmap = self._render()
+        if self._pixmap is not None:
+            QPainter(self).drawPixmap(0, 0, self._pixmap)
+
+
 class PlaybackTimeline(QWidget):
     seek_requested = Signal(float)
 
@@ -132,7 +193,10 @@ class PlaybackTimeline(QWidget):
         root.addWidget(self._slider_wrap, 1)
 
         # Overlay layers for timeline visuals:
-        # preview fill (lowest), hover marker (middle), actual handle (top).
+        # waveform (lowest), preview fill, hover marker, actual handle (top).
+        self._waveform = _WaveformLayer(self.slider)
+        self._waveform.hide()
+
         self._preview_fill = QWidget(self.slider)
         self._preview_fill.setAttribute(Qt.WA_TransparentForMouseEvents, True)
         self._preview_fill.hide()
@@ -201,9 +265,16 @@ class PlaybackTimeline(QWidget):
             f"background: {handle_color}; border: 1px solid {handle_border}; border-radius: {self._handle_size // 2}px;"
         )
         self._actual_handle.setFixedSize(self._handle_size, self._handle_size)
+        self._waveform.set_color(getattr(tokens, "TIMELINE_WAVEFORM", _with_alpha(tokens.TIMELINE_TEXT, 0.30)))
 
         self._update_visual_layers()
 
+    def set_waveform(self, overview) -> None:
+        """Shows a WaveformOverview behind the groove (None hides it)."""
+        self._waveform.set_overview(overview)
+        self._waveform.setVisible(overview is not None)
+        self._update_visual_layers()
+
     def set_duration(self, seconds: float):
         self._duration = max(0.0, float(seconds))
         self.total_label.setText(self._fmt(self._duration))
@@ -298,8 +369,12 @@ class PlaybackTimeline(QWidget):
             self._hover_marker.hide()
             self._preview_fill.hide()
 
+        if self._waveform.isVisible():
+            self._waveform.setGeometry(groove_left, 0, groove_w, h)
+
         # Stable z-order.
-        self._preview_fill.lower()
+        self._waveform.lower()
+        self._preview_fill.raise_()
         self._hover_marker.raise_()
         self._actual_handle.raise_()
 